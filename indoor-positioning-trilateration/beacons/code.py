@@ -1,5 +1,6 @@
 import json
 import ssl
+import struct
 import time
 
 import adafruit_minimqtt.adafruit_minimqtt as MQTT
@@ -29,6 +30,13 @@ ntp = adafruit_ntp.NTP(pool, tz_offset=0)
 # Bluetooth
 ble = BLERadio()
 counter = 0
+SCAN_TIMEOUT = 1  # Seconds each scan collects advertisements before publishing
+WIRE_FORMAT = "json"  # "json" or "binary" (compact frames, same layout as src/wire.py)
+
+# Binary frame layout of src/wire.py: magic, version, count and base time (ms), then
+# the MAC, RSSI and time after the base time (ms) of every reading
+FRAME_HEADER = "<2sBHQ"
+FRAME_READING = "<6sbI"
 
 # Set up MQTT client
 mqtt_client = MQTT.MQTT(
@@ -79,27 +87,44 @@ def get_time():
     )
 
 
+def encode_frame(readings):
+    base_time = int(time.mktime(ntp.datetime)) * 1000
+    frame = bytearray(struct.pack(FRAME_HEADER, b"\xbe\xac", 1, len(readings), base_time))
+    for address_bytes, rssi in readings:
+        frame += struct.pack(FRAME_READING, address_bytes, max(-128, min(127, rssi)), 0)
+    return bytes(frame)
+
+
 # Start BLE scan for advertisements
 def start_scan():
-    for advertisement in ble.start_scan(ProvideServicesAdvertisement, Advertisement):
+    messages = []
+    readings = []
+    current_time_str = get_time()
+
+    # Collect every matching advertisement seen during the scan window
+    for advertisement in ble.start_scan(
+        ProvideServicesAdvertisement, Advertisement, timeout=SCAN_TIMEOUT
+    ):
         addr_bytes = advertisement.address.address_bytes
         addr_str = "".join("{:02x}".format(b) for b in addr_bytes).lower()
 
         if addr_str in addresses_to_filter:
-            current_time_str = get_time()
             print(addr_str, current_time_str, "RSSI:", advertisement.rssi)
-
-            # Send the message to the MQTT broker
-            message = json.dumps(
+            messages.append(
                 {
                     "address": addr_str,
                     "time": current_time_str,
                     "rssi": advertisement.rssi,
                 }
             )
-            publish_message(message)
-
-            ble.stop_scan()
+            # The address bytes are little endian
+            readings.append((bytes(reversed(addr_bytes)), advertisement.rssi))
+
+    # Send all readings to the MQTT broker in one message
+    if messages and WIRE_FORMAT == "binary":
+        publish_message(encode_frame(readings))
+    elif messages:
+        publish_message(json.dumps(messages))
 
     # ble.stop_scan()  # Ensure scanning is stopped before continuing
     print("Scan done.")
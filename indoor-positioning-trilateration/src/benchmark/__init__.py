@@ -0,0 +1,6 @@
+from .end_to_end import run_benchmark
+from .logging_overhead import compare_logging
+from .radio_map import benchmark_radio_map
+from .solvers import compare_solvers
+from .tracker import benchmark_tracker
+from .workload import SyntheticWorkload
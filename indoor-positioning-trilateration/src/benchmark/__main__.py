@@ -0,0 +1,155 @@
+import argparse
+import logging
+
+from environment import GRID_RESOLUTION, SOLVER_MODE
+
+from .end_to_end import run_benchmark
+from .logging_overhead import LOG_MODES, compare_logging
+from .radio_map import benchmark_radio_map
+from .solvers import SOLVER_MODES, compare_solvers
+from .tracker import benchmark_tracker
+
+
+def print_report(report: dict):
+    print(
+        f"{report['messages']} messages, {report['readings']} readings, {report['positions']} positions "
+        f"in {report['processing_s']:.2f}s of processing"
+    )
+    print(f"Payload: {report['bytes']} bytes, {report['bytes'] / report['readings']:.1f} bytes/reading")
+    print(
+        f"Throughput: {report['messages_per_s']:.0f} messages/s, {report['readings_per_s']:.0f} readings/s, "
+        f"{report['positions_per_s']:.0f} positions/s"
+    )
+
+    print("Latency (ms):")
+    stages = dict(report["stages"], snapshot=report["snapshot_publish"])
+    for stage, summary in stages.items():
+        print(
+            f"  {stage:<10} count={summary['count']:<7} mean={summary['mean_ms']:.3f} "
+            f"p50={summary['p50_ms']:.3f} p99={summary['p99_ms']:.3f} max={summary['max_ms']:.3f}"
+        )
+
+    if report["solve_cache"] is not None:
+        cache = report["solve_cache"]
+        print(f"Solve cache: hits={cache['hits']} misses={cache['misses']} evictions={cache['evictions']}")
+
+    print("Memory per tag: " + ", ".join(f"{name}={value:.0f}" for name, value in report["memory"].items()))
+
+    error = report["error_m"]
+    print(f"Position error (m): mean={error['mean']:.2f} p50={error['p50']:.2f} p90={error['p90']:.2f} p99={error['p99']:.2f}")
+
+
+def print_logging_report(results: dict):
+    print("Logging overhead:")
+    baseline = results.get("verbose")
+    for mode, result in results.items():
+        saved = ""
+        if baseline is not None and mode != "verbose":
+            saved = f" saved={1 - result['cpu_s'] / baseline['cpu_s']:.0%} of the verbose CPU time"
+        print(
+            f"  {mode:<8} processing={result['processing_s']:.2f}s cpu={result['cpu_s']:.2f}s "
+            f"readings/s={result['readings_per_s']:.0f}{saved}"
+        )
+
+
+def print_solver_report(results: dict):
+    print("Solvers:")
+    for name, result in results.items():
+        error = result["error_m"]
+        print(
+            f"  {name:<12} solve={result['solve_s']:.3f}s positions/s={result['positions_per_solve_s']:.0f} "
+            f"error mean={error['mean']:.2f} p50={error['p50']:.2f} p90={error['p90']:.2f}"
+        )
+
+
+def print_radio_map_report(results: dict):
+    print("Radio map:")
+    for size, result in results.items():
+        error = result["error_m"]
+        print(
+            f"  {size:<13} build={result['build_s'] * 1000:.1f}ms memory={result['bytes'] / 1e6:.1f}MB "
+            f"traced={result['traced_bytes'] / 1e6:.1f}MB queries/s={result['queries_per_s']:.0f} "
+            f"error mean={error['mean']:.2f} p50={error['p50']:.2f} p90={error['p90']:.2f}"
+        )
+
+
+def print_tracker_report(report: dict):
+    update = report["update"]
+    print(
+        f"Particle updates (ms): mean={update['mean_ms']:.1f} p50={update['p50_ms']:.1f} p99={update['p99_ms']:.1f} "
+        f"max={update['max_ms']:.1f}, period={report['period_ms']:.0f} "
+        f"({'holds' if report['holds_rate'] else 'misses'} the rate)"
+    )
+    print("Particles per tag: " + ", ".join(f"{count}: {tags} tags" for count, tags in report["particles"].items()))
+    for name, key in (("Tracker", "error_m"), ("Trilateration", "trilateration_error_m")):
+        error = report[key]
+        print(f"{name} error (m): mean={error['mean']:.2f} p50={error['p50']:.2f} p90={error['p90']:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of the positioning pipeline on synthetic tags.")
+    parser.add_argument("--tags", type=int, default=1000, help="Number of simulated tags")
+    parser.add_argument("--ticks", type=int, default=30, help="Number of simulated advertising intervals")
+    parser.add_argument("--interval", type=float, default=1.0, help="Simulated time between ticks (seconds)")
+    parser.add_argument("--noise", type=float, default=2.0, help="Standard deviation of the RSSI noise (dB)")
+    parser.add_argument("--dropout", type=float, default=0.1, help="Probability that a reading is lost")
+    parser.add_argument("--speed", type=float, default=1.0, help="Walking speed of the tags (m/s)")
+    parser.add_argument("--batch-size", type=int, default=50, help="Maximum readings per message")
+    parser.add_argument("--wire-format", default="json", choices=["json", "binary"], help="Format of the receiver messages")
+    parser.add_argument("--solver-mode", default=SOLVER_MODE, choices=SOLVER_MODES)
+    parser.add_argument("--grid-resolution", type=int, nargs="+", default=[GRID_RESOLUTION], help="Cells along each axis in grid mode")
+    parser.add_argument("--trace-memory", action="store_true", help="Measure the Python allocations per tag")
+    parser.add_argument("--compare-logging", action="store_true", help=f"Compare the CPU time of the logging modes {list(LOG_MODES)}")
+    parser.add_argument("--compare-solvers", action="store_true", help=f"Compare the speed and accuracy of the solvers {list(SOLVER_MODES)}")
+    parser.add_argument("--fingerprints", type=int, nargs="+", default=[10000], help="Fingerprints of the simulated surveys")
+    parser.add_argument("--radio-map", action="store_true", help="Measure the radio maps of --fingerprints against the trilateration")
+    parser.add_argument("--tracker", action="store_true", help="Update the particles of every tag at --rate and check that it holds")
+    parser.add_argument("--rate", type=float, default=10.0, help="Updates per second of every tag with --tracker (Hz)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # The per tag log lines would dominate the measurements
+    logging.basicConfig(level=logging.WARNING)
+
+    benchmark_args = dict(
+        n_tags=args.tags,
+        ticks=args.ticks,
+        interval=args.interval,
+        noise=args.noise,
+        dropout=args.dropout,
+        speed=args.speed,
+        batch_size=args.batch_size,
+        wire_format=args.wire_format,
+        seed=args.seed,
+    )
+    if args.tracker:
+        print_tracker_report(
+            benchmark_tracker(args.tags, args.rate, args.ticks, noise=args.noise, speed=args.speed, seed=args.seed)
+        )
+    elif args.radio_map:
+        print_radio_map_report(
+            benchmark_radio_map(args.fingerprints, n_queries=args.tags, noise=args.noise, dropout=args.dropout, seed=args.seed)
+        )
+    elif args.compare_solvers:
+        print_solver_report(
+            compare_solvers(grid_resolutions=args.grid_resolution, fingerprints=args.fingerprints[0], **benchmark_args)
+        )
+    elif args.compare_logging:
+        print_logging_report(
+            compare_logging(
+                solver_mode=args.solver_mode,
+                grid_resolution=args.grid_resolution[0],
+                fingerprints=args.fingerprints[0],
+                **benchmark_args,
+            )
+        )
+    else:
+        print_report(
+            run_benchmark(
+                solver_mode=args.solver_mode,
+                grid_resolution=args.grid_resolution[0],
+                fingerprints=args.fingerprints[0],
+                trace_memory=args.trace_memory,
+                **benchmark_args,
+            )
+        )
@@ -0,0 +1,178 @@
+import json
+import time
+import tracemalloc
+
+import numpy as np
+
+from cache import PositionCache
+from environment import GRID_RESOLUTION, RECEIVERS, SOLVER_MODE, TAG_LOG_INTERVAL
+from fingerprint import RadioMap
+from pipeline import PositioningPipeline
+from scheduler import LatencyStats
+from utils import TimestampParser
+from wire import decode_frame, is_frame
+
+from .workload import SyntheticWorkload
+
+# Stages timed by the benchmark, per message (decode, ingest) or per tick (solve, publish)
+STAGES = ("decode", "ingest", "solve", "publish")
+
+
+def run_benchmark(
+    n_tags: int = 1000,
+    ticks: int = 30,
+    interval: float = 1.0,
+    noise: float = 2.0,
+    dropout: float = 0.1,
+    speed: float = 1.0,
+    batch_size: int = 50,
+    wire_format: str = "json",
+    receivers: list = RECEIVERS,
+    solver_mode: str = SOLVER_MODE,
+    grid_resolution: int = GRID_RESOLUTION,
+    fingerprints: int = 10000,
+    warmup_ticks: int = 5,
+    trace_memory: bool = False,
+    trace_interval: float = TAG_LOG_INTERVAL,
+    seed: int = 0,
+) -> dict:
+    """
+    Drive the positioning pipeline with a synthetic workload and measure it.
+
+    Every tick the tags move, each receiver publishes the readings it sees in JSON
+    messages, and the messages are decoded, filtered and stored like the server does.
+    Then the tags with new readings are solved and published to a `PositionCache`.
+    Only the processing is timed, not the generation of the workload.
+
+    Args:
+        n_tags (int, optional): Number of simulated tags. Defaults to 1000.
+        ticks (int, optional): Number of simulated advertising intervals. Defaults to 30.
+        interval (float, optional): Simulated time between ticks (seconds). Defaults to 1.0.
+        noise (float, optional): Standard deviation of the RSSI noise (dB). Defaults to 2.0.
+        dropout (float, optional): Probability that a reading is lost. Defaults to 0.1.
+        speed (float, optional): Walking speed of the tags (m/s). Defaults to 1.0.
+        batch_size (int, optional): Maximum readings per message. Defaults to 50.
+        wire_format (str, optional): Format of the messages, "json" or "binary". Defaults to "json".
+        receivers (list, optional): The receivers. Defaults to RECEIVERS.
+        solver_mode (str, optional): "batch", "warm_start", "grid", "fingerprint" or "particle". Defaults to SOLVER_MODE.
+        grid_resolution (int, optional): Cells along each axis in grid mode. Defaults to GRID_RESOLUTION.
+        fingerprints (int, optional): Fingerprints of the simulated survey in fingerprint mode. Defaults to 10000.
+        warmup_ticks (int, optional): Ticks left out of the position error while the filters settle. Defaults to 5.
+        trace_memory (bool, optional): Measure the Python allocations of the pipeline, slows the run down. Defaults to False.
+        trace_interval (float, optional): Minimum time between the debug traces of a tag (seconds). Defaults to TAG_LOG_INTERVAL.
+        seed (int, optional): Seed of the workload. Defaults to 0.
+
+    Returns:
+        dict: Counts, throughput, latency per stage, memory per tag and position error.
+    """
+    workload = SyntheticWorkload(
+        receivers, n_tags, speed=speed, noise=noise, dropout=dropout, seed=seed
+    )
+    tag_indices = {tag_mac: i for i, tag_mac in enumerate(workload.macs)}
+
+    # Survey of the same area, with its own random generator so the tags move the same in every mode
+    radio_map = None
+    if solver_mode == "fingerprint":
+        survey = SyntheticWorkload(receivers, 0, noise=noise, seed=seed + 1)
+        radio_map = RadioMap(*survey.survey(fingerprints))
+
+    if trace_memory:
+        tracemalloc.start()
+    pipeline = PositioningPipeline(
+        receivers,
+        allow_prefixes=["C3"],
+        capacity=n_tags,
+        max_tags=n_tags,
+        ttl=None,
+        solver_mode=solver_mode,
+        grid_resolution=grid_resolution,
+        radio_map=radio_map,
+        trace_interval=trace_interval,
+    )
+    cache = PositionCache()
+    timestamp_parsers = [TimestampParser() for _ in receivers]
+
+    stage_stats = {stage: LatencyStats(window=100000) for stage in STAGES}
+    counts = {"messages": 0, "readings": 0, "positions": 0, "bytes": 0}
+    errors = []
+    processing_time = 0.0
+    start_time = time.time()
+
+    for tick in range(ticks):
+        truth = workload.step(interval).copy()
+        now = start_time + tick * interval
+        messages = workload.messages(now, batch_size, wire_format)
+
+        dirty = set()
+        for receiver_index, payload in messages:
+            start = time.perf_counter()
+            if is_frame(payload):
+                macs, timestamps, rssi = decode_frame(payload)
+            else:
+                readings = json.loads(payload.decode("utf-8"))
+                macs = [reading["mac"].upper() for reading in readings]
+                rssi = [reading["rssi"] for reading in readings]
+                parse_timestamp = timestamp_parsers[receiver_index].parse
+                timestamps = [parse_timestamp(reading["timestamp"], now) for reading in readings]
+            decoded = time.perf_counter()
+
+            batch_macs, _, _ = pipeline.ingest(receiver_index, macs, timestamps, rssi, now)
+            ingested = time.perf_counter()
+
+            stage_stats["decode"].record(decoded - start)
+            stage_stats["ingest"].record(ingested - decoded)
+            processing_time += ingested - start
+            counts["messages"] += 1
+            counts["readings"] += len(macs)
+            counts["bytes"] += len(payload)
+            dirty.update(batch_macs)
+
+        start = time.perf_counter()
+        positions = pipeline.solve(list(dirty))
+        solved = time.perf_counter()
+        cache.publish(positions)
+        published = time.perf_counter()
+
+        stage_stats["solve"].record(solved - start)
+        stage_stats["publish"].record(published - solved)
+        processing_time += published - start
+        counts["positions"] += len(positions)
+
+        # Distance between the estimated and true positions
+        if tick >= warmup_ticks and positions:
+            estimated = np.array([snapshot[1] for snapshot in positions.values()])
+            expected = truth[[tag_indices[tag_mac] for tag_mac in positions]]
+            errors.append(np.linalg.norm(estimated - expected, axis=1))
+
+    # Bytes of the filter and reading arrays, and optionally of all Python allocations
+    kalman_bank = pipeline.kalman_bank
+    array_bytes = (
+        kalman_bank.x.nbytes + kalman_bank.P.nbytes + kalman_bank.Q.nbytes + kalman_bank.R.nbytes
+        + pipeline.reading_store.nbytes() + pipeline.fusion_window.solved_counts.nbytes
+    )
+    if pipeline.tracker is not None:
+        tracker = pipeline.tracker
+        array_bytes += tracker.particles.nbytes + tracker.log_weights.nbytes + tracker.counts.nbytes + tracker.updated.nbytes
+    memory = {"array_bytes_per_tag": array_bytes / n_tags}
+    if trace_memory:
+        memory["traced_bytes_per_tag"] = tracemalloc.get_traced_memory()[0] / n_tags
+        tracemalloc.stop()
+
+    errors = np.concatenate(errors) if errors else np.empty(0)
+    return {
+        **counts,
+        "processing_s": processing_time,
+        "messages_per_s": counts["messages"] / processing_time,
+        "readings_per_s": counts["readings"] / processing_time,
+        "positions_per_s": counts["positions"] / processing_time,
+        "stages": {stage: stats.summary() for stage, stats in stage_stats.items()},
+        "snapshot_publish": pipeline.reading_store.snapshot_stats["publish_time"].summary(),
+        "solve_cache": pipeline.location_estimator.solve_cache.stats() if pipeline.location_estimator.solve_cache is not None else None,
+        "memory": memory,
+        "error_m": {
+            "mean": float(np.mean(errors)) if len(errors) else float("nan"),
+            "p50": float(np.percentile(errors, 50)) if len(errors) else float("nan"),
+            "p90": float(np.percentile(errors, 90)) if len(errors) else float("nan"),
+            "p99": float(np.percentile(errors, 99)) if len(errors) else float("nan"),
+        },
+    }
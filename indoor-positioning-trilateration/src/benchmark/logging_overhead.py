@@ -0,0 +1,64 @@
+import logging
+import os
+import time
+
+from environment import TAG_LOG_INTERVAL
+from logs import setup_logging
+
+from .end_to_end import run_benchmark
+
+# Logging configurations compared by the benchmark: level, queue and trace interval
+LOG_MODES = {
+    # Every reading and solution traced by the processing thread, like the former INFO logs
+    "verbose": {"level": logging.DEBUG, "use_queue": False, "trace_interval": 0},
+    # Traces rate-limited per tag, written by the listener thread
+    "sampled": {"level": logging.DEBUG, "use_queue": True, "trace_interval": TAG_LOG_INTERVAL},
+    # Traces disabled, the default INFO level
+    "quiet": {"level": logging.INFO, "use_queue": True, "trace_interval": TAG_LOG_INTERVAL},
+}
+
+
+def compare_logging(modes: list = tuple(LOG_MODES), **benchmark_args) -> dict:
+    """
+    Run the end-to-end benchmark under each logging mode and measure its CPU time.
+
+    The records are written to the null device, so the time spent formatting and
+    writing them is measured without the cost of a terminal.
+
+    Args:
+        modes (list, optional): Names of the `LOG_MODES` to run. Defaults to all of them.
+        **benchmark_args: Arguments of `run_benchmark`.
+
+    Returns:
+        dict: Maps each mode to its processing and CPU times (seconds) and throughput.
+            The CPU time covers all threads, including the listener writing the records.
+    """
+    results = {}
+    root = logging.getLogger()
+    previous_handlers, previous_level = list(root.handlers), root.level
+    with open(os.devnull, "w") as null_stream:
+        try:
+            for mode in modes:
+                config = LOG_MODES[mode]
+                log_listener = setup_logging(config["level"], config["use_queue"], null_stream)
+
+                start = time.process_time()
+                report = run_benchmark(trace_interval=config["trace_interval"], **benchmark_args)
+                # Wait for the listener to write the queued records
+                if log_listener is not None:
+                    log_listener.stop()
+                cpu_time = time.process_time() - start
+
+                results[mode] = {
+                    "processing_s": report["processing_s"],
+                    "cpu_s": cpu_time,
+                    "readings_per_s": report["readings_per_s"],
+                }
+        finally:
+            # Restore the logging configured by the caller
+            for handler in list(root.handlers):
+                root.removeHandler(handler)
+            for handler in previous_handlers:
+                root.addHandler(handler)
+            root.setLevel(previous_level)
+    return results
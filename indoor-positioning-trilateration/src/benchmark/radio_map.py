@@ -0,0 +1,100 @@
+import time
+import tracemalloc
+
+import numpy as np
+
+from calc import TrilaterationController
+from environment import FINGERPRINT_K, RECEIVERS
+from fingerprint import RadioMap
+
+from .workload import SyntheticWorkload
+
+
+def benchmark_radio_map(
+    sizes: list = (100000,),
+    n_queries: int = 10000,
+    k: int = FINGERPRINT_K,
+    receivers: list = RECEIVERS,
+    noise: float = 2.0,
+    dropout: float = 0.1,
+    samples: int = 10,
+    seed: int = 0,
+) -> dict:
+    """
+    Build radio maps of simulated surveys and measure them against the batch trilateration.
+
+    Every fingerprint averages `samples` readings per receiver at a random point of the
+    area. The queries are single noisy readings of tags at other random points, and the
+    same queries are trilaterated with the strongest receivers for comparison. Only the
+    tags seen by at least three receivers are located, like in the pipeline.
+
+    Args:
+        sizes (list, optional): Numbers of fingerprints of the maps. Defaults to (100000,).
+        n_queries (int, optional): Number of simulated tags, located in one batch. Defaults to 10000.
+        k (int, optional): Nearest fingerprints averaged per tag. Defaults to FINGERPRINT_K.
+        receivers (list, optional): The receivers. Defaults to RECEIVERS.
+        noise (float, optional): Standard deviation of the RSSI noise (dB). Defaults to 2.0.
+        dropout (float, optional): Probability that a reading of a query is lost. Defaults to 0.1.
+        samples (int, optional): Readings averaged per fingerprint. Defaults to 10.
+        seed (int, optional): Seed of the workload. Defaults to 0.
+
+    Returns:
+        dict: Maps each map size, and "trilateration", to its build time (seconds),
+            memory (bytes), queries per second and position error (meters).
+    """
+    queries = SyntheticWorkload(receivers, n_queries, noise=noise, dropout=dropout, seed=seed)
+    rssi = queries.rssi()
+    located = np.sum(~np.isnan(rssi), axis=1) >= 3
+    truth, rssi = queries.positions[located], rssi[located]
+    available = ~np.isnan(rssi)
+    n_queries = len(rssi)
+
+    results = {}
+    for size in sizes:
+        survey = SyntheticWorkload(receivers, 0, noise=noise, seed=seed + 1)
+        locations, fingerprints = survey.survey(size, samples)
+
+        tracemalloc.start()
+        radio_map = RadioMap(locations, fingerprints)
+        traced_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        start = time.perf_counter()
+        positions, _ = radio_map.query(rssi, available, k)
+        query_time = time.perf_counter() - start
+
+        results[size] = {
+            "build_s": radio_map.build_time,
+            "bytes": radio_map.nbytes(),
+            "traced_bytes": traced_bytes,
+            "queries_per_s": n_queries / query_time,
+            "error_m": __error_summary(positions, truth),
+        }
+
+    # The same queries through the batch trilateration
+    controller = TrilaterationController(
+        [receiver["position"] for receiver in receivers], [receiver["tx_power"] for receiver in receivers]
+    )
+    start = time.perf_counter()
+    selected, valid = controller.select_receivers(np.where(available, rssi, -np.inf), 4)
+    distances = controller.get_distances(np.take_along_axis(np.nan_to_num(rssi), selected, axis=1), selected)
+    positions = controller.trilaterate_batch(distances, receivers=selected, weights=valid)
+    query_time = time.perf_counter() - start
+    results["trilateration"] = {
+        "build_s": 0.0,
+        "bytes": 0,
+        "traced_bytes": 0,
+        "queries_per_s": n_queries / query_time,
+        "error_m": __error_summary(positions, truth),
+    }
+    return results
+
+
+def __error_summary(positions: np.ndarray, truth: np.ndarray) -> dict:
+    errors = np.linalg.norm(positions - truth, axis=1)
+    errors = errors[np.isfinite(errors)]
+    return {
+        "mean": float(np.mean(errors)),
+        "p50": float(np.percentile(errors, 50)),
+        "p90": float(np.percentile(errors, 90)),
+    }
@@ -0,0 +1,39 @@
+from environment import GRID_RESOLUTION
+
+from .end_to_end import run_benchmark
+
+# Solver modes compared by the benchmark
+SOLVER_MODES = ("batch", "warm_start", "grid", "fingerprint", "particle")
+
+
+def compare_solvers(modes: list = SOLVER_MODES, grid_resolutions: list = (GRID_RESOLUTION,), **benchmark_args) -> dict:
+    """
+    Run the end-to-end benchmark with each solver mode and compare their speed and accuracy.
+
+    Args:
+        modes (list, optional): Solver modes to run. Defaults to SOLVER_MODES.
+        grid_resolutions (list, optional): Resolutions the grid mode is run with. Defaults to (GRID_RESOLUTION,).
+        **benchmark_args: Other arguments of `run_benchmark`.
+
+    Returns:
+        dict: Maps each run, e.g. "batch" or "grid/32", to its solve time (seconds), solved
+            positions per second of solve time and position error (meters).
+    """
+    runs = []
+    for mode in modes:
+        if mode == "grid":
+            runs.extend((f"grid/{resolution}", mode, resolution) for resolution in grid_resolutions)
+        else:
+            runs.append((mode, mode, GRID_RESOLUTION))
+
+    results = {}
+    for name, mode, resolution in runs:
+        report = run_benchmark(solver_mode=mode, grid_resolution=resolution, **benchmark_args)
+        solve = report["stages"]["solve"]
+        solve_time = solve["count"] * solve["mean_ms"] / 1000
+        results[name] = {
+            "solve_s": solve_time,
+            "positions_per_solve_s": report["positions"] / solve_time if solve_time else float("nan"),
+            "error_m": report["error_m"],
+        }
+    return results
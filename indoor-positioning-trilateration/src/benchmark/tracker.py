@@ -0,0 +1,96 @@
+import time
+
+import numpy as np
+
+from calc import TrilaterationController
+from environment import PARTICLE_DENSITY, PARTICLES_MAX, PARTICLES_MIN, RECEIVERS
+from scheduler import LatencyStats
+from tracker import ParticleTracker
+
+from .workload import SyntheticWorkload
+
+
+def benchmark_tracker(
+    n_tags: int = 1000,
+    rate: float = 10.0,
+    ticks: int = 100,
+    receivers: list = RECEIVERS,
+    noise: float = 2.0,
+    speed: float = 1.0,
+    min_particles: int = PARTICLES_MIN,
+    max_particles: int = PARTICLES_MAX,
+    density: float = PARTICLE_DENSITY,
+    warmup_ticks: int = 20,
+    seed: int = 0,
+) -> dict:
+    """
+    Update the particles of every tag at a fixed rate and check that the updates fit in its period.
+
+    Every tick all tags move and are updated with the distances of single noisy readings
+    from every receiver, which are also trilaterated for comparison.
+
+    Args:
+        n_tags (int, optional): Number of simulated tags. Defaults to 1000.
+        rate (float, optional): Updates per second of every tag (Hz). Defaults to 10.0.
+        ticks (int, optional): Number of updates. Defaults to 100.
+        receivers (list, optional): The receivers. Defaults to RECEIVERS.
+        noise (float, optional): Standard deviation of the RSSI noise (dB). Defaults to 2.0.
+        speed (float, optional): Walking speed of the tags (m/s). Defaults to 1.0.
+        min_particles (int, optional): Particles of a settled tag. Defaults to PARTICLES_MIN.
+        max_particles (int, optional): Particles of a new or uncertain tag. Defaults to PARTICLES_MAX.
+        density (float, optional): Particles per square meter of the spread of a tag. Defaults to PARTICLE_DENSITY.
+        warmup_ticks (int, optional): Ticks left out of the measurements while the particles settle. Defaults to 20.
+        seed (int, optional): Seed of the workload and the particles. Defaults to 0.
+
+    Returns:
+        dict: Latency of the updates against the period, particle counts and position
+            errors (meters) of the tracker and of the batch trilateration.
+    """
+    workload = SyntheticWorkload(receivers, n_tags, speed=speed, noise=noise, dropout=0, seed=seed)
+    controller = TrilaterationController(
+        [receiver["position"] for receiver in receivers], [receiver["tx_power"] for receiver in receivers]
+    )
+    tracker = ParticleTracker(
+        controller.receiver_positions,
+        min_particles=min_particles,
+        max_particles=max_particles,
+        density=density,
+        capacity=n_tags,
+        seed=seed,
+    )
+    tag_indices = np.array([tracker.add_tag() for _ in range(n_tags)])
+    tag_receivers = np.broadcast_to(np.arange(len(receivers)), (n_tags, len(receivers)))
+
+    latency = LatencyStats(window=ticks)
+    tracker_errors, trilateration_errors = [], []
+    for tick in range(ticks):
+        truth = workload.step(1 / rate).copy()
+        distances = controller.get_distances(workload.rssi())
+
+        start = time.perf_counter()
+        estimates = tracker.update(tag_indices, np.full(n_tags, tick / rate), distances, tag_receivers)
+        elapsed = time.perf_counter() - start
+
+        if tick >= warmup_ticks:
+            latency.record(elapsed)
+            tracker_errors.append(np.linalg.norm(estimates - truth, axis=1))
+            trilateration_errors.append(np.linalg.norm(controller.trilaterate_batch(distances) - truth, axis=1))
+
+    summary = latency.summary()
+    return {
+        "update": summary,
+        "period_ms": 1000 / rate,
+        "holds_rate": summary["p99_ms"] < 1000 / rate,
+        "particles": dict(zip(*(values.tolist() for values in np.unique(tracker.counts, return_counts=True)))),
+        "error_m": __error_summary(tracker_errors),
+        "trilateration_error_m": __error_summary(trilateration_errors),
+    }
+
+
+def __error_summary(errors: list) -> dict:
+    errors = np.concatenate(errors)
+    return {
+        "mean": float(np.mean(errors)),
+        "p50": float(np.percentile(errors, 50)),
+        "p90": float(np.percentile(errors, 90)),
+    }
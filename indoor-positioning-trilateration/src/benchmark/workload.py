@@ -0,0 +1,151 @@
+import datetime
+import json
+
+import numpy as np
+
+from environment import PATH_LOSS_EXPONENT
+from wire import encode_frame
+
+
+class SyntheticWorkload:
+    def __init__(
+        self,
+        receivers: list,
+        n_tags: int,
+        area: tuple = None,
+        speed: float = 1.0,
+        noise: float = 2.0,
+        dropout: float = 0.1,
+        path_loss_exponent: float = PATH_LOSS_EXPONENT,
+        seed: int = 0,
+    ):
+        """
+        Simulated tags moving through the area, seen by the receivers.
+
+        Every tag walks between random waypoints at a constant speed. Its RSSI at each
+        receiver follows the path loss model of `TrilaterationController.get_distance`,
+        with gaussian noise, and each reading is lost with the dropout probability.
+
+        Args:
+            receivers (list): The receivers, dicts with a `name`, `position` and `tx_power`.
+            n_tags (int): Number of simulated tags.
+            area (tuple, optional): ((min_x, min_y), (max_x, max_y)) of the walked area in meters.
+                Defaults to the bounding box of the receivers padded by 1 meter.
+            speed (float, optional): Walking speed of the tags (m/s). Defaults to 1.0.
+            noise (float, optional): Standard deviation of the RSSI noise (dB). Defaults to 2.0.
+            dropout (float, optional): Probability that a reading is lost. Defaults to 0.1.
+            path_loss_exponent (float, optional): Path loss exponent. Defaults to PATH_LOSS_EXPONENT.
+            seed (int, optional): Seed of the random generator. Defaults to 0.
+        """
+        self.receivers = receivers
+        self.receiver_positions = np.array([receiver["position"] for receiver in receivers], dtype=float)
+        self.measured_powers = np.array([receiver["tx_power"] for receiver in receivers], dtype=float)
+        self.n_tags = n_tags
+        self.speed = speed
+        self.noise = noise
+        self.dropout = dropout
+        self.path_loss_exponent = path_loss_exponent
+        self.rng = np.random.default_rng(seed)
+
+        if area is None:
+            area = (self.receiver_positions.min(axis=0) - 1, self.receiver_positions.max(axis=0) + 1)
+        self.area = (np.asarray(area[0], dtype=float), np.asarray(area[1], dtype=float))
+
+        self.macs = [f"C3:00:{i >> 16 & 0xFF:02X}:{i >> 8 & 0xFF:02X}:{i & 0xFF:02X}:00" for i in range(n_tags)]
+        self.positions = self.__random_points(n_tags)
+        self.waypoints = self.__random_points(n_tags)
+
+    def step(self, dt: float) -> np.ndarray:
+        """
+        Move the tags towards their waypoints, picking new ones when they are reached.
+
+        Args:
+            dt (float): Elapsed time (seconds).
+
+        Returns:
+            np.ndarray: (tags, 2) ground truth positions in meters.
+        """
+        offsets = self.waypoints - self.positions
+        remaining = np.linalg.norm(offsets, axis=1)
+        reached = remaining <= self.speed * dt
+
+        moving = ~reached
+        self.positions[moving] += offsets[moving] / remaining[moving, None] * self.speed * dt
+        self.positions[reached] = self.waypoints[reached]
+        self.waypoints[reached] = self.__random_points(int(np.sum(reached)))
+        return self.positions
+
+    def rssi(self) -> np.ndarray:
+        """
+        Sample the RSSI of every tag at every receiver.
+
+        Returns:
+            np.ndarray: (tags, receivers) integer RSSI, NaN where the reading was lost.
+        """
+        rssi = self.__sample_rssi(self.positions)
+        rssi[self.rng.random(rssi.shape) < self.dropout] = np.nan
+        return rssi
+
+    def survey(self, n_points: int, samples: int = 10) -> tuple:
+        """
+        Simulate a fingerprint survey: readings of every receiver averaged at random points of the area.
+
+        Args:
+            n_points (int): Number of surveyed points.
+            samples (int, optional): Readings averaged per point and receiver. Defaults to 10.
+
+        Returns:
+            tuple: (points, 2) locations in meters and (points, receivers) mean RSSI.
+        """
+        locations = self.__random_points(n_points)
+        rssi = np.zeros((n_points, len(self.receivers)))
+        for _ in range(samples):
+            rssi += self.__sample_rssi(locations)
+        return locations, rssi / samples
+
+    def __sample_rssi(self, positions: np.ndarray) -> np.ndarray:
+        distances = np.linalg.norm(positions[:, None, :] - self.receiver_positions[None], axis=2)
+        distances = np.maximum(distances, 0.1)
+
+        # Inverse of the path loss model used to estimate the distances
+        rssi = self.measured_powers - 10 * self.path_loss_exponent * np.log10(distances)
+        return np.round(rssi + self.rng.normal(0, self.noise, rssi.shape))
+
+    def messages(self, timestamp: float, batch_size: int = 50, wire_format: str = "json") -> list:
+        """
+        Sample the readings and group them in messages like the receivers publish them.
+
+        Args:
+            timestamp (float): Timestamp of the readings (seconds since the epoch).
+            batch_size (int, optional): Maximum readings per message. Defaults to 50.
+            wire_format (str, optional): "json" or "binary". Defaults to "json".
+
+        Returns:
+            list: (receiver index, payload) tuples, the JSON payloads are lists of
+                {"mac", "rssi", "timestamp"} readings, the binary ones `wire` frames.
+        """
+        # Same timestamp format as the bluetooth publisher
+        timestamp_str = datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+        timestamp_str = timestamp_str.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+        rssi = self.rssi()
+        messages = []
+        for receiver_index in range(len(self.receivers)):
+            seen = np.flatnonzero(~np.isnan(rssi[:, receiver_index]))
+            for start in range(0, len(seen), batch_size):
+                batch = seen[start:start + batch_size]
+                macs = [self.macs[i] for i in batch]
+                values = rssi[batch, receiver_index].astype(int).tolist()
+                if wire_format == "binary":
+                    payload = encode_frame(macs, values, [timestamp] * len(batch))
+                else:
+                    payload = json.dumps([
+                        {"mac": tag_mac, "rssi": value, "timestamp": timestamp_str}
+                        for tag_mac, value in zip(macs, values)
+                    ]).encode("utf-8")
+                messages.append((receiver_index, payload))
+        return messages
+
+    def __random_points(self, n: int) -> np.ndarray:
+        low, high = self.area
+        return low + self.rng.random((n, 2)) * (high - low)
@@ -1,15 +1,19 @@
 import asyncio
 import json
 import os
+import time
 from datetime import datetime
 
 import paho.mqtt.client as mqtt
 from bleak import BleakScanner
 
+from wire import encode_frame
+
 # Configurations (set as env variables or hardcode for demo)
 MQTT_HOST = os.getenv("MQTT_HOST", "localhost")
 MQTT_PORT = int(os.getenv("MQTT_PORT", 1883))
 MQTT_TOPIC = os.getenv("MQTT_TOPIC_BT", "/gw/laptop/status")
+MQTT_FORMAT = os.getenv("MQTT_FORMAT", "json")  # "json" or "binary" (compact frames, see wire.py)
 
 # Initialize MQTT client and connect with explicit client_id parameter to avoid argument conflicts
 mqtt_client = mqtt.Client(client_id="BluetoothScannerPublisher", callback_api_version=mqtt.CallbackAPIVersion.VERSION1)
@@ -30,7 +34,17 @@ async def scan_and_publish():
                     "rssi": device.rssi,
                     "txpower": getattr(device, "tx_power", None)
                 })
-        if messages:
+        if messages and MQTT_FORMAT == "binary":
+            # One frame with the packed MAC, RSSI and time of every reading
+            now = time.time()
+            payload = encode_frame(
+                [message["address"] for message in messages],
+                [message["rssi"] for message in messages],
+                [now] * len(messages),
+            )
+            mqtt_client.publish(MQTT_TOPIC, payload)
+            print(f"Published {len(messages)} readings in {len(payload)} bytes")
+        elif messages:
             payload = json.dumps(messages)
             mqtt_client.publish(MQTT_TOPIC, payload)
             print(f"Published: {payload}")
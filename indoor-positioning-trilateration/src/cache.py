@@ -0,0 +1,93 @@
+import threading
+import time
+from collections import namedtuple
+
+# Result of one position solve for a tag
+PositionSnapshot = namedtuple(
+    "PositionSnapshot",
+    [
+        "version",  # Cache version that published the snapshot
+        "position",  # (x, y) scaled to the display grid
+        "coordinates",  # (x, y) in meters
+        "distances",  # Distance to each receiver (meters)
+        "timestamps",  # Timestamp of the input reading from each receiver
+        "updated",  # Time the snapshot was published
+    ],
+)
+
+
+class PositionCache:
+    def __init__(self):
+        """
+        Versioned cache of the latest position snapshot of every tag.
+
+        The processing stage publishes snapshots and every other consumer (graph, pixel
+        display, ...) reads them instead of solving the positions again. Publishing
+        replaces the whole mapping, so a reader always sees a consistent set.
+        """
+        self.version = 0
+        # Number of snapshots published
+        self.published = 0
+        self.__snapshots = {}
+        self.__lock = threading.Lock()
+
+    def publish(self, positions: dict) -> int:
+        """
+        Publish new snapshots for some tags.
+
+        Args:
+            positions (dict): Maps each tag to a (position, coordinates, distances, timestamps) tuple.
+
+        Returns:
+            int: The new cache version.
+        """
+        with self.__lock:
+            version = self.version + 1
+            updated = time.time()
+
+            snapshots = dict(self.__snapshots)
+            for tag, (position, coordinates, distances, timestamps) in positions.items():
+                snapshots[tag] = PositionSnapshot(
+                    version, position, coordinates, distances, timestamps, updated
+                )
+
+            self.__snapshots = snapshots
+            self.version = version
+            self.published += len(positions)
+            return version
+
+    def remove(self, tags: list) -> int:
+        """
+        Remove the snapshots of some tags, e.g. after they were evicted.
+
+        Args:
+            tags (list): The tags to remove.
+
+        Returns:
+            int: The new cache version.
+        """
+        with self.__lock:
+            snapshots = dict(self.__snapshots)
+            for tag in tags:
+                snapshots.pop(tag, None)
+
+            self.__snapshots = snapshots
+            self.version += 1
+            return self.version
+
+    def get(self, tag) -> PositionSnapshot:
+        """
+        Get the latest snapshot of a tag, or None if it has no position yet.
+        """
+        return self.__snapshots.get(tag)
+
+    def snapshot(self) -> tuple:
+        """
+        Get the latest snapshots of all tags.
+
+        Returns:
+            tuple: The cache version and a dict mapping each tag to its PositionSnapshot.
+                The dict must not be modified.
+        """
+        with self.__lock:
+            return self.version, self.__snapshots
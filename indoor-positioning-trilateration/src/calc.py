@@ -1,46 +1,391 @@
+import time
+from collections import OrderedDict
+
+import numpy as np
 from scipy.optimize import least_squares
 
+from grid import GridEstimator
+
+# Bounds for the adaptive function evaluation cap of warm-started solves
+MIN_WARM_START_NFEV = 4
+MAX_WARM_START_NFEV = 50
+
+# RSSI covered by the distance lookup tables (dBm), the int8 range of BLE readings
+RSSI_TABLE_RANGE = (-128, 20)
+
+
+class SolverStats:
+    def __init__(self):
+        """
+        Collects per-solve latency, iteration and function evaluation counts.
+        """
+        self.reset()
+
+    def reset(self):
+        """
+        Reset all counters.
+        """
+        self.solves = 0
+        self.fallbacks = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.total_nfev = 0
+        self.total_njev = 0
+
+    def record(self, latency: float, nfev: int, njev: int):
+        """
+        Record the outcome of one solve.
+
+        Args:
+            latency (float): Wall time of the solve in seconds.
+            nfev (int): Number of residual function evaluations.
+            njev (int): Number of Jacobian evaluations (one per iteration).
+        """
+        self.solves += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        self.total_nfev += nfev
+        self.total_njev += njev or 0
+
+    def summary(self) -> dict:
+        """
+        Summarize the recorded solves.
+
+        Returns:
+            dict: Solve count, fallbacks, mean/max latency (ms) and mean iteration/evaluation counts.
+        """
+        solves = max(self.solves, 1)
+        return {
+            "solves": self.solves,
+            "fallbacks": self.fallbacks,
+            "mean_latency_ms": self.total_latency / solves * 1000,
+            "max_latency_ms": self.max_latency * 1000,
+            "mean_iterations": self.total_njev / solves,
+            "mean_nfev": self.total_nfev / solves,
+        }
+
+    def __str__(self):
+        summary = self.summary()
+        return (
+            f"SolverStats(solves={summary['solves']}, fallbacks={summary['fallbacks']}, "
+            f"mean_latency={summary['mean_latency_ms']:.3f}ms, max_latency={summary['max_latency_ms']:.3f}ms, "
+            f"mean_iterations={summary['mean_iterations']:.2f}, mean_nfev={summary['mean_nfev']:.2f})"
+        )
+
+
+class SolveCache:
+    def __init__(self, capacity: int = 10000, resolution: float = 0.1):
+        """
+        Bounded LRU cache of trilateration results, keyed on the receivers and their distances
+        quantized to `resolution`, and on the calibration version of the controller.
+
+        A tag that sits still keeps producing nearly the same distances, which are then
+        served from the cache instead of being solved again.
+
+        Args:
+            capacity (int, optional): Maximum number of cached results. Defaults to 10000.
+            resolution (float, optional): Quantization of the distances in the keys (meters). Defaults to 0.1.
+        """
+        self.capacity = capacity
+        self.resolution = resolution
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.__entries = OrderedDict()
+
+    def key(self, version: int, receivers: tuple, distances: tuple) -> tuple:
+        """
+        Key of one solve, raises ValueError for distances that are not finite.
+        """
+        return (version, tuple(receivers), tuple(round(distance / self.resolution) for distance in distances))
+
+    def batch_keys(self, version, distances: np.ndarray, receivers: np.ndarray, weights: np.ndarray) -> list:
+        """
+        Keys of the rows of a batch solve, the distances with a zero weight are ignored.
+
+        Args:
+            version: The calibration version and the settings of the solver.
+            distances (np.ndarray): (N, k) distances.
+            receivers (np.ndarray): (N, k) receiver indices.
+            weights (np.ndarray): (N, k) weights of the distances.
+
+        Returns:
+            list: One key per row.
+        """
+        distances = np.where(np.asarray(weights) > 0, distances, 0.0)
+        quantized = np.rint(np.nan_to_num(distances / self.resolution, posinf=-1, neginf=-1, nan=-1))
+        rows = np.concatenate(
+            [quantized.astype(np.int64), np.asarray(receivers, dtype=np.int64), np.asarray(weights, dtype=float).view(np.int64)],
+            axis=1,
+        )
+        data = rows.tobytes()
+        row_size = rows.shape[1] * rows.itemsize
+        return [(version, data[start:start + row_size]) for start in range(0, len(data), row_size)]
+
+    def get(self, key):
+        """
+        Get a cached result, None if it is not cached.
+        """
+        entry = self.__entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.__entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, value):
+        """
+        Cache a result, evicting the least recently used one when the cache is full.
+        """
+        self.__entries[key] = value
+        self.__entries.move_to_end(key)
+        if len(self.__entries) > self.capacity:
+            self.__entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self):
+        """
+        Drop all cached results, e.g. when the receiver positions or the path loss model changed.
+        """
+        if self.__entries:
+            self.invalidations += 1
+        self.__entries.clear()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self.__entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+class DistanceTable:
+    def __init__(self, measured_powers: np.ndarray, path_loss_exponent: float, step: float = 0.1, rssi_range: tuple = RSSI_TABLE_RANGE):
+        """
+        Path loss distances of every receiver, precomputed over the RSSI range.
+
+        A batch of RSSI values is converted with one gather in a flat (receivers * entries)
+        array instead of a power per value. Values between two entries take the nearest
+        one, which is within step / 2 dB: with the default 0.1 dB step the distance is off by
+        less than 0.7% for a path loss exponent of 1.8. `lookup(..., interpolate=True)`
+        interpolates linearly between the entries instead, for coarser steps.
+
+        Args:
+            measured_powers (np.ndarray): Measured power at 1 meter of each receiver.
+            path_loss_exponent (float): Path loss exponent.
+            step (float, optional): RSSI between two entries (dB). Defaults to 0.1.
+            rssi_range (tuple, optional): Lowest and highest RSSI of the tables (dBm). Defaults to RSSI_TABLE_RANGE.
+        """
+        self.step = step
+        self.min_rssi, self.max_rssi = rssi_range
+        self.measured_powers = np.asarray(measured_powers, dtype=float)
+        self.path_loss_exponent = path_loss_exponent
+
+        rssi = self.min_rssi + np.arange(int(round((self.max_rssi - self.min_rssi) / step)) + 1) * step
+        measured_powers = self.measured_powers
+        self.table = 10 ** ((measured_powers[:, None] - rssi[None]) / (10 * path_loss_exponent))
+        self.width = self.table.shape[1]
+        self.__flat = self.table.ravel()
+
+    def lookup(self, rssi: np.ndarray, receivers: np.ndarray, interpolate: bool = False) -> np.ndarray:
+        """
+        Convert RSSI values to distances. Values outside the RSSI range are evaluated with the
+        path loss model instead, so NaN stays NaN like in `TrilaterationController.get_distance`.
+
+        Args:
+            rssi (np.ndarray): Array of RSSI values in dBm.
+            receivers (np.ndarray): Array of the same shape with the receiver of each value.
+            interpolate (bool, optional): Interpolate between the entries instead of taking the nearest one. Defaults to False.
+
+        Returns:
+            np.ndarray: The distances in meters.
+        """
+        rssi = np.asarray(rssi, dtype=float)
+        receivers = np.asarray(receivers, dtype=np.intp)
+        position = (rssi - self.min_rssi) / self.step
+
+        # NaN fails both comparisons, like the values outside the tables
+        outside = None
+        if position.size and not (np.min(position) >= 0 and np.max(position) <= self.width - 1):
+            outside = ~((position >= 0) & (position <= self.width - 1))
+            position = np.where(outside, 0.0, position)
+
+        offsets = receivers * self.width
+        if not interpolate:
+            distances = self.__flat[offsets + np.rint(position).astype(np.intp)]
+        else:
+            lower = np.minimum(position.astype(np.intp), self.width - 2)
+            below = self.__flat[offsets + lower]
+            above = self.__flat[offsets + lower + 1]
+            distances = below + (above - below) * (position - lower)
+
+        if outside is not None:
+            distances = np.where(
+                outside,
+                10 ** ((self.measured_powers[receivers] - rssi) / (10 * self.path_loss_exponent)),
+                distances,
+            )
+        return distances
+
 
 class TrilaterationController:
     def __init__(
         self,
+        receiver_positions: list,
+        measured_powers: list,
+        scale=32,
+        path_loss_exponent=1.8,
+        warm_start=False,
+        distance_table_step=0,
+        solve_cache=None,
+        grid_resolution=0,
+        grid_sigma=2.0,
+        grid_estimate="centroid",
+    ):
+        """
+        Initialize the trilateration controller for any number (at least three) of receivers.
+
+        Args:
+            receiver_positions (list): Position (x, y) of each receiver.
+            measured_powers (list): Measured power at each receiver.
+            scale (int, optional): Grid scale. Defaults to 32.
+            path_loss_exponent (float, optional): Path loss exponent. Defaults to 1.8.
+            warm_start (bool, optional): Seed each tag's solve with its previous solution and use
+                the analytic Jacobian. Defaults to False.
+            distance_table_step (float, optional): RSSI resolution of the `DistanceTable` used by
+                `get_distances` (dB), 0 evaluates the path loss model instead. Defaults to 0.
+            solve_cache (SolveCache, optional): Cache of the solves, invalidated by `set_calibration`.
+                Defaults to None.
+            grid_resolution (int, optional): Cells along each axis of the `GridEstimator` used by
+                `locate_grid`, 0 disables it. Defaults to 0.
+            grid_sigma (float, optional): Standard deviation of the filtered RSSI assumed by the grid (dB). Defaults to 2.0.
+            grid_estimate (str, optional): "centroid" or "argmax" of the grid likelihood. Defaults to "centroid".
+        """
+        if len(receiver_positions) < 3 or len(receiver_positions) != len(measured_powers):
+            raise ValueError("At least three receivers with a measured power are required")
+
+        # Base station positions
+        self.bp_1, self.bp_2, self.bp_3 = (tuple(position) for position in receiver_positions[:3])
+
+        # Grid scale
+        self.scale = scale
+
+        # Measured power and path loss exponent
+        self.measured_power_1, self.measured_power_2, self.measured_power_3 = measured_powers[:3]
+        self.path_loss_exponent = path_loss_exponent
+
+        # Array views of the receivers, used by the batch solver
+        self.receiver_positions = np.array(receiver_positions, dtype=float)
+        self.measured_powers = np.array(measured_powers, dtype=float)
+
+        # RSSI to distance lookup tables, rebuilt on every calibration change
+        self.distance_table_step = distance_table_step
+        self.distance_table = None
+        self.calibration_version = 0
+        self.__build_distance_table()
+
+        # Distance field of the grid estimator, rebuilt on every calibration change
+        self.grid_resolution = grid_resolution
+        self.grid_sigma = grid_sigma
+        self.grid_estimate = grid_estimate
+        self.grid = None
+        self.__build_grid()
+
+        # Warm start state: last solution and evaluation count per tag
+        self.warm_start = warm_start
+        self.previous_solutions = {}
+        self.previous_nfev = {}
+        self.solver_stats = SolverStats()
+        self.solve_cache = solve_cache
+
+    @classmethod
+    def from_base_stations(
+        cls,
         bp_1: tuple,
         bp_2: tuple,
         bp_3: tuple,
-        scale=32,
         measured_power_1=-69,
         measured_power_2=-69,
         measured_power_3=-69,
-        path_loss_exponent=1.8,
-    ):
+        **kwargs,
+    ) -> "TrilaterationController":
         """
-        Initialize the trilateration controller.
+        Create a trilateration controller for three base stations.
 
         Args:
             bp_1 (tuple): Position of base station 1.
             bp_2 (tuple): Position of base station 2.
             bp_3 (tuple): Position of base station 3.
-            scale (int, optional): Grid scale. Defaults to 32.
             measured_power_1 (int, optional): Measured power at base station 1. Defaults to -69.
             measured_power_2 (int, optional): Measured power at base station 2. Defaults to -69.
             measured_power_3 (int, optional): Measured power at base station 3. Defaults to -69.
-            path_loss_exponent (float, optional): Path loss exponent. Defaults to 1.8.
+            **kwargs: Other arguments of the constructor.
+
+        Returns:
+            TrilaterationController: The controller.
         """
-        # Base station positions
-        self.bp_1 = bp_1
-        self.bp_2 = bp_2
-        self.bp_3 = bp_3
+        return cls([bp_1, bp_2, bp_3], [measured_power_1, measured_power_2, measured_power_3], **kwargs)
 
-        # Grid scale
-        self.scale = scale
+    def set_calibration(
+        self, receiver_positions: list = None, measured_powers: list = None, path_loss_exponent: float = None
+    ):
+        """
+        Change the receiver positions, measured powers or path loss exponent, and rebuild
+        what is derived from them.
 
-        # Measured power and path loss exponent
-        self.measured_power_1 = measured_power_1
-        self.measured_power_2 = measured_power_2
-        self.measured_power_3 = measured_power_3
-        self.path_loss_exponent = path_loss_exponent
+        Args:
+            receiver_positions (list, optional): Position (x, y) of each receiver. Defaults to unchanged.
+            measured_powers (list, optional): Measured power at each receiver. Defaults to unchanged.
+            path_loss_exponent (float, optional): Path loss exponent. Defaults to unchanged.
+        """
+        if receiver_positions is not None:
+            self.receiver_positions = np.array(receiver_positions, dtype=float)
+            self.bp_1, self.bp_2, self.bp_3 = (tuple(position) for position in receiver_positions[:3])
+        if measured_powers is not None:
+            self.measured_powers = np.array(measured_powers, dtype=float)
+            self.measured_power_1, self.measured_power_2, self.measured_power_3 = measured_powers[:3]
+        if path_loss_exponent is not None:
+            self.path_loss_exponent = path_loss_exponent
+
+        self.calibration_version += 1
+        self.__build_distance_table()
+        self.__build_grid()
+        if self.solve_cache is not None:
+            self.solve_cache.invalidate()
+
+    @staticmethod
+    def select_receivers(scores: np.ndarray, k: int) -> tuple:
+        """
+        Select the k receivers with the highest score (e.g. strongest or freshest reading) per tag.
+
+        Args:
+            scores (np.ndarray): (N, receivers) array of scores, -inf for receivers without a reading.
+            k (int): Number of receivers to select.
+
+        Returns:
+            tuple: (N, k) array of receiver indices, best first, and (N, k) mask of the valid ones.
+        """
+        scores = np.asarray(scores, dtype=float)
+        k = min(k, scores.shape[1])
+
+        selected = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        selected_scores = np.take_along_axis(scores, selected, axis=1)
+        order = np.argsort(-selected_scores, axis=1)
+
+        receivers = np.take_along_axis(selected, order, axis=1)
+        valid = np.isfinite(np.take_along_axis(selected_scores, order, axis=1))
+        return receivers, valid
 
-    def get_position(self, rssi_1: float, rssi_2: float, rssi_3: float) -> tuple:
+    def get_position(
+        self, rssi_1: float, rssi_2: float, rssi_3: float, tag: str = None
+    ) -> tuple:
         """
         Calculates the estimated position based on the received signal strength indicator (RSSI) values
         and the known positions of three base stations.
@@ -49,6 +394,7 @@ class TrilaterationController:
             rssi_1 (float): The RSSI value received from base station 1.
             rssi_2 (float): The RSSI value received from base station 2.
             rssi_3 (float): The RSSI value received from base station 3.
+            tag (str, optional): Tag identifier used to seed warm-started solves. Defaults to None.
 
         Returns:
             tuple: The estimated position (x, y) scaled to fit within a 32x32 grid.
@@ -59,28 +405,166 @@ class TrilaterationController:
         d3 = self.get_distance(rssi_3, 3)
 
         # Trilateration
-        estimated_x, estimated_y = self.trilaterate(d1, d2, d3)
+        estimated_x, estimated_y = self.trilaterate(d1, d2, d3, tag=tag)
 
         # Scale the coordinates to fit within a 32x32 grid
         scaled_x, scaled_y = self.scale_coordinates(estimated_x, estimated_y)
 
         return scaled_x, scaled_y
 
-    def trilaterate(self, d1: float, d2: float, d3: float) -> tuple:
+    def get_positions(self, rssi: np.ndarray, refine: bool = True) -> np.ndarray:
+        """
+        Batch version of `get_position` for many tags at once.
+
+        Args:
+            rssi (np.ndarray): (N, receivers) array of RSSI values, one row per tag.
+            refine (bool, optional): Whether to run the Gauss-Newton refinement. Defaults to True.
+
+        Returns:
+            np.ndarray: (N, 2) integer array of positions scaled to the grid.
+        """
+        distances = self.get_distances(rssi)
+        positions = self.trilaterate_batch(distances, refine=refine)
+        return self.scale_coordinates_batch(positions)
+
+    def trilaterate_batch(
+        self,
+        distances: np.ndarray,
+        refine: bool = True,
+        iterations: int = 5,
+        receivers: np.ndarray = None,
+        weights: np.ndarray = None,
+    ) -> np.ndarray:
+        """
+        Trilaterates the positions of many tags at once.
+
+        The circle equations are linearized by subtracting the first one from the
+        others, which gives a closed-form least squares estimate for every tag from
+        a batch of 2x2 normal equations. The estimate can then be refined with a few
+        vectorized Gauss-Newton steps on the range residuals |p - bp_i| - d_i.
+
+        Args:
+            distances (np.ndarray): (N, k) array of distances, one row per tag.
+            refine (bool, optional): Whether to run the Gauss-Newton refinement. Defaults to True.
+            iterations (int, optional): Number of Gauss-Newton steps. Defaults to 5.
+            receivers (np.ndarray, optional): (N, k) array with the receiver of each distance.
+                Defaults to all receivers in order.
+            weights (np.ndarray, optional): (N, k) weights of the distances, 0 to ignore one.
+                The first distance of each row must be valid. Defaults to 1.
+
+        Returns:
+            np.ndarray: (N, 2) array with the (X, Y) coordinates of every tag.
+        """
+        distances = np.atleast_2d(np.asarray(distances, dtype=float))
+        if receivers is None:
+            receivers = np.broadcast_to(np.arange(distances.shape[1]), distances.shape)
+        weights = np.ones(distances.shape) if weights is None else np.asarray(weights, dtype=float)
+
+        cache = self.solve_cache
+        if cache is None or len(distances) == 0:
+            return self.__trilaterate_batch(distances, refine, iterations, receivers, weights)
+
+        # Solve only the rows without a cached result
+        keys = cache.batch_keys((self.calibration_version, refine, iterations), distances, receivers, weights)
+        cached = [cache.get(key) for key in keys]
+        missing = np.array([result is None for result in cached])
+
+        positions = np.empty((len(distances), 2))
+        if np.any(missing):
+            solved = self.__trilaterate_batch(
+                distances[missing], refine, iterations, receivers[missing], weights[missing]
+            )
+            positions[missing] = solved
+            for i, position in zip(np.flatnonzero(missing), solved):
+                cache.put(keys[i], tuple(position))
+        if not np.all(missing):
+            positions[~missing] = [result for result in cached if result is not None]
+        return positions
+
+    def __trilaterate_batch(self, distances, refine, iterations, receivers, weights):
+        anchors = self.receiver_positions[receivers]
+        distances = np.where(weights > 0, distances, 0.0)
+        ridge = 1e-9 * np.eye(2)
+
+        # Formula (i = 2..k):
+        # 2(xi - x1)x + 2(yi - y1)y = d1^2 - di^2 + xi^2 - x1^2 + yi^2 - y1^2
+        a = 2 * (anchors[:, 1:] - anchors[:, :1])
+        b = (
+            distances[:, :1] ** 2
+            - distances[:, 1:] ** 2
+            + np.sum(anchors[:, 1:] ** 2, axis=2)
+            - np.sum(anchors[:, :1] ** 2, axis=2)
+        )
+        w = weights[:, 1:] * weights[:, :1]
+        ata = np.einsum("nki,nk,nkj->nij", a, w, a) + ridge
+        atb = np.einsum("nki,nk,nk->ni", a, w, b)
+        positions = np.linalg.solve(ata, atb[..., None])[..., 0]
+
+        if not refine:
+            return positions
+
+        for _ in range(iterations):
+            # Residuals and Jacobian of |p - bp_i| - d_i for every tag
+            delta = positions[:, None, :] - anchors
+            ranges = np.maximum(np.linalg.norm(delta, axis=2), 1e-9)
+            residuals = (ranges - distances) * weights
+            jacobian = delta / ranges[..., None] * weights[..., None]
+
+            # Solve the normal equations (J^T J) step = J^T r for all tags
+            jt = jacobian.transpose(0, 2, 1)
+            jtj = jt @ jacobian + ridge
+            jtr = jt @ residuals[..., None]
+            positions = positions - np.linalg.solve(jtj, jtr)[..., 0]
+
+        return positions
+
+    def locate_grid(self, distances: np.ndarray, receivers: np.ndarray = None, weights: np.ndarray = None) -> np.ndarray:
+        """
+        Alternative to `trilaterate_batch` scoring the cells of the `GridEstimator`, same arguments.
+
+        Returns:
+            np.ndarray: (N, 2) array with the (X, Y) coordinates of every tag.
+        """
+        if self.grid is None:
+            raise ValueError("The grid estimator is disabled, set a grid_resolution")
+        return self.grid.locate(distances, receivers, weights)
+
+    def trilaterate(
+        self, d1: float, d2: float, d3: float, tag: str = None, receivers: tuple = (0, 1, 2)
+    ) -> tuple:
         """
         Trilaterates the position (X, Y) given the distances of three points.
 
+        In warm start mode, the solve for a known tag starts from its previous solution,
+        uses the analytic Jacobian and caps the function evaluations at twice what the
+        previous solve needed. If the cap is hit, the solve is repeated from scratch.
+
         Args:
             d1 (float): distance from the first point to the unknown position.
             d2 (float): distance from the second point to the unknown position.
             d3 (float): distance from the third point to the unknown position.
+            tag (str, optional): Tag identifier used to seed warm-started solves. Defaults to None.
+            receivers (tuple, optional): Indices of the receivers the distances belong to. Defaults to (0, 1, 2).
 
         Returns:
             tuple: The (X, Y) coordinates of the unknown position.
         """
-        x1, y1 = self.bp_1
-        x2, y2 = self.bp_2
-        x3, y3 = self.bp_3
+        # Stationary tags are served from the cache
+        cache_key = None
+        if self.solve_cache is not None:
+            try:
+                cache_key = self.solve_cache.key(self.calibration_version, receivers, (d1, d2, d3))
+            except (ValueError, OverflowError):
+                pass
+        if cache_key is not None:
+            cached = self.solve_cache.get(cache_key)
+            if cached is not None:
+                if self.warm_start and tag is not None:
+                    self.previous_solutions[tag] = cached
+                    self.previous_nfev.setdefault(tag, MIN_WARM_START_NFEV)
+                return cached[0], cached[1]
+
+        (x1, y1), (x2, y2), (x3, y3) = self.receiver_positions[list(receivers)]
 
         # Formula:
         # (x - x1)^2 + (y - y1)^2 = d1^2
@@ -95,11 +579,54 @@ class TrilaterationController:
                 (x - x3) ** 2 + (y - y3) ** 2 - (d3 - r) ** 2,
             )
 
+        # Partial derivatives of the equations with respect to (x, y, r)
+        def jacobian(guess):
+            x, y, r = guess
+
+            return np.array(
+                [
+                    [2 * (x - x1), 2 * (y - y1), 2 * (d1 - r)],
+                    [2 * (x - x2), 2 * (y - y2), 2 * (d2 - r)],
+                    [2 * (x - x3), 2 * (y - y3), 2 * (d3 - r)],
+                ]
+            )
+
         # Initial guess
         initial_guess = (0, 0, 0)
 
         # Use least squares to solve the equations
-        results = least_squares(equations, initial_guess)
+        start = time.perf_counter()
+        if not self.warm_start:
+            results = least_squares(equations, initial_guess)
+        elif tag in self.previous_solutions:
+            max_nfev = min(
+                max(2 * self.previous_nfev[tag], MIN_WARM_START_NFEV),
+                MAX_WARM_START_NFEV,
+            )
+            results = least_squares(
+                equations,
+                self.previous_solutions[tag],
+                jac=jacobian,
+                max_nfev=max_nfev,
+            )
+
+            # The cap was hit, solve again from the initial guess
+            if results.status == 0:
+                self.solver_stats.fallbacks += 1
+                results = least_squares(equations, initial_guess, jac=jacobian)
+        else:
+            results = least_squares(equations, initial_guess, jac=jacobian)
+        latency = time.perf_counter() - start
+
+        self.solver_stats.record(latency, results.nfev, results.njev)
+
+        # Keep the solution to seed the next solve of this tag
+        if self.warm_start and tag is not None:
+            self.previous_solutions[tag] = results.x
+            self.previous_nfev[tag] = results.nfev
+
+        if cache_key is not None:
+            self.solve_cache.put(cache_key, results.x)
 
         # Return the estimated coordinates
         coordinates = results.x
@@ -111,22 +638,37 @@ class TrilaterationController:
 
         Parameters:
         - rssi (float): The received signal strength indicator in dBm.
-        - node (int): The node number (1, 2, or 3) corresponding to the base station.
+        - node (int): The node number (1 to the number of receivers) corresponding to the base station.
 
         Returns:
         - distance (float): The calculated distance between the devices in meters.
         """
-        if node == 1:
-            measured_power = self.measured_power_1
-        elif node == 2:
-            measured_power = self.measured_power_2
-        elif node == 3:
-            measured_power = self.measured_power_3
-        else:
+        if not 1 <= node <= len(self.measured_powers):
             raise ValueError("Invalid node number")
+        measured_power = self.measured_powers[node - 1]
 
         return 10 ** ((measured_power - rssi) / (10 * self.path_loss_exponent))
 
+    def get_distances(self, rssi: np.ndarray, receivers: np.ndarray = None) -> np.ndarray:
+        """
+        Batch version of `get_distance`, a gather in the `DistanceTable` if it is enabled.
+
+        Parameters:
+        - rssi (np.ndarray): (N, k) array of RSSI values in dBm.
+        - receivers (np.ndarray, optional): (N, k) array with the receiver of each value. Defaults to all receivers in order.
+
+        Returns:
+        - distances (np.ndarray): (N, k) array of distances in meters.
+        """
+        rssi = np.asarray(rssi, dtype=float)
+        if self.distance_table is not None:
+            if receivers is None:
+                receivers = np.broadcast_to(np.arange(rssi.shape[-1]), rssi.shape)
+            return self.distance_table.lookup(rssi, receivers)
+
+        measured_powers = self.measured_powers if receivers is None else self.measured_powers[receivers]
+        return 10 ** ((measured_powers - rssi) / (10 * self.path_loss_exponent))
+
     def scale_coordinates(self, x: float, y: float) -> tuple:
         """
         Scale the given coordinates to fit within the specified max_value.
@@ -139,8 +681,7 @@ class TrilaterationController:
         tuple: A tuple containing the scaled x and y coordinates.
         """
         # Maximum x and y values from the base stations
-        initial_x = max(self.bp_1[0], self.bp_2[0], self.bp_3[0])
-        initial_y = max(self.bp_1[1], self.bp_2[1], self.bp_3[1])
+        initial_x, initial_y = np.max(self.receiver_positions, axis=0)
 
         # Scale the coordinates
         scaled_x = int((x / initial_x) * self.scale)
@@ -152,6 +693,39 @@ class TrilaterationController:
 
         return scaled_x, scaled_y
 
+    def scale_coordinates_batch(self, positions: np.ndarray) -> np.ndarray:
+        """
+        Batch version of `scale_coordinates`.
+
+        Parameters:
+        positions (np.ndarray): (N, 2) array of (x, y) coordinates.
+
+        Returns:
+        np.ndarray: (N, 2) integer array of scaled coordinates.
+        """
+        # Maximum x and y values from the base stations
+        initial = np.max(self.receiver_positions, axis=0)
+
+        # Scale the coordinates and keep them within the grid
+        scaled = (np.asarray(positions, dtype=float) / initial * self.scale).astype(int)
+        return np.clip(scaled, 0, self.scale - 1)
+
+    def __build_distance_table(self):
+        self.distance_table = None
+        if self.distance_table_step > 0:
+            self.distance_table = DistanceTable(self.measured_powers, self.path_loss_exponent, self.distance_table_step)
+
+    def __build_grid(self):
+        self.grid = None
+        if self.grid_resolution > 0:
+            self.grid = GridEstimator(
+                self.receiver_positions,
+                self.grid_resolution,
+                self.path_loss_exponent,
+                self.grid_sigma,
+                self.grid_estimate,
+            )
+
     def __str__(self):
         return f"TrilaterationController(bp_1={self.bp_1}, bp_2={self.bp_2}, bp_3={self.bp_3})"
 
@@ -176,7 +750,7 @@ if __name__ == "__main__":
     rssi_3 = val_str[2]
 
     # Test TrilaterationController
-    position_estimator = TrilaterationController(
+    position_estimator = TrilaterationController.from_base_stations(
         receiver_1_pos,
         receiver_2_pos,
         receiver_3_pos,
@@ -200,3 +774,29 @@ if __name__ == "__main__":
 
     print(f"Estimated position: {position}")
     print(f"Scaled position:    {position2}")
+
+    # Batch solve
+    positions = position_estimator.trilaterate_batch([[d1, d2, d3]])
+    print(f"Batch position:     {tuple(positions[0])}")
+
+    # Cold vs warm-started solves for a slowly moving tag
+    warm_estimator = TrilaterationController.from_base_stations(
+        receiver_1_pos,
+        receiver_2_pos,
+        receiver_3_pos,
+        measured_power_1=-40,
+        measured_power_2=-40,
+        measured_power_3=-40,
+        path_loss_exponent=1.8,
+        warm_start=True,
+    )
+    position_estimator.solver_stats.reset()
+    for step in range(100):
+        drift = 0.05 * step
+        rssi = (rssi_1 + drift, rssi_2 - drift, rssi_3)
+        position_estimator.get_position(*rssi)
+        warm_estimator.get_position(*rssi, tag="tag")
+
+    print()
+    print(f"Cold start: {position_estimator.solver_stats}")
+    print(f"Warm start: {warm_estimator.solver_stats}")
@@ -0,0 +1,168 @@
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+CAPTURE_MAGIC = b"BCAP"  # First bytes of a capture file
+CAPTURE_VERSION = 1
+INDEX_INTERVAL = 256  # Records between two index entries
+FLUSH_INTERVAL = 1  # Maximum time records stay buffered (seconds)
+
+# Magic and version of the file
+FILE_HEADER = struct.Struct("<4sH")
+# Receive time (seconds since the epoch), topic length and payload length of a record
+RECORD_HEADER = struct.Struct("<dHI")
+# Offset and receive time of an indexed record
+INDEX_DTYPE = np.dtype([("offset", "<u8"), ("time", "<f8")])
+
+
+class CaptureWriter:
+    def __init__(self, path: str):
+        """
+        Append-only log of the raw MQTT messages received by the server.
+
+        Every record holds the receive time, topic and payload of one message. The
+        offset and time of every `INDEX_INTERVAL`-th record is written to `<path>.idx`,
+        so a reader can start at any time without scanning the log. Appending to an
+        existing capture continues it. The records are written by a background thread at
+        least every `FLUSH_INTERVAL`, also when no message arrives.
+
+        Args:
+            path (str): The capture file.
+        """
+        self.path = path
+        self.records = 0
+
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.__file = open(path, "ab")
+        self.__index = open(path + ".idx", "ab")
+        if new:
+            self.__file.write(FILE_HEADER.pack(CAPTURE_MAGIC, CAPTURE_VERSION))
+        else:
+            CaptureReader.check_header(path)
+
+        # Flushes the buffered records until the capture is closed
+        self.__flushed = 0
+        self.__closed = threading.Event()
+        self.__flusher = threading.Thread(target=self.__flush_periodically, name="capture-flush", daemon=True)
+        self.__flusher.start()
+
+    def append(self, topic: str, payload: bytes, receive_time: float = None):
+        """
+        Append one message.
+
+        Args:
+            topic (str): The topic of the message.
+            payload (bytes): The raw payload.
+            receive_time (float, optional): Time the message was received (seconds since the epoch). Defaults to now.
+        """
+        if receive_time is None:
+            receive_time = time.time()
+
+        topic = topic.encode("utf-8")
+        if self.records % INDEX_INTERVAL == 0:
+            self.__index.write(np.array([(self.__file.tell(), receive_time)], dtype=INDEX_DTYPE).tobytes())
+
+        self.__file.write(RECORD_HEADER.pack(receive_time, len(topic), len(payload)))
+        self.__file.write(topic)
+        self.__file.write(payload)
+        self.records += 1
+
+    def flush(self):
+        """
+        Write the buffered records to the file.
+        """
+        self.__file.flush()
+        self.__index.flush()
+
+    def close(self):
+        """
+        Flush and close the capture.
+        """
+        self.__closed.set()
+        self.__flusher.join()
+        self.__file.close()
+        self.__index.close()
+
+    def __flush_periodically(self):
+        # Bound the records lost if the server stops unexpectedly, the file objects lock their writes
+        while not self.__closed.wait(FLUSH_INTERVAL):
+            if self.records != self.__flushed:
+                self.__flushed = self.records
+                self.flush()
+
+
+class CaptureReader:
+    def __init__(self, path: str):
+        """
+        Reads the messages of a capture written by `CaptureWriter`.
+
+        Args:
+            path (str): The capture file.
+        """
+        self.path = path
+        self.check_header(path)
+
+        index_path = path + ".idx"
+        if os.path.exists(index_path):
+            self.index = np.fromfile(index_path, dtype=INDEX_DTYPE)
+        else:
+            self.index = np.empty(0, dtype=INDEX_DTYPE)
+
+    @staticmethod
+    def check_header(path: str):
+        """
+        Check that a file is a capture of a supported version, raise ValueError otherwise.
+        """
+        with open(path, "rb") as file:
+            header = file.read(FILE_HEADER.size)
+
+        if len(header) < FILE_HEADER.size:
+            raise ValueError(f"{path} is not a capture file")
+        magic, version = FILE_HEADER.unpack(header)
+        if magic != CAPTURE_MAGIC:
+            raise ValueError(f"{path} is not a capture file")
+        if version != CAPTURE_VERSION:
+            raise ValueError(f"Unsupported capture version {version} in {path}")
+
+    def read(self, start_time: float = None):
+        """
+        Iterate over the messages, oldest first.
+
+        A record cut short at the end of the file, e.g. by a crash while writing, ends
+        the iteration.
+
+        Args:
+            start_time (float, optional): Skip the messages received before this time. Defaults to the first message.
+
+        Yields:
+            tuple: The receive time, topic and payload of each message.
+        """
+        offset = FILE_HEADER.size
+        if start_time is not None and len(self.index):
+            # Start at the last indexed record received before the start time
+            position = np.searchsorted(self.index["time"], start_time, side="right") - 1
+            if position >= 0:
+                offset = int(self.index["offset"][position])
+
+        with open(self.path, "rb") as file:
+            file.seek(offset)
+            while True:
+                header = file.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    return
+                receive_time, topic_length, payload_length = RECORD_HEADER.unpack(header)
+
+                topic = file.read(topic_length)
+                payload = file.read(payload_length)
+                if len(topic) < topic_length or len(payload) < payload_length:
+                    return
+
+                if start_time is not None and receive_time < start_time:
+                    continue
+                yield receive_time, topic.decode("utf-8"), payload
+
+    def __iter__(self):
+        return self.read()
@@ -0,0 +1,301 @@
+import bisect
+import json
+import logging
+import time
+import zlib
+
+HASH_RING_REPLICAS = 64  # Points per member on the hash ring
+HANDOFF_BATCH_SIZE = 500  # Tags per handoff message
+
+
+class HashRing:
+    def __init__(self, members: list = (), replicas: int = HASH_RING_REPLICAS):
+        """
+        Consistent hash ring assigning keys to members.
+
+        Every member owns `replicas` points on the ring and a key belongs to the member
+        of the first point after its hash, so adding or removing a member only moves
+        the keys of its own points.
+
+        Args:
+            members (list, optional): The initial members. Defaults to none.
+            replicas (int, optional): Points per member. Defaults to HASH_RING_REPLICAS.
+        """
+        self.replicas = replicas
+        self.members = set()
+        self.__points = []
+        self.__owners = []
+
+        for member in members:
+            self.add(member)
+
+    def add(self, member: str):
+        """
+        Add a member and its points.
+        """
+        if member in self.members:
+            return
+        self.members.add(member)
+
+        for replica in range(self.replicas):
+            point = zlib.crc32(f"{member}#{replica}".encode())
+            position = bisect.bisect(self.__points, point)
+            self.__points.insert(position, point)
+            self.__owners.insert(position, member)
+
+    def remove(self, member: str):
+        """
+        Remove a member and its points.
+        """
+        if member not in self.members:
+            return
+        self.members.discard(member)
+
+        kept = [(point, owner) for point, owner in zip(self.__points, self.__owners) if owner != member]
+        self.__points = [point for point, _ in kept]
+        self.__owners = [owner for _, owner in kept]
+
+    def owner(self, key: str) -> str:
+        """
+        Get the member owning a key, or None if the ring is empty.
+        """
+        if not self.__points:
+            return None
+        position = bisect.bisect(self.__points, zlib.crc32(key.encode())) % len(self.__points)
+        return self.__owners[position]
+
+    def __len__(self):
+        return len(self.members)
+
+    def __contains__(self, member):
+        return member in self.members
+
+
+class ClusterNode:
+    def __init__(
+        self,
+        client,
+        instance_id: str,
+        group: str,
+        pipeline,
+        position_cache,
+        on_readings,
+        topic_prefix: str = "/positioning",
+        member_timeout: float = 15,
+    ):
+        """
+        Membership of one server instance in a cluster sharing the receiver topics.
+
+        The instances split the receiver messages with an MQTT shared subscription and
+        every tag is owned by one instance, chosen on a consistent hash ring of the live
+        instances. Readings of tags owned elsewhere are forwarded to their owner, and
+        when an instance joins or leaves, the tags that change owner are handed over
+        with their filter state and readings. Positions are published to all instances.
+
+        Topics, below `topic_prefix`:
+            members/<id>: Retained heartbeats, cleared by the last will when an instance dies.
+            forward/<id>: Readings of the tags owned by an instance.
+            handoff/<id>: State of the tags handed over to an instance.
+            positions: Positions and evicted tags published by every instance.
+
+        Args:
+            client (mqtt.Client): The MQTT client, not connected yet.
+            instance_id (str): Unique identifier of this instance.
+            group (str): Name of the shared subscription group.
+            pipeline (PositioningPipeline): The pipeline of the tags owned by this instance.
+            position_cache (PositionCache): Receives the positions of all instances.
+            on_readings (callable): Called with the receiver index, MACs, timestamps, RSSI
+                and receipt time of the forwarded readings to ingest.
+            topic_prefix (str, optional): Prefix of the cluster topics. Defaults to "/positioning".
+            member_timeout (float, optional): Seconds without heartbeat after which an instance is dropped. Defaults to 15.
+        """
+        self.client = client
+        self.instance_id = instance_id
+        self.group = group
+        self.pipeline = pipeline
+        self.position_cache = position_cache
+        self.on_readings = on_readings
+        self.topic_prefix = topic_prefix
+        self.member_timeout = member_timeout
+
+        self.ring = HashRing([instance_id])
+        self.__last_seen = {}
+        self.__receiver_indices = {receiver["name"]: i for i, receiver in enumerate(pipeline.receivers)}
+
+        self.member_topic = f"{topic_prefix}/members/{instance_id}"
+        self.forward_topic = f"{topic_prefix}/forward/{instance_id}"
+        self.handoff_topic = f"{topic_prefix}/handoff/{instance_id}"
+        self.positions_topic = f"{topic_prefix}/positions"
+
+        # Readings forwarded to and received from other instances, tags handed over and taken over
+        self.stats = {"forwarded": 0, "received": 0, "handed_over": 0, "taken_over": 0}
+
+        # Other instances drop this one when the connection is lost
+        client.will_set(self.member_topic, b"", qos=1, retain=True)
+
+    def subscriptions(self, subscription: str) -> list:
+        """
+        Get the (topic, qos) subscriptions of the instance.
+
+        Args:
+            subscription (str): The receiver topics subscription, shared by the group.
+
+        Returns:
+            list: The subscriptions to pass to `client.subscribe`.
+        """
+        return [
+            (f"$share/{self.group}/{subscription}", 0),
+            (f"{self.topic_prefix}/members/+", 1),
+            (self.forward_topic, 1),
+            (self.handoff_topic, 1),
+            (self.positions_topic, 0),
+        ]
+
+    def heartbeat(self):
+        """
+        Announce the instance, called on connect and then periodically.
+        """
+        payload = json.dumps({"id": self.instance_id, "time": time.time()})
+        self.client.publish(self.member_topic, payload, qos=1, retain=True)
+
+    def leave(self):
+        """
+        Hand all tags over to the other instances and leave the cluster.
+        """
+        self.ring.remove(self.instance_id)
+        self.__rebalance()
+        self.client.publish(self.member_topic, b"", qos=1, retain=True)
+
+    def route(self, receiver_index: int, macs: list, timestamps: list, rssi: list) -> tuple:
+        """
+        Forward the readings of the tags owned by other instances.
+
+        Args:
+            receiver_index (int): Index of the receiver.
+            macs (list): The upper case MAC address of each reading.
+            timestamps (list): Timestamp of each reading (seconds since the epoch).
+            rssi (list): RSSI of each reading.
+
+        Returns:
+            tuple: The MACs, timestamps and RSSI of the readings owned by this instance.
+        """
+        local = ([], [], [])
+        remote = {}
+        for reading in zip(macs, timestamps, rssi):
+            owner = self.ring.owner(reading[0])
+            if owner == self.instance_id:
+                for column, value in zip(local, reading):
+                    column.append(value)
+            else:
+                remote.setdefault(owner, []).append(reading)
+
+        receiver = self.pipeline.receivers[receiver_index]["name"]
+        for owner, readings in remote.items():
+            payload = json.dumps({"receiver": receiver, "readings": readings})
+            self.client.publish(f"{self.topic_prefix}/forward/{owner}", payload, qos=1)
+            self.stats["forwarded"] += len(readings)
+        return local
+
+    def publish_positions(self, positions: dict = None, evicted: list = None):
+        """
+        Publish the positions solved and the tags evicted by this instance to all instances.
+
+        Args:
+            positions (dict, optional): Maps each tag to its (position, coordinates, distances, timestamps) tuple.
+            evicted (list, optional): The evicted tags.
+        """
+        payload = {"from": self.instance_id, "positions": positions or {}, "evicted": evicted or []}
+        self.client.publish(self.positions_topic, json.dumps(payload), qos=0)
+
+    def handle_message(self, message, receipt_time: float = None) -> bool:
+        """
+        Handle a message on one of the cluster topics.
+
+        Args:
+            message (mqtt.MQTTMessage): The received message.
+            receipt_time (float, optional): `time.perf_counter()` when the message was received. Defaults to now.
+
+        Returns:
+            bool: Whether the message was on a cluster topic.
+        """
+        topic = message.topic
+        if not topic.startswith(self.topic_prefix + "/"):
+            return False
+
+        if topic.startswith(f"{self.topic_prefix}/members/"):
+            self.__on_member(topic.rsplit("/", 1)[1], message.payload)
+        elif topic == self.forward_topic:
+            self.__on_forward(json.loads(message.payload), receipt_time)
+        elif topic == self.handoff_topic:
+            self.__on_handoff(json.loads(message.payload))
+        elif topic == self.positions_topic:
+            self.__on_positions(json.loads(message.payload))
+        return True
+
+    def __on_member(self, member_id: str, payload: bytes):
+        now = time.time()
+        if member_id != self.instance_id:
+            if payload:
+                self.__last_seen[member_id] = now
+            else:
+                self.__last_seen.pop(member_id, None)
+
+        # Drop the instances that stopped sending heartbeats
+        for other_id, last_seen in list(self.__last_seen.items()):
+            if now - last_seen > self.member_timeout:
+                del self.__last_seen[other_id]
+
+        members = set(self.__last_seen) | {self.instance_id}
+        if members == self.ring.members:
+            return
+
+        joined = members - self.ring.members
+        left = self.ring.members - members
+        logging.info(f"Cluster members changed, joined: {sorted(joined)}, left: {sorted(left)}")
+        self.ring = HashRing(members)
+        self.__rebalance()
+
+    def __rebalance(self):
+        # Hand over the tags that now belong to another instance
+        moved = {}
+        for tag_mac in self.pipeline.tag_registry.macs():
+            owner = self.ring.owner(tag_mac)
+            if owner is not None and owner != self.instance_id:
+                moved.setdefault(owner, []).append(tag_mac)
+
+        for owner, macs in moved.items():
+            for start in range(0, len(macs), HANDOFF_BATCH_SIZE):
+                batch = macs[start:start + HANDOFF_BATCH_SIZE]
+                payload = json.dumps({"from": self.instance_id, "tags": self.pipeline.export_tags(batch)})
+                self.client.publish(f"{self.topic_prefix}/handoff/{owner}", payload, qos=1)
+                self.pipeline.remove_tags(batch)
+
+            logging.info(f"Handed over {len(macs)} tags to {owner}")
+            self.stats["handed_over"] += len(macs)
+
+    def __on_forward(self, payload: dict, receipt_time: float):
+        receiver_index = self.__receiver_indices.get(payload["receiver"])
+        if receiver_index is None or not payload["readings"]:
+            return
+
+        macs, timestamps, rssi = (list(column) for column in zip(*payload["readings"]))
+        self.stats["received"] += len(macs)
+        self.on_readings(receiver_index, macs, timestamps, rssi, receipt_time)
+
+    def __on_handoff(self, payload: dict):
+        imported = self.pipeline.import_tags(payload["tags"])
+        logging.info(f"Took over {len(imported)} tags from {payload['from']}")
+        self.stats["taken_over"] += len(imported)
+
+    def __on_positions(self, payload: dict):
+        # The positions of this instance are already in the cache
+        if payload["from"] == self.instance_id:
+            return
+
+        if payload["evicted"]:
+            self.position_cache.remove(payload["evicted"])
+        if payload["positions"]:
+            self.position_cache.publish({
+                tag_mac: tuple(tuple(values) for values in snapshot)
+                for tag_mac, snapshot in payload["positions"].items()
+            })
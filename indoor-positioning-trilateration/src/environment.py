@@ -2,19 +2,55 @@
 RUN_PIXEL_DISPLAY = False  # Whether to run the pixel display
 GRAPH_REFRESH_INTERVAL = 2  # Refresh interval for the graph (seconds)
 DISPLAY_REFRESH_INTERVAL = 4  # Refresh interval for the pixe ldisplay (seconds)
+PROCESS_LATENCY_BUDGET = 0.05  # Time new readings are coalesced before positions are recomputed (seconds)
+RUNTIME = "asyncio"  # "asyncio" (one event loop for MQTT, processing and display) or "threads"
+SHARDS = 0  # Worker processes the tags are partitioned across by MAC, 0 processes them in the server (not on Windows)
+METRICS_PORT = 9108  # Port of the local Prometheus metrics endpoint, 0 disables it
+METRICS_HOST = "127.0.0.1"  # Address the metrics endpoint listens on
+CAPTURE_PATH = ""  # File the raw receiver messages are appended to for replay, empty disables the capture
+LOG_LEVEL = "INFO"  # Level of the server logs, "DEBUG" adds the per message and per tag traces
+LOG_QUEUE = True  # Whether the logs are written by a background thread instead of the thread logging them
+TAG_LOG_INTERVAL = 5  # Minimum time between two traces of the same tag or topic (seconds), 0 traces everything
 
-# Receiver 1
-RECEIVER_1_POS = (0, 0) # 82
-RECEIVER_1_TX_POWER = -59
+# Cluster of server instances splitting the receiver topics with a shared subscription
+CLUSTER_GROUP = ""  # Shared subscription group, empty runs a single instance
+CLUSTER_TOPIC_PREFIX = "/positioning"  # Prefix of the membership, forwarding, handoff and position topics
+CLUSTER_HEARTBEAT_INTERVAL = 5  # Interval between heartbeats of an instance (seconds)
+CLUSTER_MEMBER_TIMEOUT = 15  # Seconds without heartbeat after which an instance is dropped
 
-# Receiver 2
-RECEIVER_2_POS = (9, 0) # 87
-RECEIVER_2_TX_POWER = -59
-
-# Receiver 3
-RECEIVER_3_POS = (4, 2.5)
-RECEIVER_3_TX_POWER = -90
+# Receivers: name, MQTT topic, position (meters) and measured power at 1 meter
+RECEIVERS = [
+    {"name": "receiver_1", "topic": "/gw/receiver_1/status", "position": (0, 0), "tx_power": -59},  # 82
+    {"name": "receiver_2", "topic": "/gw/receiver_2/status", "position": (9, 0), "tx_power": -59},  # 87
+    {"name": "receiver_3", "topic": "/gw/receiver_3/status", "position": (4, 2.5), "tx_power": -90},
+]
+MQTT_SUBSCRIPTION = "/gw/+/status"  # Single (wildcard) subscription covering all receiver topics
+RECEIVERS_PER_SOLVE = 4  # Number of receivers used to solve each tag's position
+RECEIVER_SELECTION = "strongest"  # "strongest" (highest filtered RSSI) or "freshest" (latest reading)
+FUSION_WINDOW = 5  # Readings older than this before the newest one of a tag are not fused (seconds), 0 fuses all
 
 
 # Constants
 PATH_LOSS_EXPONENT = 1.8  # Path loss exponent (typically between 2 and 4)
+DISTANCE_TABLE_STEP = 0.1  # RSSI resolution of the per receiver distance lookup tables (dB), 0 evaluates the model
+
+# Tags
+MAX_TAGS = 10000  # Maximum number of tracked tags, the least recently seen is evicted
+TAG_TTL = 300  # Seconds without readings after which a tag is evicted
+TAG_EVICTION_INTERVAL = 10  # Interval between checks for idle tags (seconds)
+
+# Solver
+SOLVER_MODE = "batch"  # "batch" (vectorized), "warm_start" (per tag least squares), "grid" (likelihood over cells), "fingerprint" or "particle"
+SOLVE_CACHE_SIZE = 10000  # Solves kept in the LRU cache for tags that sit still, 0 disables the cache
+SOLVE_CACHE_RESOLUTION = 0.1  # Quantization of the distances keying the solve cache (meters)
+GRID_RESOLUTION = 32  # Cells along each axis of the grid solver, 32 matches the pixel display
+GRID_SIGMA = 2.0  # Standard deviation of the filtered RSSI assumed by the grid solver (dB)
+GRID_ESTIMATE = "centroid"  # "centroid" (likelihood weighted) or "argmax" (best cell) position of the grid solver
+FINGERPRINT_MAP = ""  # Radio map (.npz) of the fingerprint solver, built with fingerprint.py from a survey
+FINGERPRINT_K = 4  # Nearest fingerprints averaged per tag
+FINGERPRINT_MAX_MISMATCH = 10  # RMS RSSI difference with the nearest fingerprint above which a tag is trilaterated (dB)
+PARTICLES_MIN = 32  # Particles of a settled tag in the particle solver
+PARTICLES_MAX = 256  # Particles of a new or uncertain tag in the particle solver, PARTICLES_MIN times a power of two
+PARTICLE_DENSITY = 64  # Particles per square meter of the spread of a tag, sets its particle count
+PARTICLE_SPEED = 1.5  # Walking speed the particles of a tag spread at (m/s)
+PARTICLE_SIGMA = 2.0  # Standard deviation of the filtered RSSI assumed by the particle solver (dB)
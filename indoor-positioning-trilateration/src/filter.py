@@ -20,3 +20,159 @@ def apply_kalman_filter(kf, new_value):
     kf.predict()
     kf.update(np.array([new_value]))
     return kf.x  # This is the filtered value
+
+
+class KalmanBank:
+    def __init__(self, n_receivers: int = 3, capacity: int = 16):
+        """
+        Scalar Kalman filters for every (tag, receiver) pair, stored as contiguous arrays.
+
+        Each filter is the 1D constant model of `initialize_kalman_filter` and the updates
+        follow the same arithmetic as filterpy, so the results are identical.
+
+        Args:
+            n_receivers (int, optional): Number of receivers per tag. Defaults to 3.
+            capacity (int, optional): Initial number of tag rows. Grows as needed. Defaults to 16.
+        """
+        self.n_receivers = n_receivers
+        self.n_tags = 0
+
+        # State, covariance, process noise and measurement noise
+        self.x = np.zeros((capacity, n_receivers))
+        self.P = np.full((capacity, n_receivers), 1000.0)
+        self.Q = np.ones((capacity, n_receivers))
+        self.R = np.full((capacity, n_receivers), float(UNCERTAINTY))
+
+    def add_tag(self) -> int:
+        """
+        Allocate the filters of a new tag.
+
+        Returns:
+            int: The row index of the tag.
+        """
+        if self.n_tags == len(self.x):
+            self.__grow(max(2 * len(self.x), 1))
+
+        tag_index = self.n_tags
+        self.n_tags += 1
+        self.reset(tag_index)
+        return tag_index
+
+    def reset(self, tag_index: int):
+        """
+        Reset the filters of a tag to their initial state.
+
+        Args:
+            tag_index (int): The row index of the tag.
+        """
+        self.x[tag_index] = 0.0
+        self.P[tag_index] = 1000.0
+        self.Q[tag_index] = 1.0
+        self.R[tag_index] = UNCERTAINTY
+
+    def get_state(self, tag_index: int) -> tuple:
+        """
+        Get the state and covariance of the filters of a tag.
+
+        Args:
+            tag_index (int): The row index of the tag.
+
+        Returns:
+            tuple: Copies of the (receivers,) state and covariance arrays.
+        """
+        return self.x[tag_index].copy(), self.P[tag_index].copy()
+
+    def set_state(self, tag_index: int, x: np.ndarray, P: np.ndarray):
+        """
+        Restore the state and covariance of the filters of a tag, e.g. from `get_state`.
+
+        Args:
+            tag_index (int): The row index of the tag.
+            x (np.ndarray): The (receivers,) state.
+            P (np.ndarray): The (receivers,) covariance.
+        """
+        self.x[tag_index] = x
+        self.P[tag_index] = P
+
+    def update(self, tag_index: int, receiver_index: int, value: float) -> float:
+        """
+        Predict and update the filter of one (tag, receiver) pair in place.
+
+        Args:
+            tag_index (int): The row index of the tag.
+            receiver_index (int): The index of the receiver.
+            value (float): The new measurement.
+
+        Returns:
+            float: The filtered value.
+        """
+        x = float(self.x[tag_index, receiver_index])
+        P = float(self.P[tag_index, receiver_index])
+        R = float(self.R[tag_index, receiver_index])
+
+        # Predict
+        P = P + float(self.Q[tag_index, receiver_index])
+
+        # Update
+        K = P * (1.0 / (P + R))
+        x = x + K * (value - x)
+        I_KH = 1.0 - K
+        P = I_KH * P * I_KH + K * R * K
+
+        self.x[tag_index, receiver_index] = x
+        self.P[tag_index, receiver_index] = P
+        return x
+
+    def update_many(
+        self, tag_indices: np.ndarray, receiver_indices: np.ndarray, values: np.ndarray
+    ) -> np.ndarray:
+        """
+        Apply a batch of measurements with vectorized updates.
+
+        Measurements for the same (tag, receiver) pair are applied in order, so the
+        result is the same as calling `update` for each of them.
+
+        Args:
+            tag_indices (np.ndarray): Row index of the tag of each measurement.
+            receiver_indices (np.ndarray): Receiver index of each measurement.
+            values (np.ndarray): The measurements.
+
+        Returns:
+            np.ndarray: The filtered value after each measurement.
+        """
+        tag_indices = np.asarray(tag_indices, dtype=np.intp)
+        receiver_indices = np.asarray(receiver_indices, dtype=np.intp)
+        values = np.asarray(values, dtype=float)
+        filtered = np.empty(len(values))
+
+        # Each round applies the first pending measurement of every pair
+        flat = tag_indices * self.n_receivers + receiver_indices
+        pending = np.arange(len(values))
+        while len(pending):
+            _, first = np.unique(flat[pending], return_index=True)
+            batch = pending[first]
+            t, r = tag_indices[batch], receiver_indices[batch]
+
+            # Predict
+            P = self.P[t, r] + self.Q[t, r]
+
+            # Update
+            R = self.R[t, r]
+            K = P * (1.0 / (P + R))
+            x = self.x[t, r]
+            x = x + K * (values[batch] - x)
+            I_KH = 1.0 - K
+            self.P[t, r] = I_KH * P * I_KH + K * R * K
+            self.x[t, r] = x
+
+            filtered[batch] = x
+            pending = np.delete(pending, first)
+
+        return filtered
+
+    def __grow(self, capacity: int):
+        for name in ("x", "P", "Q", "R"):
+            array = getattr(self, name)
+            grown = np.zeros((capacity, self.n_receivers))
+            grown[: len(array)] = array
+            setattr(self, name, grown)
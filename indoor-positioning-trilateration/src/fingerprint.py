@@ -0,0 +1,155 @@
+import argparse
+import csv
+import time
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+MISSING_RSSI = -110  # RSSI of a receiver that does not see the tag (dBm)
+KDTREE_NODE_BYTES = 72  # Size of a node of the scipy KD-tree, allocated outside of Python
+
+
+class RadioMap:
+    def __init__(self, locations: np.ndarray, rssi: np.ndarray, missing_rssi: float = MISSING_RSSI, leafsize: int = 16):
+        """
+        Fingerprints of surveyed locations, indexed by their RSSI vectors in a KD-tree.
+
+        A tag is placed at the locations of the fingerprints whose RSSI at every receiver
+        is the closest to its own, weighted by the inverse of their RSSI distance. Receivers
+        without a reading count as `missing_rssi`, in the fingerprints and in the queries.
+
+        Args:
+            locations (np.ndarray): (M, 2) surveyed locations in meters.
+            rssi (np.ndarray): (M, receivers) RSSI at every location, NaN where a receiver had no reading.
+            missing_rssi (float, optional): RSSI of a receiver without reading (dBm). Defaults to MISSING_RSSI.
+            leafsize (int, optional): Fingerprints per leaf of the KD-tree. Defaults to 16.
+        """
+        self.locations = np.ascontiguousarray(locations, dtype=float)
+        self.rssi = np.nan_to_num(np.asarray(rssi, dtype=float), nan=missing_rssi)
+        if self.locations.shape != (len(self.rssi), 2):
+            raise ValueError("Expected one (x, y) location per fingerprint")
+        self.missing_rssi = missing_rssi
+        self.n_receivers = self.rssi.shape[1]
+
+        # The tree keeps a reference to the RSSI array instead of a copy
+        start = time.perf_counter()
+        self.tree = cKDTree(self.rssi, leafsize=leafsize, copy_data=False)
+        self.build_time = time.perf_counter() - start
+
+    @classmethod
+    def from_survey(cls, path: str, receiver_names: list, average: bool = True, **kwargs) -> "RadioMap":
+        """
+        Build a radio map from a survey CSV file with `x`, `y` and one RSSI column per receiver.
+
+        Empty RSSI cells are readings the receiver did not get.
+
+        Args:
+            path (str): The survey file.
+            receiver_names (list): Names of the RSSI columns, in the order of the receivers.
+            average (bool, optional): Merge the rows of the same location into one fingerprint
+                with the mean RSSI of every receiver. Defaults to True.
+            **kwargs: Other arguments of the constructor.
+
+        Returns:
+            RadioMap: The radio map.
+        """
+        with open(path, newline="") as file:
+            rows = list(csv.DictReader(file))
+        if not rows:
+            raise ValueError(f"Empty survey: {path}")
+
+        locations = np.array([(float(row["x"]), float(row["y"])) for row in rows])
+        rssi = np.array([[float(row[name]) if row[name] else np.nan for name in receiver_names] for row in rows])
+
+        if average:
+            locations, inverse = np.unique(locations, axis=0, return_inverse=True)
+            inverse = inverse.ravel()
+            seen = ~np.isnan(rssi)
+            sums = np.zeros((len(locations), rssi.shape[1]))
+            counts = np.zeros((len(locations), rssi.shape[1]))
+            np.add.at(sums, inverse, np.where(seen, rssi, 0.0))
+            np.add.at(counts, inverse, seen)
+            with np.errstate(invalid="ignore"):
+                rssi = sums / counts
+
+        return cls(locations, rssi, **kwargs)
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "RadioMap":
+        """
+        Load a radio map written by `save`.
+
+        Args:
+            path (str): The .npz file.
+            **kwargs: Other arguments of the constructor.
+
+        Returns:
+            RadioMap: The radio map.
+        """
+        with np.load(path) as data:
+            return cls(data["locations"], data["rssi"], **kwargs)
+
+    def save(self, path: str):
+        """
+        Write the fingerprints to a .npz file, the tree is rebuilt on load.
+
+        Args:
+            path (str): The .npz file.
+        """
+        np.savez(path, locations=self.locations, rssi=self.rssi)
+
+    def query(self, rssi: np.ndarray, available: np.ndarray = None, k: int = 4) -> tuple:
+        """
+        Locate many tags at once from their k nearest fingerprints.
+
+        Args:
+            rssi (np.ndarray): (N, receivers) RSSI of the tags.
+            available (np.ndarray, optional): (N, receivers) mask of the receivers with a reading.
+                Defaults to the non NaN values.
+            k (int, optional): Number of fingerprints averaged per tag. Defaults to 4.
+
+        Returns:
+            tuple: (N, 2) array with the (X, Y) coordinates of every tag, and (N,) RMS RSSI
+                difference with the nearest fingerprint (dB), to detect tags unlike every fingerprint.
+        """
+        rssi = np.atleast_2d(np.asarray(rssi, dtype=float))
+        if rssi.shape[1] != self.n_receivers:
+            raise ValueError(f"Expected the RSSI of {self.n_receivers} receivers")
+        if available is None:
+            available = ~np.isnan(rssi)
+        rssi = np.where(available, rssi, self.missing_rssi)
+
+        k = min(k, len(self.locations))
+        distances, indices = self.tree.query(rssi, k=k)
+        distances, indices = distances.reshape(len(rssi), k), indices.reshape(len(rssi), k)
+
+        # Inverse distance weighting, an exact match takes all the weight
+        weights = 1.0 / np.maximum(distances, 1e-6)
+        positions = np.einsum("nk,nkj->nj", weights, self.locations[indices]) / np.sum(weights, axis=1, keepdims=True)
+        return positions, distances[:, 0] / np.sqrt(self.n_receivers)
+
+    def nbytes(self) -> int:
+        """
+        Bytes of the fingerprints and of the tree, its nodes estimated from their count.
+
+        Returns:
+            int: The size in bytes.
+        """
+        return self.locations.nbytes + self.rssi.nbytes + self.tree.indices.nbytes + self.tree.size * KDTREE_NODE_BYTES
+
+    def __len__(self):
+        return len(self.locations)
+
+
+if __name__ == "__main__":
+    from environment import RECEIVERS
+
+    parser = argparse.ArgumentParser(description="Build a fingerprint radio map from a survey CSV file.")
+    parser.add_argument("survey", help="CSV file with x, y and one RSSI column per receiver name")
+    parser.add_argument("output", help="The .npz radio map to write")
+    parser.add_argument("--no-average", action="store_true", help="Keep every row instead of one fingerprint per location")
+    args = parser.parse_args()
+
+    radio_map = RadioMap.from_survey(args.survey, [receiver["name"] for receiver in RECEIVERS], average=not args.no_average)
+    radio_map.save(args.output)
+    print(f"{len(radio_map)} fingerprints, built in {radio_map.build_time * 1000:.1f}ms")
@@ -0,0 +1,91 @@
+import numpy as np
+
+
+class FusionWindow:
+    def __init__(self, n_receivers: int = 3, window: float = 5, capacity: int = 16):
+        """
+        Timestamp-aligned join of the latest readings of every tag across receivers.
+
+        A receiver takes part in the position of a tag only if its latest reading is at
+        most `window` seconds older than the newest reading of the tag, so a fresh reading
+        is never fused with a stale one. The reading counts of the aligned receivers are
+        kept per tag when it is solved, and the tag is only solved again once a receiver
+        joins or leaves its aligned set or brings a new reading.
+
+        Args:
+            n_receivers (int, optional): Number of receivers per tag. Defaults to 3.
+            window (float, optional): Maximum age of a reading relative to the newest one of the tag (seconds),
+                0 aligns every receiver with data. Defaults to 5.
+            capacity (int, optional): Initial number of tag rows. Grows as needed. Defaults to 16.
+        """
+        self.n_receivers = n_receivers
+        self.window = window
+        self.n_tags = 0
+
+        # Reading counts of the aligned set each tag was last solved with, -1 outside the set
+        self.solved_counts = np.full((capacity, n_receivers), -1, dtype=np.int64)
+
+    def add_tag(self) -> int:
+        """
+        Allocate the row of a new tag.
+
+        Returns:
+            int: The row index of the tag.
+        """
+        if self.n_tags == len(self.solved_counts):
+            grown = np.full((max(2 * len(self.solved_counts), 1), self.n_receivers), -1, dtype=np.int64)
+            grown[: len(self.solved_counts)] = self.solved_counts
+            self.solved_counts = grown
+
+        tag_index = self.n_tags
+        self.n_tags += 1
+        self.reset(tag_index)
+        return tag_index
+
+    def reset(self, tag_index: int):
+        """
+        Forget the aligned set a tag was solved with, so it is solved on its next readings.
+
+        Args:
+            tag_index (int): The row index of the tag.
+        """
+        self.solved_counts[tag_index] = -1
+
+    def align(self, timestamps: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        """
+        Find the receivers whose latest reading is within the window of the newest reading of each tag.
+
+        Args:
+            timestamps (np.ndarray): (N, receivers) timestamps of the latest readings.
+            counts (np.ndarray): (N, receivers) reading counts, 0 where a receiver has no data.
+
+        Returns:
+            np.ndarray: (N, receivers) boolean mask of the aligned receivers.
+        """
+        has_data = counts > 0
+        if self.window <= 0:
+            return has_data
+
+        timestamps = np.where(has_data, timestamps, -np.inf)
+        newest = np.max(timestamps, axis=1, initial=-np.inf)
+        return has_data & (timestamps >= newest[:, None] - self.window)
+
+    def changed(self, tag_indices: np.ndarray, counts: np.ndarray, aligned: np.ndarray) -> np.ndarray:
+        """
+        Check which tags have an aligned set that differs from the one they were last solved with.
+
+        Args:
+            tag_indices (np.ndarray): Row indices of the tags.
+            counts (np.ndarray): (N, receivers) reading counts.
+            aligned (np.ndarray): (N, receivers) mask of the aligned receivers.
+
+        Returns:
+            np.ndarray: Boolean mask, one entry per tag.
+        """
+        return np.any(np.where(aligned, counts, -1) != self.solved_counts[tag_indices], axis=1)
+
+    def mark_solved(self, tag_indices: np.ndarray, counts: np.ndarray, aligned: np.ndarray):
+        """
+        Remember the aligned sets the tags were solved with.
+        """
+        self.solved_counts[tag_indices] = np.where(aligned, counts, -1)
@@ -61,15 +61,15 @@ def animate(base_stations, initial_pos, get_updated_data, interval=1000):
         trail, = ax.plot([], [], '-', color=color, alpha=0.5)
         position_trails[i] = trail
         
-        # Store circles for distances (3 per tag)
-        distance_circles[i] = [None, None, None]
+        # Store circles for distances (one per base station)
+        distance_circles[i] = [None] * len(base_stations)
 
     # Add legend
     ax.legend(loc='upper right')
 
     def update(frame):
         # Get updated data: base stations, position, receiver data, and tag positions
-        base_stations_data, _, receiver_1_data, receiver_2_data, receiver_3_data, all_tag_positions = get_updated_data()
+        base_stations_data, _, receivers_data, all_tag_positions = get_updated_data()
         
         # Update circles for base stations
         for i, station in enumerate(base_stations_data):
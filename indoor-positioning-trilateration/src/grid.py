@@ -0,0 +1,131 @@
+import numpy as np
+
+# Maximum number of (tag, cell) scores held at once, larger batches are scored in chunks
+MAX_SCORES = 1 << 20
+
+# Shortest distance of the field, keeps the logarithm finite at a receiver
+MIN_DISTANCE = 1e-3
+
+
+class GridEstimator:
+    def __init__(
+        self,
+        receiver_positions: np.ndarray,
+        resolution: int = 32,
+        path_loss_exponent: float = 1.8,
+        sigma: float = 2.0,
+        estimate: str = "centroid",
+        bounds: tuple = None,
+    ):
+        """
+        Positions scored over a fixed grid of cells instead of solved continuously.
+
+        The distance from the centre of every cell to every receiver is computed once,
+        as a (cells, receivers) field. The distances of a tag are compared with the field
+        in RSSI space, where the path loss model turns them into a log ratio and the noise
+        is gaussian, so the log likelihood of all cells for a batch of tags comes down to
+        two matrix products with the field. The position is the best cell or the centroid
+        of the cells weighted by their likelihood.
+
+        With the default bounds and a resolution equal to the display scale, the cells are
+        the pixels of `TrilaterationController.scale_coordinates`.
+
+        Args:
+            receiver_positions (np.ndarray): Position (x, y) of each receiver.
+            resolution (int, optional): Number of cells along each axis. Defaults to 32.
+            path_loss_exponent (float, optional): Path loss exponent. Defaults to 1.8.
+            sigma (float, optional): Standard deviation of the filtered RSSI (dB). Defaults to 2.0.
+            estimate (str, optional): "centroid" (likelihood weighted centroid) or "argmax" (best cell).
+                Defaults to "centroid".
+            bounds (tuple, optional): ((min_x, min_y), (max_x, max_y)) of the grid in meters.
+                Defaults to (0, 0) and the largest receiver coordinates.
+        """
+        if estimate not in ("centroid", "argmax"):
+            raise ValueError(f"Unknown grid estimate: {estimate}")
+
+        receiver_positions = np.asarray(receiver_positions, dtype=float)
+        if bounds is None:
+            bounds = ((0.0, 0.0), np.max(receiver_positions, axis=0))
+        low, high = (np.asarray(bound, dtype=float) for bound in bounds)
+
+        self.resolution = resolution
+        self.estimate = estimate
+        self.bounds = (low, high)
+
+        # Centre of every cell, row by row
+        step = (high - low) / resolution
+        xs = low[0] + (np.arange(resolution) + 0.5) * step[0]
+        ys = low[1] + (np.arange(resolution) + 0.5) * step[1]
+        self.cells = np.stack(np.meshgrid(xs, ys), axis=-1).reshape(-1, 2)
+
+        # Distance field and its logarithm, transposed for the products with the tags
+        self.distances = np.maximum(
+            np.linalg.norm(self.cells[:, None, :] - receiver_positions[None], axis=2), MIN_DISTANCE
+        )
+        log_distances = np.log10(self.distances)
+        self.__log_field = np.ascontiguousarray(log_distances.T)
+        self.__squared_log_field = np.ascontiguousarray((log_distances ** 2).T)
+
+        # RSSI difference per decade of distance, over twice the variance
+        self.__gain = (10 * path_loss_exponent) ** 2 / (2 * sigma ** 2)
+
+    def scores(self, distances: np.ndarray, receivers: np.ndarray = None, weights: np.ndarray = None) -> np.ndarray:
+        """
+        Log likelihood of every cell for each tag, up to a constant per tag.
+
+        Args:
+            distances (np.ndarray): (N, k) array of distances, one row per tag.
+            receivers (np.ndarray, optional): (N, k) array with the receiver of each distance.
+                Defaults to all receivers in order.
+            weights (np.ndarray, optional): (N, k) weights of the distances, 0 to ignore one. Defaults to 1.
+
+        Returns:
+            np.ndarray: (N, cells) array of scores.
+        """
+        distances = np.atleast_2d(np.asarray(distances, dtype=float))
+        if receivers is None:
+            receivers = np.broadcast_to(np.arange(distances.shape[1]), distances.shape)
+        weights = np.ones(distances.shape) if weights is None else np.asarray(weights, dtype=float)
+
+        # Scatter the log distances of each tag to the columns of their receivers, 0 where unused
+        used = weights > 0
+        shape = (len(distances), self.__log_field.shape[0])
+        tag_weights = np.zeros(shape)
+        tag_logs = np.zeros(shape)
+        np.put_along_axis(tag_weights, receivers, weights, axis=1)
+        np.put_along_axis(tag_logs, receivers, np.log10(np.maximum(np.where(used, distances, 1.0), MIN_DISTANCE)), axis=1)
+
+        # -sum_i w_i (L_ci - l_i)^2 without the sum_i w_i l_i^2 term, constant per tag
+        scores = 2 * (tag_weights * tag_logs) @ self.__log_field - tag_weights @ self.__squared_log_field
+        return scores * self.__gain
+
+    def locate(self, distances: np.ndarray, receivers: np.ndarray = None, weights: np.ndarray = None) -> np.ndarray:
+        """
+        Estimate the positions of many tags at once, same arguments as `scores`.
+
+        Returns:
+            np.ndarray: (N, 2) array with the (X, Y) coordinates of every tag, NaN where a
+                used distance is not finite.
+        """
+        distances = np.atleast_2d(np.asarray(distances, dtype=float))
+        if receivers is None:
+            receivers = np.broadcast_to(np.arange(distances.shape[1]), distances.shape)
+        weights = np.ones(distances.shape) if weights is None else np.asarray(weights, dtype=float)
+
+        positions = np.empty((len(distances), 2))
+        rows = max(1, MAX_SCORES // len(self.cells))
+        for start in range(0, len(distances), rows):
+            chunk = slice(start, start + rows)
+            scores = self.scores(distances[chunk], receivers[chunk], weights[chunk])
+
+            if self.estimate == "argmax":
+                positions[chunk] = self.cells[np.argmax(scores, axis=1)]
+                continue
+
+            # Softmax of the scores, shifted so the best cell of every tag weighs 1
+            likelihood = np.exp(scores - np.max(scores, axis=1, keepdims=True))
+            positions[chunk] = (likelihood @ self.cells) / np.sum(likelihood, axis=1, keepdims=True)
+
+        invalid = np.any((weights > 0) & ~np.isfinite(distances), axis=1)
+        positions[invalid] = np.nan
+        return positions
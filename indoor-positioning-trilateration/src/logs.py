@@ -0,0 +1,125 @@
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+MAX_TRACED_KEYS = 100000  # Keys remembered by a tracer before it starts over
+
+
+class TagTracer:
+    def __init__(self, interval: float = 5, level: int = logging.DEBUG, logger: logging.Logger = None):
+        """
+        Rate-limited debug traces of the per tag (or per topic) hot paths.
+
+        A trace is logged at most once per `interval` for each key, and costs a single
+        level check when the level is disabled. Messages use lazy %-style arguments,
+        so they are only formatted when a record is actually emitted.
+
+        Args:
+            interval (float, optional): Minimum time between two traces of the same key (seconds),
+                0 logs every trace. Defaults to 5.
+            level (int, optional): The level of the traces. Defaults to logging.DEBUG.
+            logger (logging.Logger, optional): The logger of the traces. Defaults to the root logger.
+        """
+        self.interval = interval
+        self.level = level
+        self.logger = logger or logging.getLogger()
+
+        # Number of traces dropped by the rate limit
+        self.suppressed = 0
+        self.__last_traced = {}
+
+    def active(self) -> bool:
+        """
+        Check if traces are logged at all, to skip loops that only produce traces.
+        """
+        return self.logger.isEnabledFor(self.level)
+
+    def enabled(self, key, now: float = None) -> bool:
+        """
+        Check if a trace for `key` may be logged now, and count it as logged if so.
+        """
+        if not self.logger.isEnabledFor(self.level):
+            return False
+        if self.interval <= 0:
+            return True
+
+        if now is None:
+            now = time.monotonic()
+        last_traced = self.__last_traced.get(key)
+        if last_traced is not None and now - last_traced < self.interval:
+            self.suppressed += 1
+            return False
+
+        # Bound the memory when the keys keep changing
+        if len(self.__last_traced) >= MAX_TRACED_KEYS:
+            self.__last_traced.clear()
+        self.__last_traced[key] = now
+        return True
+
+    def trace(self, key, msg: str, *args):
+        """
+        Log a trace for `key`, unless one was logged less than `interval` ago.
+
+        Args:
+            key: The tag, topic, ... the trace is about.
+            msg (str): The %-style message.
+            *args: The message arguments, formatted only if the trace is logged.
+        """
+        if self.enabled(key):
+            self.logger.log(self.level, msg, *args)
+
+    def log(self, msg: str, *args):
+        """
+        Log a trace without rate limit, e.g. the next lines of a trace allowed by `enabled`.
+        """
+        self.logger.log(self.level, msg, *args)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler leaving the formatting to the listener thread.
+
+    The records never leave the process, so they are queued as they are instead of
+    being formatted by the logging thread like `QueueHandler` does.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def setup_logging(level="INFO", use_queue: bool = True, stream=None, format: str = LOG_FORMAT) -> logging.handlers.QueueListener:
+    """
+    Configure the root logger, replacing its handlers.
+
+    With `use_queue`, records are put in a queue and formatted and written by a
+    background listener, so logging never blocks the thread that logs.
+
+    Args:
+        level (str or int, optional): The root log level. Defaults to "INFO".
+        use_queue (bool, optional): Whether to write the records from a background thread. Defaults to True.
+        stream (file, optional): Where the records are written. Defaults to stderr.
+        format (str, optional): The record format. Defaults to LOG_FORMAT.
+
+    Returns:
+        logging.handlers.QueueListener: The started listener, to stop on exit, or None without queue.
+    """
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(logging.Formatter(format))
+
+    root = logging.getLogger()
+    for old_handler in list(root.handlers):
+        root.removeHandler(old_handler)
+    root.setLevel(level)
+
+    if not use_queue:
+        root.addHandler(handler)
+        return None
+
+    log_queue = queue.SimpleQueue()
+    root.addHandler(DeferredQueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    listener.start()
+    return listener
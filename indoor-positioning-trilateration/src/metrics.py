@@ -0,0 +1,220 @@
+import bisect
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds of the latency histogram buckets (seconds), from 10 us to 10 s
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+class Counter:
+    def __init__(self):
+        """
+        Monotonic counter.
+        """
+        self.value = 0
+        self.__lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        """
+        Increase the counter by `amount`.
+        """
+        with self.__lock:
+            self.value += amount
+
+    def samples(self, name: str, labels: str) -> list:
+        return [f"{name}{labels} {self.value}"]
+
+
+class Histogram:
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        """
+        Histogram with fixed buckets, observing a value costs one binary search.
+
+        Args:
+            buckets (tuple, optional): Increasing upper bounds of the buckets. Defaults to LATENCY_BUCKETS.
+        """
+        self.buckets = tuple(buckets)
+        # Observations per bucket, the last one is above the largest bound
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.__lock = threading.Lock()
+
+    def observe(self, value: float):
+        """
+        Record one observation.
+        """
+        bucket = bisect.bisect_left(self.buckets, value)
+        with self.__lock:
+            self.counts[bucket] += 1
+            self.sum += value
+            self.count += 1
+
+    def samples(self, name: str, labels: str) -> list:
+        with self.__lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+
+        # Buckets are cumulative in the text format
+        prefix = labels[1:-1] + "," if labels else ""
+        samples = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+            cumulative += bucket_count
+            samples.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+        samples.append(f"{name}_sum{labels} {total}")
+        samples.append(f"{name}_count{labels} {count}")
+        return samples
+
+
+class Callback:
+    def __init__(self, function):
+        """
+        Metric whose value is read from `function` when the metrics are collected.
+        """
+        self.function = function
+
+    def samples(self, name: str, labels: str) -> list:
+        return [f"{name}{labels} {float(self.function())}"]
+
+
+class MetricFamily:
+    def __init__(self, name: str, description: str, kind: str, label_names: tuple = (), factory=None):
+        """
+        Metrics with the same name, one child per combination of label values.
+
+        Args:
+            name (str): The metric name.
+            description (str): The description of the metric.
+            kind (str): The Prometheus type, "counter", "gauge" or "histogram".
+            label_names (tuple, optional): The label names. Defaults to none.
+            factory (callable, optional): Creates the child of new label values.
+        """
+        self.name = name
+        self.description = description
+        self.kind = kind
+        self.label_names = tuple(label_names)
+        self.factory = factory
+        self.children = {}
+        self.__lock = threading.Lock()
+
+    def labels(self, *values):
+        """
+        Get the child of some label values, created on first use. Cache it on hot paths.
+        """
+        values = tuple(str(value) for value in values)
+        child = self.children.get(values)
+        if child is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"{self.name} expects labels {self.label_names}, got {values}")
+            with self.__lock:
+                child = self.children.setdefault(values, self.factory())
+        return child
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self.children.items()):
+            labels = ""
+            if values:
+                labels = "{" + ",".join(
+                    f'{name}="{escape_label(value)}"' for name, value in zip(self.label_names, values)
+                ) + "}"
+            lines.extend(child.samples(self.name, labels))
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        """
+        Collection of the metrics of the process, rendered in the Prometheus text format.
+        """
+        self.families = {}
+
+    def counter(self, name: str, description: str, label_names: tuple = ()) -> MetricFamily:
+        """
+        Register a family of counters.
+        """
+        return self.__register(MetricFamily(name, description, "counter", label_names, Counter))
+
+    def histogram(self, name: str, description: str, label_names: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> MetricFamily:
+        """
+        Register a family of histograms.
+        """
+        return self.__register(MetricFamily(name, description, "histogram", label_names, lambda: Histogram(buckets)))
+
+    def callback(self, name: str, description: str, function, kind: str = "gauge") -> MetricFamily:
+        """
+        Register a metric read from `function` when the metrics are collected, e.g. a
+        counter kept by another component.
+        """
+        family = self.__register(MetricFamily(name, description, kind))
+        family.children[()] = Callback(function)
+        return family
+
+    def render(self) -> str:
+        """
+        Render all metrics in the Prometheus text format.
+        """
+        lines = []
+        for family in list(self.families.values()):
+            try:
+                lines.extend(family.render())
+            except Exception as e:
+                logging.error(f"Could not collect metric {family.name}: {e}")
+        return "\n".join(lines) + "\n"
+
+    def __register(self, family: MetricFamily) -> MetricFamily:
+        if family.name in self.families:
+            raise ValueError(f"Metric {family.name} is already registered")
+        self.families[family.name] = family
+        return family
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def start_metrics_server(registry: MetricsRegistry, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Serve the metrics on http://host:port/metrics from a background thread.
+
+    Args:
+        registry (MetricsRegistry): The metrics to serve.
+        port (int): The port to listen on.
+        host (str, optional): The address to listen on. Defaults to "127.0.0.1".
+
+    Returns:
+        ThreadingHTTPServer: The server, stopped with `shutdown()`.
+    """
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Scrapes are not worth a log line
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import socket
+
+import paho.mqtt.client as mqtt
+
+RECONNECT_DELAY = 1  # First delay before reconnecting to the broker (seconds)
+MAX_RECONNECT_DELAY = 30  # Maximum delay before reconnecting to the broker (seconds)
+
+
+class AsyncioMqttHelper:
+    def __init__(self, loop: asyncio.AbstractEventLoop, client: mqtt.Client):
+        """
+        Drives a paho MQTT client from an asyncio event loop instead of its own thread.
+
+        The client socket is registered with the loop, so reads and writes run as soon as
+        the socket is ready and the message callbacks run on the loop. A misc task
+        handles keepalive pings and reconnects with backoff when the connection drops.
+
+        Args:
+            loop (asyncio.AbstractEventLoop): The event loop, it must support `add_reader`.
+            client (mqtt.Client): The client, its callbacks are set before `connect`.
+        """
+        self.loop = loop
+        self.client = client
+
+        self.__misc_task = None
+        self.__stopped = False
+
+        client.on_socket_open = self.__on_socket_open
+        client.on_socket_close = self.__on_socket_close
+        client.on_socket_register_write = self.__on_socket_register_write
+        client.on_socket_unregister_write = self.__on_socket_unregister_write
+
+    async def connect(self, host: str, port: int, keepalive: int = 60):
+        """
+        Connect to the broker, the connection is kept open until `disconnect` is called.
+        """
+        delay = RECONNECT_DELAY
+        while not self.__stopped:
+            try:
+                # Resolving and connecting the socket blocks, so it runs off the loop
+                await self.loop.run_in_executor(None, self.client.connect, host, port, keepalive)
+                return
+            except OSError as e:
+                logging.error(f"Could not connect to broker: {e}, retrying in {delay}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+    async def disconnect(self):
+        """
+        Disconnect from the broker and stop reconnecting.
+        """
+        self.__stopped = True
+        self.client.disconnect()
+        if self.__misc_task:
+            await asyncio.gather(self.__misc_task, return_exceptions=True)
+
+    def __on_socket_open(self, client, userdata, sock):
+        self.__call_on_loop(self.__add_socket, sock)
+
+    def __on_socket_close(self, client, userdata, sock):
+        self.__call_on_loop(self.loop.remove_reader, sock)
+
+    def __on_socket_register_write(self, client, userdata, sock):
+        self.__call_on_loop(self.loop.add_writer, sock, client.loop_write)
+
+    def __on_socket_unregister_write(self, client, userdata, sock):
+        self.__call_on_loop(self.loop.remove_writer, sock)
+
+    def __call_on_loop(self, callback, *args):
+        # (Re)connecting runs in an executor thread, the loop must only be changed from its own thread
+        try:
+            on_loop = asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            on_loop = False
+
+        if on_loop:
+            callback(*args)
+        else:
+            self.loop.call_soon_threadsafe(callback, *args)
+
+    def __add_socket(self, sock):
+        self.loop.add_reader(sock, self.client.loop_read)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 2048)
+        if self.__misc_task is None or self.__misc_task.done():
+            self.__misc_task = self.loop.create_task(self.__misc_loop())
+
+    async def __misc_loop(self):
+        delay = RECONNECT_DELAY
+        while not self.__stopped:
+            if self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+                delay = RECONNECT_DELAY
+                await asyncio.sleep(1)
+                continue
+
+            # The connection dropped, reconnect with backoff
+            logging.info(f"Disconnected from broker, reconnecting in {delay}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+            try:
+                await self.loop.run_in_executor(None, self.client.reconnect)
+            except OSError as e:
+                logging.error(f"Could not reconnect to broker: {e}")
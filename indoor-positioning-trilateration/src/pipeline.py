@@ -0,0 +1,499 @@
+import logging
+import threading
+import time
+
+import numpy as np
+
+from calc import SolveCache, TrilaterationController
+from environment import (
+    DISTANCE_TABLE_STEP,
+    FINGERPRINT_K,
+    FINGERPRINT_MAP,
+    FINGERPRINT_MAX_MISMATCH,
+    FUSION_WINDOW,
+    GRID_ESTIMATE,
+    GRID_RESOLUTION,
+    GRID_SIGMA,
+    PARTICLE_DENSITY,
+    PARTICLE_SIGMA,
+    PARTICLE_SPEED,
+    PARTICLES_MAX,
+    PARTICLES_MIN,
+    MAX_TAGS,
+    PATH_LOSS_EXPONENT,
+    RECEIVER_SELECTION,
+    RECEIVERS_PER_SOLVE,
+    SOLVE_CACHE_RESOLUTION,
+    SOLVE_CACHE_SIZE,
+    SOLVER_MODE,
+    TAG_LOG_INTERVAL,
+    TAG_TTL,
+)
+from filter import KalmanBank
+from fingerprint import RadioMap
+from fusion import FusionWindow
+from logs import TagTracer
+from registry import TagRegistry
+from store import ReadingStore
+from tracker import ParticleTracker
+
+
+class PositioningPipeline:
+    def __init__(
+        self,
+        receivers: list,
+        allow_list: list = None,
+        allow_prefixes: list = None,
+        capacity: int = 16,
+        max_tags: int = MAX_TAGS,
+        ttl: float = TAG_TTL,
+        solver_mode: str = SOLVER_MODE,
+        receivers_per_solve: int = RECEIVERS_PER_SOLVE,
+        receiver_selection: str = RECEIVER_SELECTION,
+        path_loss_exponent: float = PATH_LOSS_EXPONENT,
+        fusion_window: float = FUSION_WINDOW,
+        distance_table_step: float = DISTANCE_TABLE_STEP,
+        solve_cache_size: int = SOLVE_CACHE_SIZE,
+        solve_cache_resolution: float = SOLVE_CACHE_RESOLUTION,
+        grid_resolution: int = GRID_RESOLUTION,
+        radio_map: RadioMap = None,
+        fingerprint_k: int = FINGERPRINT_K,
+        fingerprint_max_mismatch: float = FINGERPRINT_MAX_MISMATCH,
+        on_evict=None,
+        trace_interval: float = TAG_LOG_INTERVAL,
+    ):
+        """
+        Filter state, reading history and solver of a set of tags.
+
+        Readings are registered, filtered and stored by `ingest`, and `solve` computes
+        the positions of the given tags from their latest filtered readings. The methods
+        changing or solving the tags hold one lock, so they can be called from different
+        threads, e.g. the MQTT thread and the processing thread.
+
+        Args:
+            receivers (list): The receivers, dicts with a `position` and `tx_power`.
+            allow_list (list, optional): MAC addresses that may be tracked. Defaults to None.
+            allow_prefixes (list, optional): MAC prefixes that may be tracked. Defaults to None.
+            capacity (int, optional): Initial number of tag rows. Defaults to 16.
+            max_tags (int, optional): Maximum number of live tags. Defaults to MAX_TAGS.
+            ttl (float, optional): Seconds without readings after which a tag is evicted. Defaults to TAG_TTL.
+            solver_mode (str, optional): "batch", "warm_start", "grid", "fingerprint" or "particle". Defaults to SOLVER_MODE.
+            receivers_per_solve (int, optional): Receivers used per tag in batch and grid modes. Defaults to RECEIVERS_PER_SOLVE.
+            receiver_selection (str, optional): "strongest" or "freshest". Defaults to RECEIVER_SELECTION.
+            path_loss_exponent (float, optional): Path loss exponent. Defaults to PATH_LOSS_EXPONENT.
+            fusion_window (float, optional): Maximum age of a fused reading relative to the newest
+                one of the tag (seconds), 0 fuses all readings. Defaults to FUSION_WINDOW.
+            distance_table_step (float, optional): RSSI resolution of the distance lookup tables (dB),
+                0 evaluates the path loss model. Defaults to DISTANCE_TABLE_STEP.
+            solve_cache_size (int, optional): Solves kept in the LRU `SolveCache`, 0 disables it. Defaults to SOLVE_CACHE_SIZE.
+            solve_cache_resolution (float, optional): Quantization of the distances keying the cache (meters).
+                Defaults to SOLVE_CACHE_RESOLUTION.
+            grid_resolution (int, optional): Cells along each axis in grid mode. Defaults to GRID_RESOLUTION.
+            radio_map (RadioMap, optional): Fingerprints of fingerprint mode. Defaults to the FINGERPRINT_MAP file.
+            fingerprint_k (int, optional): Nearest fingerprints averaged per tag. Defaults to FINGERPRINT_K.
+            fingerprint_max_mismatch (float, optional): RMS RSSI difference with the nearest fingerprint (dB) above
+                which a tag is trilaterated instead. Defaults to FINGERPRINT_MAX_MISMATCH.
+            on_evict (callable, optional): Called with the MAC and index of each evicted tag. Defaults to None.
+            trace_interval (float, optional): Minimum time between the debug traces of a tag (seconds).
+                Defaults to TAG_LOG_INTERVAL.
+        """
+        self.receivers = receivers
+        self.receiver_positions = [receiver["position"] for receiver in receivers]
+        self.solver_mode = solver_mode
+        self.receivers_per_solve = receivers_per_solve
+        self.receiver_selection = receiver_selection
+
+        # Tags the solver returned no finite position for
+        self.solver_failures = 0
+
+        # Dirty tags not solved again because their aligned readings did not change
+        self.unchanged_skips = 0
+
+        # Radio map of fingerprint mode and the tags trilaterated because no fingerprint matched
+        self.radio_map = None
+        self.fingerprint_k = fingerprint_k
+        self.fingerprint_max_mismatch = fingerprint_max_mismatch
+        self.fingerprint_fallbacks = 0
+        if solver_mode == "fingerprint":
+            if radio_map is None:
+                if not FINGERPRINT_MAP:
+                    raise ValueError("The fingerprint solver needs a radio map, set FINGERPRINT_MAP")
+                radio_map = RadioMap.load(FINGERPRINT_MAP)
+            if radio_map.n_receivers != len(receivers):
+                raise ValueError(f"The radio map has {radio_map.n_receivers} receivers, expected {len(receivers)}")
+            self.radio_map = radio_map
+
+        # Rate-limited debug traces of the readings and solutions of each tag
+        self.ingest_tracer = TagTracer(trace_interval)
+        self.solve_tracer = TagTracer(trace_interval)
+
+        # Kalman filters for every tag and receiver
+        self.kalman_bank = KalmanBank(n_receivers=len(receivers), capacity=capacity)
+
+        # Ring buffers with the readings of every tag from every receiver
+        self.reading_store = ReadingStore(n_receivers=len(receivers), capacity=capacity)
+
+        # Receivers fused per tag and the readings each tag was last solved with
+        self.fusion_window = FusionWindow(n_receivers=len(receivers), window=fusion_window, capacity=capacity)
+
+        # Particles tracking the position of every tag in particle mode
+        tables = [self.kalman_bank, self.reading_store, self.fusion_window]
+        self.tracker = None
+        if solver_mode == "particle":
+            self.tracker = ParticleTracker(
+                self.receiver_positions,
+                min_particles=PARTICLES_MIN,
+                max_particles=PARTICLES_MAX,
+                density=PARTICLE_DENSITY,
+                speed=PARTICLE_SPEED,
+                path_loss_exponent=path_loss_exponent,
+                sigma=PARTICLE_SIGMA,
+                capacity=capacity,
+            )
+            tables.append(self.tracker)
+
+        # Tracked tags, allocated on first sighting and evicted when idle
+        self.tag_registry = TagRegistry(
+            tables=tables,
+            allow_list=allow_list,
+            allow_prefixes=allow_prefixes,
+            max_tags=max_tags,
+            ttl=ttl,
+            on_evict=self.__on_evict,
+        )
+        self.on_evict = on_evict
+
+        # Held by ingest, evict_idle, solve and the tag handoffs, reentrant for on_evict and import_tags
+        self.__lock = threading.RLock()
+
+        self.location_estimator = TrilaterationController(
+            self.receiver_positions,
+            [receiver["tx_power"] for receiver in receivers],
+            path_loss_exponent=path_loss_exponent,
+            warm_start=solver_mode == "warm_start",
+            distance_table_step=distance_table_step,
+            solve_cache=SolveCache(solve_cache_size, solve_cache_resolution) if solve_cache_size > 0 else None,
+            grid_resolution=grid_resolution if solver_mode == "grid" else 0,
+            grid_sigma=GRID_SIGMA,
+            grid_estimate=GRID_ESTIMATE,
+        )
+
+    def ingest(self, receiver_index: int, macs: list, timestamps: list, rssi: list, now: float = None) -> tuple:
+        """
+        Register, filter and store a batch of readings from one receiver.
+
+        Args:
+            receiver_index (int): Index of the receiver.
+            macs (list): The upper case MAC address of each reading.
+            timestamps (list): Timestamp of each reading (seconds since the epoch).
+            rssi (list): RSSI of each reading.
+            now (float, optional): Current time (seconds since the epoch). Defaults to now.
+
+        Returns:
+            tuple: The MACs, raw RSSI and filtered RSSI of the accepted readings.
+        """
+        with self.__lock:
+            if now is None:
+                now = time.time()
+
+            batch_macs = []
+            batch_indices = []
+            batch_timestamps = []
+            batch_rssi = []
+            for tag_mac, timestamp, value in zip(macs, timestamps, rssi):
+                tag_index = self.tag_registry.register(tag_mac, now)
+                if tag_index is None:
+                    self.ingest_tracer.trace(tag_mac, "Ignoring message from unregistered MAC: %s", tag_mac)
+                    continue
+
+                batch_macs.append(tag_mac)
+                batch_indices.append(tag_index)
+                batch_timestamps.append(timestamp)
+                batch_rssi.append(value)
+
+            if not batch_macs:
+                return [], [], np.empty(0)
+
+            # Apply the filters and store the whole batch
+            batch_receivers = np.full(len(batch_indices), receiver_index)
+            filtered_rssi = self.kalman_bank.update_many(batch_indices, batch_receivers, batch_rssi)
+            self.reading_store.append_many(batch_indices, batch_receivers, batch_timestamps, batch_rssi, filtered_rssi)
+
+            if self.ingest_tracer.active():
+                receiver_name = self.receivers[receiver_index].get("name", receiver_index)
+                for tag_mac, value, filtered in zip(batch_macs, batch_rssi, filtered_rssi):
+                    self.ingest_tracer.trace(
+                        tag_mac, "Tag %s - %s updated with RSSI: %s, filtered: %s", tag_mac, receiver_name, value, filtered
+                    )
+            return batch_macs, batch_rssi, filtered_rssi
+
+    def evict_idle(self, now: float = None) -> list:
+        """
+        Evict the tags without readings for longer than the TTL, see `TagRegistry.evict_idle`.
+        """
+        with self.__lock:
+            evicted = self.tag_registry.evict_idle(now)
+            if evicted:
+                logging.info(f"Evicted {len(evicted)} idle tags, tracking {len(self.tag_registry)}")
+            return evicted
+
+    def export_tags(self, macs: list) -> dict:
+        """
+        Get the state of some tags to hand them over to another pipeline.
+
+        Args:
+            macs (list): The tags to export, unknown ones are skipped.
+
+        Returns:
+            dict: Maps each tag to its filter state, retained readings and warm start
+                solution, with lists only so it can be serialized to JSON.
+        """
+        with self.__lock:
+            estimator = self.location_estimator
+            states = {}
+            for tag_mac in macs:
+                tag_index = self.tag_registry.lookup(tag_mac)
+                if tag_index is None:
+                    continue
+
+                x, P = self.kalman_bank.get_state(tag_index)
+                state = {
+                    "x": x.tolist(),
+                    "P": P.tolist(),
+                    # Timestamps, raw and filtered RSSI retained from every receiver, oldest first
+                    "readings": [
+                        [column.tolist() for column in self.reading_store.window(tag_index, receiver_index)]
+                        for receiver_index in range(len(self.receivers))
+                    ],
+                }
+                if tag_mac in estimator.previous_solutions:
+                    state["solution"] = estimator.previous_solutions[tag_mac].tolist()
+                    state["nfev"] = int(estimator.previous_nfev[tag_mac])
+                states[tag_mac] = state
+            return states
+
+    def import_tags(self, states: dict, now: float = None) -> list:
+        """
+        Restore the state of tags exported by `export_tags`, replacing their current state.
+
+        Args:
+            states (dict): Maps each tag to its exported state.
+            now (float, optional): Current time (seconds since the epoch). Defaults to now.
+
+        Returns:
+            list: The imported tags, tags that are not allowed are skipped.
+        """
+        with self.__lock:
+            estimator = self.location_estimator
+            imported = []
+            for tag_mac, state in states.items():
+                self.remove_tags([tag_mac])
+                tag_index = self.tag_registry.register(tag_mac, now)
+                if tag_index is None:
+                    continue
+
+                self.kalman_bank.set_state(tag_index, np.asarray(state["x"]), np.asarray(state["P"]))
+
+                receivers = np.concatenate([
+                    np.full(len(timestamps), receiver_index)
+                    for receiver_index, (timestamps, _, _) in enumerate(state["readings"])
+                ])
+                timestamps, rssi, filtered_rssi = (
+                    np.concatenate([readings[column] for readings in state["readings"]])
+                    for column in range(3)
+                )
+                self.reading_store.append_many(
+                    np.full(len(receivers), tag_index), receivers, timestamps, rssi, filtered_rssi
+                )
+
+                if "solution" in state:
+                    estimator.previous_solutions[tag_mac] = np.asarray(state["solution"])
+                    estimator.previous_nfev[tag_mac] = state["nfev"]
+                imported.append(tag_mac)
+            return imported
+
+    def remove_tags(self, macs: list):
+        """
+        Drop the state of some tags without evicting them, e.g. after they were handed over.
+        """
+        with self.__lock:
+            estimator = self.location_estimator
+            for tag_mac in macs:
+                self.tag_registry.remove(tag_mac)
+                estimator.previous_solutions.pop(tag_mac, None)
+                estimator.previous_nfev.pop(tag_mac, None)
+
+    def counters(self) -> dict:
+        """
+        Get the counters and gauges exported as metrics, summed over the workers by `ShardedPipeline`.
+
+        Returns:
+            dict: The readings of unknown MACs, evicted and tracked tags, solver failures, unchanged
+                solves skipped, fingerprint fallbacks and solve cache hits, misses and evictions.
+        """
+        solve_cache = self.location_estimator.solve_cache
+        return {
+            "unknown_macs": self.tag_registry.rejected,
+            "evicted_tags": self.tag_registry.evictions,
+            "tracked_tags": len(self.tag_registry),
+            "solver_failures": self.solver_failures,
+            "unchanged_skips": self.unchanged_skips,
+            "fingerprint_fallbacks": self.fingerprint_fallbacks,
+            **{f"solve_cache_{name}": getattr(solve_cache, name, 0) for name in ("hits", "misses", "evictions")},
+        }
+
+    def __on_evict(self, tag_mac: str, tag_index: int):
+        # The warm start state is keyed by MAC, outside of the registry tables
+        estimator = self.location_estimator
+        estimator.previous_solutions.pop(tag_mac, None)
+        estimator.previous_nfev.pop(tag_mac, None)
+        if self.on_evict:
+            self.on_evict(tag_mac, tag_index)
+
+    def get_latest_filtered_rssi(self, snapshot, macs: list = None, changed_only: bool = False) -> tuple:
+        """
+        Collect the latest filtered RSSI of every tag that has aligned data from at least three receivers.
+
+        The readings of a receiver are aligned when they are within the fusion window of
+        the newest reading of the tag, see `FusionWindow`.
+
+        Args:
+            snapshot (ReadingSnapshot): The readings snapshot to collect from.
+            macs (list, optional): The tags to collect. Defaults to all tags.
+            changed_only (bool, optional): Skip the tags whose aligned readings did not change since
+                they were last collected this way, and remember the collected ones. Defaults to False.
+
+        Returns:
+            tuple: The list of tag MACs and (N, receivers) arrays with their timestamps, filtered RSSI
+                values and which receivers are aligned.
+        """
+        with self.__lock:
+            if macs is None:
+                macs = self.tag_registry.macs()
+
+            # Resolve the rows once, skipping the tags evicted in the meantime
+            lookup = self.tag_registry.lookup
+            rows = [(tag_mac, tag_index) for tag_mac in macs if (tag_index := lookup(tag_mac)) is not None]
+            macs = [tag_mac for tag_mac, _ in rows]
+            tag_indices = np.array([tag_index for _, tag_index in rows], dtype=int)
+
+            # Check which tags have aligned data for enough receivers
+            counts = snapshot.counts(tag_indices)
+            timestamps, _, filtered_rssi = snapshot.latest(tag_indices)
+            available = self.fusion_window.align(timestamps, counts)
+            ready = np.sum(available, axis=1) >= 3
+
+            if changed_only:
+                changed = ready & self.fusion_window.changed(tag_indices, counts, available)
+                self.unchanged_skips += int(np.sum(ready & ~changed))
+                ready = changed
+                self.fusion_window.mark_solved(tag_indices[ready], counts[ready], available[ready])
+
+            ready_macs = [tag_mac for tag_mac, is_ready in zip(macs, ready) if is_ready]
+            return ready_macs, timestamps[ready], filtered_rssi[ready], available[ready]
+
+    def solve(self, macs: list) -> dict:
+        """
+        Compute the positions of some tags from their latest filtered readings.
+
+        Args:
+            macs (list): The tags to solve.
+
+        Returns:
+            dict: Maps each solved tag to a (position, coordinates, distances, timestamps) tuple,
+                as published to the `PositionCache`. Tags without enough aligned data, or whose
+                aligned readings did not change since they were last solved, are left out.
+        """
+        with self.__lock:
+            estimator = self.location_estimator
+            snapshot = self.reading_store.snapshot()
+            ready_macs, timestamps, rssi, available = self.get_latest_filtered_rssi(snapshot, macs, changed_only=True)
+
+            if self.solve_tracer.active():
+                self.__trace_latest(snapshot, macs, set(ready_macs))
+
+            if not ready_macs:
+                return {}
+
+            # Pick the strongest or freshest receivers of each tag
+            scores = rssi if self.receiver_selection == "strongest" else timestamps
+            receivers, valid = estimator.select_receivers(
+                np.where(available, scores, -np.inf),
+                3 if self.solver_mode == "warm_start" else self.receivers_per_solve,
+            )
+            distances = estimator.get_distances(np.take_along_axis(rssi, receivers, axis=1), receivers)
+
+            # Calculate the estimated positions, either per tag from its previous
+            # solution, for all tags in one batch, from the likelihood of the grid cells,
+            # from the nearest fingerprints or by tracking the tags with particles
+            if self.solver_mode == "warm_start":
+                coordinates = np.array([
+                    estimator.trilaterate(*tag_distances, tag=tag_mac, receivers=tag_receivers)
+                    for tag_mac, tag_distances, tag_receivers in zip(ready_macs, distances, receivers)
+                ])
+                logging.debug("Solver stats: %s", estimator.solver_stats)
+            elif self.solver_mode == "grid":
+                coordinates = estimator.locate_grid(distances, receivers, valid)
+            elif self.solver_mode == "fingerprint":
+                coordinates, mismatch = self.radio_map.query(rssi, available, self.fingerprint_k)
+
+                # Tags unlike every fingerprint, e.g. outside the surveyed area, are trilaterated
+                unmatched = mismatch > self.fingerprint_max_mismatch
+                if np.any(unmatched):
+                    self.fingerprint_fallbacks += int(np.sum(unmatched))
+                    coordinates[unmatched] = estimator.trilaterate_batch(
+                        distances[unmatched], receivers=receivers[unmatched], weights=valid[unmatched]
+                    )
+            elif self.solver_mode == "particle":
+                tag_indices = np.array([self.tag_registry.lookup(tag_mac) for tag_mac in ready_macs])
+                times = np.max(np.where(available, timestamps, -np.inf), axis=1)
+                coordinates = self.tracker.update(tag_indices, times, distances, receivers, valid)
+            else:
+                coordinates = estimator.trilaterate_batch(distances, receivers=receivers, weights=valid)
+
+            # Drop the tags the solver could not place
+            solved = np.all(np.isfinite(coordinates), axis=1)
+            if not np.all(solved):
+                failed = [tag_mac for tag_mac, is_solved in zip(ready_macs, solved) if not is_solved]
+                self.solver_failures += len(failed)
+                logging.warning("Solver found no position for %d tags: %s", len(failed), failed[:10])
+
+                ready_macs = [tag_mac for tag_mac, is_solved in zip(ready_macs, solved) if is_solved]
+                coordinates, distances, receivers, valid = (
+                    coordinates[solved], distances[solved], receivers[solved], valid[solved]
+                )
+                rssi, timestamps, available = rssi[solved], timestamps[solved], available[solved]
+
+            positions = estimator.scale_coordinates_batch(coordinates)
+
+            # Distance to every receiver, NaN for the unused ones
+            receiver_distances = np.full(rssi.shape, np.nan)
+            np.put_along_axis(receiver_distances, receivers, np.where(valid, distances, np.nan), axis=1)
+            timestamps = np.where(available, timestamps, np.nan)
+
+            return {
+                tag_mac: (
+                    tuple(int(v) for v in position),
+                    tuple(float(v) for v in tag_coordinates),
+                    tuple(float(v) for v in tag_distances),
+                    tuple(float(v) for v in tag_timestamps),
+                )
+                for tag_mac, position, tag_coordinates, tag_distances, tag_timestamps in zip(
+                    ready_macs, positions, coordinates, receiver_distances, timestamps
+                )
+            }
+
+    def __trace_latest(self, snapshot, macs: list, ready_macs: set):
+        # The joined values are only built for the tags traced this time
+        tracer = self.solve_tracer
+        for tag_mac in macs:
+            tag_index = self.tag_registry.lookup(tag_mac)
+            if tag_index is None or not tracer.enabled(tag_mac):
+                continue
+            if tag_mac not in ready_macs:
+                tracer.log("Tag %s - Not enough new aligned data to calculate position", tag_mac)
+                continue
+
+            _, latest_rssi, latest_filtered = snapshot.latest([tag_index])
+            tracer.log("Tag %s - Latest Values: %s", tag_mac, " | ".join(str(value) for value in latest_rssi[0]))
+            tracer.log("Tag %s - Latest Filtered: %s", tag_mac, " | ".join(str(value) for value in latest_filtered[0]))
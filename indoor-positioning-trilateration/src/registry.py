@@ -0,0 +1,165 @@
+import time
+from collections import OrderedDict
+
+
+class TagRegistry:
+    def __init__(
+        self,
+        tables: list,
+        allow_list: list = None,
+        allow_prefixes: list = None,
+        max_tags: int = None,
+        ttl: float = None,
+        on_evict=None,
+    ):
+        """
+        Registry of the tracked tags with hashed lookups and idle-tag eviction.
+
+        Tags get a row index on first sighting. The row is allocated in every table
+        (e.g. the Kalman filter bank and the reading store) and reused after the tag
+        is evicted, so memory stays bounded by the number of live tags.
+
+        Args:
+            tables (list): Objects with `add_tag() -> int` and `reset(index)` sharing the row indices.
+            allow_list (list, optional): MAC addresses that may be tracked. Defaults to None.
+            allow_prefixes (list, optional): MAC prefixes that may be tracked. Defaults to None.
+            max_tags (int, optional): Maximum number of live tags, the least recently seen is evicted. Defaults to None.
+            ttl (float, optional): Seconds without readings after which a tag is evicted. Defaults to None.
+            on_evict (callable, optional): Called with the MAC and index of each evicted tag. Defaults to None.
+        """
+        self.tables = tables
+        self.allow_list = {mac.upper() for mac in allow_list or []}
+        self.allow_prefixes = tuple(prefix.upper() for prefix in allow_prefixes or [])
+        self.max_tags = max_tags
+        self.ttl = ttl
+        self.on_evict = on_evict
+
+        # Row index of each tag, in registration order
+        self.__indices = {}
+        # Last time each tag was seen, least recently seen first
+        self.__last_seen = OrderedDict()
+        # Rows of evicted tags, reused before allocating new ones
+        self.__free_indices = []
+
+        self.evictions = 0
+        self.rejected = 0
+
+    def is_allowed(self, mac: str) -> bool:
+        """
+        Check if a MAC address may be tracked.
+        """
+        return mac in self.allow_list or (bool(self.allow_prefixes) and mac.startswith(self.allow_prefixes))
+
+    def lookup(self, mac: str) -> int:
+        """
+        Get the row index of a tag, or None if it is not registered.
+        """
+        return self.__indices.get(mac)
+
+    def register(self, mac: str, now: float = None) -> int:
+        """
+        Get the row index of a tag, allocating it on first sighting, and mark it as seen.
+
+        Args:
+            mac (str): The upper case MAC address of the tag.
+            now (float, optional): Current time (seconds since the epoch). Defaults to now.
+
+        Returns:
+            int: The row index, or None if the tag is not allowed.
+        """
+        if now is None:
+            now = time.time()
+
+        index = self.__indices.get(mac)
+        if index is None:
+            if not self.is_allowed(mac):
+                self.rejected += 1
+                return None
+
+            # Make room by evicting the least recently seen tag
+            if self.max_tags is not None and len(self.__indices) >= self.max_tags:
+                self.__evict(next(iter(self.__last_seen)))
+
+            index = self.__allocate()
+            self.__indices[mac] = index
+        else:
+            self.__last_seen.move_to_end(mac)
+
+        self.__last_seen[mac] = now
+        return index
+
+    def evict_idle(self, now: float = None) -> list:
+        """
+        Evict the tags that have not been seen for longer than the TTL.
+
+        Args:
+            now (float, optional): Current time (seconds since the epoch). Defaults to now.
+
+        Returns:
+            list: The MAC addresses of the evicted tags.
+        """
+        if self.ttl is None:
+            return []
+        if now is None:
+            now = time.time()
+
+        evicted = []
+        for mac, last_seen in self.__last_seen.items():
+            if now - last_seen <= self.ttl:
+                break
+            evicted.append(mac)
+
+        for mac in evicted:
+            self.__evict(mac)
+        return evicted
+
+    def remove(self, mac: str) -> int:
+        """
+        Free the row of a tag without evicting it, e.g. after it was handed over elsewhere.
+
+        Args:
+            mac (str): The upper case MAC address of the tag.
+
+        Returns:
+            int: The freed row index, or None if the tag is not registered.
+        """
+        if mac not in self.__indices:
+            return None
+        return self.__release(mac)
+
+    def macs(self) -> list:
+        """
+        Get the MAC addresses of all live tags, in registration order.
+        """
+        return list(self.__indices)
+
+    def __len__(self):
+        return len(self.__indices)
+
+    def __contains__(self, mac):
+        return mac in self.__indices
+
+    def __allocate(self) -> int:
+        if self.__free_indices:
+            index = self.__free_indices.pop()
+            for table in self.tables:
+                table.reset(index)
+            return index
+
+        indices = {table.add_tag() for table in self.tables}
+        if len(indices) != 1:
+            raise RuntimeError(f"Tables allocated different rows: {indices}")
+        return indices.pop()
+
+    def __release(self, mac: str) -> int:
+        index = self.__indices.pop(mac)
+        del self.__last_seen[mac]
+        self.__free_indices.append(index)
+        return index
+
+    def __evict(self, mac: str):
+        index = self.__release(mac)
+        self.evictions += 1
+
+        if self.on_evict:
+            self.on_evict(mac, index)
@@ -0,0 +1,89 @@
+import argparse
+import os
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+from capture import CaptureReader
+
+
+def replay(capture_path: str, speed: float = 1.0, start_time: float = None) -> dict:
+    """
+    Feed a capture through the server's message handler and processing, without a broker.
+
+    Args:
+        capture_path (str): The capture file written by the server.
+        speed (float, optional): Replay speed factor, 0 replays as fast as possible. Defaults to 1.0.
+        start_time (float, optional): Skip the messages received before this time. Defaults to the first message.
+
+    Returns:
+        dict: The number of messages and positions, the elapsed time and the rates per second.
+    """
+    # The server reads the broker settings on import, the replay never connects
+    os.environ.setdefault("MQTT_HOST", "replay")
+    os.environ.setdefault("MQTT_PORT", "1883")
+
+    # The replay would capture its own input, and the cluster and shards are never started
+    os.environ["CAPTURE_PATH"] = ""
+    os.environ["CLUSTER_GROUP"] = ""
+    os.environ["SHARDS"] = "0"
+    import server
+
+    reader = CaptureReader(capture_path)
+    published = server.position_cache.published
+
+    processing_thread = threading.Thread(target=server.process_values, daemon=True)
+    processing_thread.start()
+
+    messages = 0
+    first_time = None
+    start = time.perf_counter()
+    for receive_time, topic, payload in reader.read(start_time):
+        # Keep the original spacing of the messages, scaled by the speed
+        if speed > 0:
+            if first_time is None:
+                first_time = receive_time
+            delay = (receive_time - first_time) / speed - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+
+        message = mqtt.MQTTMessage(topic=topic.encode("utf-8"))
+        message.payload = payload
+        server.on_message(None, None, message)
+        messages += 1
+
+    # Process the readings still waiting for the latency budget
+    server.scheduler.stop()
+    processing_thread.join()
+    server.scheduler.flush(server.update_positions)
+
+    elapsed = time.perf_counter() - start
+    positions = server.position_cache.published - published
+    return {
+        "messages": messages,
+        "positions": positions,
+        "elapsed_s": elapsed,
+        "messages_per_s": messages / elapsed if elapsed else 0.0,
+        "positions_per_s": positions / elapsed if elapsed else 0.0,
+        "latency": server.scheduler.latency_stats.summary(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a capture of the receiver messages through the server processing.")
+    parser.add_argument("capture", help="Capture file written with CAPTURE_PATH")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed factor, 0 replays as fast as possible")
+    parser.add_argument("--start", type=float, default=None, help="Skip the messages received before this time (seconds since the epoch)")
+    parser.add_argument("--log-level", default="WARNING", help="Log level of the server during the replay")
+    args = parser.parse_args()
+
+    # The server configures the logging on import
+    os.environ["LOG_LEVEL"] = args.log_level
+
+    report = replay(args.capture, args.speed, args.start)
+    latency = report["latency"]
+    print(f"Replayed {report['messages']} messages in {report['elapsed_s']:.2f}s")
+    print(f"Messages/s: {report['messages_per_s']:.1f}")
+    print(f"Positions/s: {report['positions_per_s']:.1f} ({report['positions']} positions)")
+    print(f"Receipt to position latency: p50={latency['p50_ms']:.1f}ms, p99={latency['p99_ms']:.1f}ms")
@@ -0,0 +1,218 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class LatencyStats:
+    def __init__(self, window: int = 1000):
+        """
+        Keeps the most recent latency samples and summarizes them.
+
+        Args:
+            window (int, optional): Number of samples kept. Defaults to 1000.
+        """
+        self.samples = deque(maxlen=window)
+        self.count = 0
+
+    def record(self, latency: float):
+        """
+        Record one latency sample in seconds.
+        """
+        self.samples.append(latency)
+        self.count += 1
+
+    def summary(self) -> dict:
+        """
+        Summarize the recent samples.
+
+        Returns:
+            dict: Total count and mean/p50/p99/max latency (ms) of the recent samples.
+        """
+        if not self.samples:
+            return {"count": self.count, "mean_ms": 0.0, "p50_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+
+        samples = np.array(self.samples) * 1000
+        return {
+            "count": self.count,
+            "mean_ms": float(np.mean(samples)),
+            "p50_ms": float(np.percentile(samples, 50)),
+            "p99_ms": float(np.percentile(samples, 99)),
+            "max_ms": float(np.max(samples)),
+        }
+
+    def __str__(self):
+        summary = self.summary()
+        return (
+            f"LatencyStats(count={summary['count']}, mean={summary['mean_ms']:.1f}ms, "
+            f"p50={summary['p50_ms']:.1f}ms, p99={summary['p99_ms']:.1f}ms, max={summary['max_ms']:.1f}ms)"
+        )
+
+
+class DirtyScheduler:
+    def __init__(self, latency_budget: float = 0.05):
+        """
+        Collects the tags that received new readings and hands them to a worker in batches.
+
+        The first reading that marks a tag dirty opens a batch. The worker waits until
+        `latency_budget` has passed since then, so readings arriving in the meantime
+        are coalesced, and processes all dirty tags at once. Idle tags are never processed.
+
+        Args:
+            latency_budget (float, optional): Maximum coalescing delay (seconds). Defaults to 0.05.
+        """
+        self.latency_budget = latency_budget
+        self.latency_stats = LatencyStats()
+
+        self.__condition = threading.Condition()
+        self.__dirty = {}
+        self.__first_receipt = None
+        self.__stopped = False
+        # Wakes up the worker of `run_async`, called with the condition held
+        self.__wakeup = None
+
+    def mark(self, tag, receiver, receipt_time: float = None):
+        """
+        Mark a (tag, receiver) pair as dirty.
+
+        Args:
+            tag: The tag identifier.
+            receiver: The receiver identifier.
+            receipt_time (float, optional): `time.perf_counter()` when the reading was received. Defaults to now.
+        """
+        if receipt_time is None:
+            receipt_time = time.perf_counter()
+
+        with self.__condition:
+            if tag not in self.__dirty:
+                # Keep the receipt time of the oldest pending reading of the tag
+                self.__dirty[tag] = (receipt_time, set())
+            self.__dirty[tag][1].add(receiver)
+
+            if self.__first_receipt is None:
+                self.__first_receipt = receipt_time
+                self.__notify()
+
+    def mark_many(self, tags: list, receiver, receipt_time: float = None):
+        """
+        Mark the pairs of many tags with one receiver as dirty.
+
+        Args:
+            tags (list): The tag identifiers.
+            receiver: The receiver identifier.
+            receipt_time (float, optional): `time.perf_counter()` when the readings were received. Defaults to now.
+        """
+        if receipt_time is None:
+            receipt_time = time.perf_counter()
+
+        with self.__condition:
+            for tag in tags:
+                if tag not in self.__dirty:
+                    self.__dirty[tag] = (receipt_time, set())
+                self.__dirty[tag][1].add(receiver)
+
+            if tags and self.__first_receipt is None:
+                self.__first_receipt = receipt_time
+                self.__notify()
+
+    def run(self, process):
+        """
+        Process dirty tags until `stop` is called.
+
+        Args:
+            process (callable): Called with a dict mapping each dirty tag to its set of dirty receivers.
+        """
+        while True:
+            with self.__condition:
+                while self.__first_receipt is None and not self.__stopped:
+                    self.__condition.wait()
+                if self.__stopped:
+                    return
+                deadline = self.__first_receipt + self.latency_budget
+
+            # Coalesce readings until the latency budget of the oldest one is used up
+            delay = deadline - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+            self.__process(process)
+
+    async def run_async(self, process):
+        """
+        Process dirty tags on the running event loop until `stop` is called.
+
+        The worker sleeps on the loop instead of blocking a thread, so marking tags
+        from the loop (or any other thread) never waits for the processing.
+
+        Args:
+            process (callable): Called on the loop with a dict mapping each dirty tag to its set of dirty receivers.
+        """
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+
+        with self.__condition:
+            self.__wakeup = lambda: loop.call_soon_threadsafe(event.set)
+            if self.__first_receipt is not None or self.__stopped:
+                event.set()
+
+        try:
+            while True:
+                await event.wait()
+                event.clear()
+
+                with self.__condition:
+                    if self.__stopped:
+                        return
+                    if self.__first_receipt is None:
+                        continue
+                    deadline = self.__first_receipt + self.latency_budget
+
+                # Coalesce readings until the latency budget of the oldest one is used up
+                delay = deadline - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                self.__process(process)
+        finally:
+            with self.__condition:
+                self.__wakeup = None
+
+    def flush(self, process):
+        """
+        Process the pending dirty tags in the calling thread, e.g. after the worker was stopped.
+
+        Args:
+            process (callable): Called with a dict mapping each dirty tag to its set of dirty receivers.
+        """
+        with self.__condition:
+            if self.__first_receipt is None:
+                return
+        self.__process(process)
+
+    def stop(self):
+        """
+        Stop the worker loop.
+        """
+        with self.__condition:
+            self.__stopped = True
+            self.__notify()
+
+    def __notify(self):
+        self.__condition.notify()
+        if self.__wakeup is not None:
+            self.__wakeup()
+
+    def __process(self, process):
+        with self.__condition:
+            dirty = self.__dirty
+            self.__dirty = {}
+            self.__first_receipt = None
+
+        process({tag: receivers for tag, (_, receivers) in dirty.items()})
+
+        # End-to-end latency from receipt to position update
+        now = time.perf_counter()
+        for receipt_time, _ in dirty.values():
+            self.latency_stats.record(now - receipt_time)
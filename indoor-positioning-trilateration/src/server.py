@@ -1,21 +1,30 @@
 import asyncio
+import atexit
 import json
 import logging
 import os
+import socket
+import sys
 import threading
 import time
-from collections import deque, defaultdict
 
 import numpy as np
 import paho.mqtt.client as mqtt
 from dotenv import load_dotenv
 
-from calc import TrilaterationController
+from cache import PositionCache
+from capture import CaptureWriter
+from cluster import ClusterNode
 from controller import Controller
 from environment import *
-from filter import apply_kalman_filter, initialize_kalman_filter
-from graph import animate, set_on_close
-from utils import convert_string_to_datetime
+from logs import TagTracer, setup_logging
+from metrics import MetricsRegistry, start_metrics_server
+from mqtt_asyncio import AsyncioMqttHelper
+from pipeline import PositioningPipeline
+from scheduler import DirtyScheduler
+from sharding import ShardedPipeline
+from utils import TimestampParser
+from wire import address_to_mac, decode_frame, is_frame
 
 RUN_PIXEL_DISPLAY = False  # Whether to run the pixel display
 GRAPH_REFRESH_INTERVAL = 2  # Refresh interval for the graph (seconds)
@@ -24,24 +33,16 @@ DISPLAY_REFRESH_INTERVAL = 4  # Refresh interval for the pixe ldisplay (seconds)
 # Load env variables from .env file
 load_dotenv()
 
-# Logging configuration
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-)
-
-# State to stop the threads
-stop_threads = False
-
 # Environment variables
 host = os.getenv("MQTT_HOST")
 port = int(os.getenv("MQTT_PORT"))
-mqtt_topic_1 = os.getenv("MQTT_TOPIC_1")
-mqtt_topic_2 = os.getenv("MQTT_TOPIC_2")
-mqtt_topic_3 = os.getenv("MQTT_TOPIC_3")
-if mqtt_topic_1: mqtt_topic_1 = mqtt_topic_1.strip()
-if mqtt_topic_2: mqtt_topic_2 = mqtt_topic_2.strip()
-if mqtt_topic_3: mqtt_topic_3 = mqtt_topic_3.strip()
+mqtt_subscription = os.getenv("MQTT_SUBSCRIPTION", MQTT_SUBSCRIPTION).strip()
+
+# Receiver of each topic, MQTT_TOPIC_n overrides the topic of the n-th receiver
+topic_receivers = {}
+for i, receiver in enumerate(RECEIVERS):
+    topic = os.getenv(f"MQTT_TOPIC_{i + 1}", receiver["topic"]).strip()
+    topic_receivers[topic] = i
 
 # Load tag configuration
 no_of_tags = int(os.getenv("NO_OF_TAGS", "1"))
@@ -51,147 +52,369 @@ for i in range(1, no_of_tags + 1):
     if tag_mac:
         tag_macs.append(tag_mac.strip().upper())  # Store MAC addresses in uppercase for comparison
 
-logging.info(f"Tracking {no_of_tags} tags: {tag_macs}")
+# Tags can also be allowed by MAC prefix, e.g. "C3:00:00"
+tag_mac_prefixes = [
+    prefix.strip().upper()
+    for prefix in os.getenv("TAG_MAC_PREFIXES", "").split(",")
+    if prefix.strip()
+]
+
+# Instances of the same cluster group share the receiver topics
+cluster_group = os.getenv("CLUSTER_GROUP", CLUSTER_GROUP).strip()
+instance_id = os.getenv("INSTANCE_ID", f"{socket.gethostname()}-{os.getpid()}").strip()
+
+# Worker processes the tags are partitioned across, if set
+shard_count = int(os.getenv("SHARDS", SHARDS))
+
+# Filter state, readings and solver of the tracked tags, in this process or in each shard
+pipeline_config = dict(
+    receivers=RECEIVERS,
+    allow_list=tag_macs,
+    allow_prefixes=tag_mac_prefixes,
+    capacity=max(len(tag_macs), 16),
+)
+
+# Worker processes owning the tags instead of the pipeline below, if enabled. They are forked
+# before the logging, MQTT, metrics and cluster threads start, so no lock they inherit is held
+shards = None
+if shard_count > 0 and not cluster_group:
+    shards = ShardedPipeline(
+        shard_count,
+        pipeline_config,
+        on_result=lambda positions, evicted: merge_shard_result(positions, evicted),
+        latency_budget=PROCESS_LATENCY_BUDGET,
+        eviction_interval=TAG_EVICTION_INTERVAL,
+    )
+    shards.start_workers()
+
+# Logging configuration, the records are written by a background thread with LOG_QUEUE
+log_listener = setup_logging(os.getenv("LOG_LEVEL", LOG_LEVEL).strip().upper(), LOG_QUEUE)
+if log_listener is not None:
+    atexit.register(log_listener.stop)
+
+# Rate-limited debug traces of the raw messages per topic and of the positions per tag
+message_tracer = TagTracer(TAG_LOG_INTERVAL)
+position_tracer = TagTracer(TAG_LOG_INTERVAL)
+
+# State to stop the threads
+stop_threads = False
 
-if not all([host, port, mqtt_topic_1, mqtt_topic_2, mqtt_topic_3]) or not tag_macs:
+# Time of the last pixel display update
+last_display_update = 0
+
+# Time of the last check for idle tags
+last_eviction_check = 0
+
+logging.info(f"Tracking {no_of_tags} tags: {tag_macs}, prefixes: {tag_mac_prefixes}")
+
+if not all([host, port, mqtt_subscription]) or not (tag_macs or tag_mac_prefixes):
     logging.error("Required environment variables not set")
     exit(1)
 
-# Create a client instance
-client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, "SubscriberClient")
+# Raw receiver messages are appended to this capture file, if set
+capture_path = os.getenv("CAPTURE_PATH", CAPTURE_PATH).strip()
+capture = CaptureWriter(capture_path) if capture_path else None
+if capture is not None:
+    logging.info(f"Capturing the received messages to {capture_path}")
+
+if cluster_group and shard_count > 0:
+    logging.error("CLUSTER_GROUP cannot be combined with SHARDS, the shard state cannot be handed over")
+    exit(1)
+
+# Create a client instance, the client id must be unique per instance
+client = mqtt.Client(
+    mqtt.CallbackAPIVersion.VERSION1,
+    f"SubscriberClient-{instance_id}" if cluster_group else "SubscriberClient",
+)
 
 # Set authentication for the client
 # client.username_pw_set(username, password)
 
-# Data structure to store readings for each tag from each receiver
-tags_data = {}
-for tag_mac in tag_macs:
-    tags_data[tag_mac] = {
-        "receiver_1": deque(maxlen=20),
-        "receiver_2": deque(maxlen=20),
-        "receiver_3": deque(maxlen=20),
-        "position": (0, 0),  # Default position
-        "kalman_filters": {
-            "receiver_1": initialize_kalman_filter(),
-            "receiver_2": initialize_kalman_filter(),
-            "receiver_3": initialize_kalman_filter(),
-        }
-    }
-    
-    # Initialize with test data
-    for receiver in ["receiver_1", "receiver_2", "receiver_3"]:
-        tags_data[tag_mac][receiver].append({
-            "time": "2021-08-01 12:00:00", 
-            "address": "address_1", 
-            "rssi": -42, 
-            "filtered_rssi": [-42],
-            "mac": tag_mac
-        })
-
-# Initialize the trilateration controller
-locationEstimator = TrilaterationController(
-    bp_1=RECEIVER_1_POS,
-    bp_2=RECEIVER_2_POS,
-    bp_3=RECEIVER_3_POS,
-    measured_power_1=RECEIVER_1_TX_POWER,
-    measured_power_2=RECEIVER_2_TX_POWER,
-    measured_power_3=RECEIVER_3_TX_POWER,
-    path_loss_exponent=PATH_LOSS_EXPONENT,
+# Position of each receiver, drawn by the graph and the display
+receiver_positions = [receiver["position"] for receiver in RECEIVERS]
+
+# Timestamp parser learning the format of each receiver
+timestamp_parsers = [TimestampParser() for _ in RECEIVERS]
+
+# Scheduler recomputing only the tags that received new readings
+scheduler = DirtyScheduler(latency_budget=PROCESS_LATENCY_BUDGET)
+
+# Latest positions published by the processing stage for the graph and display
+position_cache = PositionCache()
+
+# Filter state, readings and solver of the tags of this process
+pipeline = PositioningPipeline(
+    **pipeline_config,
+    on_evict=lambda tag_mac, index: evict_tag(tag_mac),
 )
+reading_store = pipeline.reading_store
+tag_registry = pipeline.tag_registry
+locationEstimator = pipeline.location_estimator
+
+
+def evict_tag(tag_mac):
+    position_cache.remove([tag_mac])
+    if cluster is not None:
+        cluster.publish_positions(evicted=[tag_mac])
+
+
+def merge_shard_result(positions, evicted):
+    # Removed after the publish, so a position of an evicted tag cannot stay in the cache
+    if positions:
+        position_cache.publish(positions)
+        positions_total.inc(len(positions))
+    if evicted:
+        position_cache.remove(evicted)
+
+
+# Membership in the cluster of instances, if enabled
+cluster = None
+if cluster_group:
+    cluster = ClusterNode(
+        client,
+        instance_id,
+        cluster_group,
+        pipeline,
+        position_cache,
+        on_readings=lambda *readings: ingest_readings(*readings),
+        topic_prefix=CLUSTER_TOPIC_PREFIX,
+        member_timeout=CLUSTER_MEMBER_TIMEOUT,
+    )
 
 
+# Metrics of the processing stages, served in the Prometheus text format
+metrics_port = int(os.getenv("METRICS_PORT", METRICS_PORT))
+metrics = MetricsRegistry()
+stage_seconds = metrics.histogram(
+    "positioning_stage_seconds", "Time spent in each processing stage", ("stage", "receiver")
+)
+messages_total = metrics.counter("positioning_messages_total", "MQTT messages received per receiver", ("receiver",))
+readings_total = metrics.counter("positioning_readings_total", "RSSI readings received per receiver", ("receiver",))
+dropped_messages_total = metrics.counter("positioning_dropped_messages_total", "Messages dropped, by reason", ("reason",))
+positions_total = metrics.counter("positioning_positions_total", "Positions solved and published")
+
+
+def pipeline_counter(name):
+    # The tags are counted by the workers with shards, the pipeline of the server stays empty
+    return (pipeline.counters() if shards is None else shards.counters()).get(name, 0)
+
+
+metrics.callback("positioning_unknown_macs_total", "Readings of MACs that are not tracked", lambda: pipeline_counter("unknown_macs"), "counter")
+metrics.callback("positioning_solver_failures_total", "Tags the solver found no position for", lambda: pipeline_counter("solver_failures"), "counter")
+metrics.callback(
+    "positioning_unchanged_solves_skipped_total",
+    "Dirty tags not solved again because their aligned readings did not change",
+    lambda: pipeline_counter("unchanged_skips"),
+    "counter",
+)
+metrics.callback(
+    "positioning_fingerprint_fallbacks_total",
+    "Tags trilaterated because no fingerprint of the radio map matched",
+    lambda: pipeline_counter("fingerprint_fallbacks"),
+    "counter",
+)
+for name in ("hits", "misses", "evictions"):
+    metrics.callback(
+        f"positioning_solve_cache_{name}_total",
+        f"Solve cache {name}",
+        lambda name=name: pipeline_counter(f"solve_cache_{name}"),
+        "counter",
+    )
+metrics.callback("positioning_evicted_tags_total", "Tags evicted while idle or over the limit", lambda: pipeline_counter("evicted_tags"), "counter")
+metrics.callback("positioning_tracked_tags", "Tags currently tracked", lambda: pipeline_counter("tracked_tags"))
+metrics.callback(
+    "positioning_timestamp_failures_total",
+    "Reading timestamps that could not be parsed, replaced by the receipt time",
+    lambda: sum(parser.failures for parser in timestamp_parsers),
+    "counter",
+)
+
+# Latencies of the processing in the server, the shards log theirs when they stop
+if shards is None:
+    for name, stats in [
+        ("receipt_to_position", scheduler.latency_stats),
+        ("snapshot_publish", reading_store.snapshot_stats["publish_time"]),
+    ]:
+        for quantile in ("p50", "p99"):
+            metrics.callback(
+                f"positioning_{name}_{quantile}_seconds",
+                f"Recent {quantile} of the {name.replace('_', ' ')} time",
+                lambda stats=stats, quantile=quantile: stats.summary()[f"{quantile}_ms"] / 1000,
+            )
+
+# Metrics of each receiver, looked up once for the message handler
+receiver_metrics = [
+    {
+        "messages": messages_total.labels(receiver["name"]),
+        "readings": readings_total.labels(receiver["name"]),
+        **{stage: stage_seconds.labels(stage, receiver["name"]) for stage in ("receive", "decode", "filter")},
+    }
+    for receiver in RECEIVERS
+]
+
 # MQTT event handlers
 def on_connect(client, userdata, flags, return_code):
     if return_code != 0:
         return logging.info("could not connect, return code:", return_code)
 
     logging.info("Connected to broker")
-    logging.info("Subscribing to topics:")
-    logging.info(" - " + mqtt_topic_1)
-    logging.info(" - " + mqtt_topic_2)
-    logging.info(" - " + mqtt_topic_3)
-    client.subscribe(mqtt_topic_1)
-    client.subscribe(mqtt_topic_2)
-    client.subscribe(mqtt_topic_3)
+    logging.info(f"Subscribing to {mqtt_subscription} for {len(topic_receivers)} receivers")
+    if cluster is None:
+        client.subscribe(mqtt_subscription)
+    else:
+        logging.info(f"Joining cluster group {cluster_group} as {instance_id}")
+        client.subscribe(cluster.subscriptions(mqtt_subscription))
+        cluster.heartbeat()
 
 
 def on_message(client, userdata, message):
+    receipt_time = time.perf_counter()
     try:
-        decoded_message = message.payload.decode("utf-8")
-        logging.info(f"Raw message received on {message.topic}: {decoded_message}")
-        response_list = json.loads(decoded_message)  # Parse JSON payload as a list
-
-        # Select the element containing an RSSI value
-        response = next((item for item in response_list if "rssi" in item), None)
-        if not response:
-            raise ValueError("No valid element with 'rssi' found in message")
-            
-        # Make sure required fields exist
-        if "address" not in response:
-            response["address"] = "unknown"
-        
-        # Check for MAC address
-        tag_mac = response.get("mac", "").upper()
-        if tag_mac not in tag_macs:
-            logging.info(f"Ignoring message from unregistered MAC: {tag_mac}")
+        # Membership, forwarded readings, handoffs and positions of the cluster
+        if cluster is not None and cluster.handle_message(message, receipt_time):
             return
-            
-        # Handle timestamp - ensure we have a time field
-        if "time" not in response:
-            if "timestamp" in response:
-                # Use timestamp field if available but convert to time
-                response["time"] = convert_string_to_datetime(response["timestamp"])
-            else:
-                # Use current time if no timestamp is available
-                response["time"] = convert_string_to_datetime(time.strftime("%Y-%m-%d %H:%M:%S"))
-
-        # Determine which receiver this is from and apply Kalman filter
-        receiver_key = None
-        if message.topic == mqtt_topic_1:
-            receiver_key = "receiver_1"
-        elif message.topic == mqtt_topic_2:
-            receiver_key = "receiver_2"
-        elif message.topic == mqtt_topic_3:
-            receiver_key = "receiver_3"
-        else:
+
+        if capture is not None:
+            capture.append(message.topic, message.payload)
+
+        # Determine which receiver this is from
+        receiver_index = topic_receivers.get(message.topic)
+        if receiver_index is None:
+            dropped_messages_total.labels("unknown_topic").inc()
             logging.error("Unknown topic received: " + message.topic)
             return
-            
-        # Apply filter and store data
-        kf = tags_data[tag_mac]["kalman_filters"][receiver_key]
-        response["filtered_rssi"] = apply_kalman_filter(kf, response["rssi"])
-        tags_data[tag_mac][receiver_key].append(response)
-        
-        logging.info(f"Tag {tag_mac} - {receiver_key} updated with RSSI: {response['rssi']}, filtered: {response['filtered_rssi']}")
+        receiver_metric = receiver_metrics[receiver_index]
+        receiver_metric["messages"].inc()
+
+        # Receivers send binary frames or JSON
+        now = time.time()
+        if is_frame(message.payload):
+            message_tracer.trace(message.topic, "Binary frame received on %s: %d bytes", message.topic, len(message.payload))
+            macs, timestamps, rssi = decode_frame(message.payload)
+        else:
+            macs, timestamps, rssi = decode_json(message.topic, message.payload, receiver_index, now)
+
+        receiver_metric["readings"].inc(len(macs))
+        receiver_metric["decode"].observe(time.perf_counter() - receipt_time)
+
+        # Forward the readings of the tags owned by other instances
+        if cluster is not None:
+            macs, timestamps, rssi = cluster.route(receiver_index, macs, timestamps, rssi)
+
+        ingest_readings(receiver_index, macs, timestamps, rssi, receipt_time)
+        receiver_metric["receive"].observe(time.perf_counter() - receipt_time)
 
     except Exception as e:
+        dropped_messages_total.labels("invalid").inc()
         logging.error(f"Error processing message on topic {message.topic}: {str(e)}")
         logging.error(f"Message payload: {message.payload}")
         import traceback
         logging.error(traceback.format_exc())
 
 
+def decode_json(topic, payload, receiver_index, now):
+    """
+    Collect the readings of a JSON message, a list of (or one) objects with a `mac` (or the
+    `address` sent by the beacons), an `rssi` and a `time` or `timestamp`.
+
+    Parameters:
+    topic (str): Topic of the message
+    payload (bytes): The JSON payload
+    receiver_index (int): Index of the receiver that sent the message
+    now (float): Timestamp of the readings without one (seconds since the epoch)
+
+    Returns:
+    tuple: The upper case MAC address, timestamp and RSSI lists of the readings
+    """
+    decoded_message = payload.decode("utf-8")
+    message_tracer.trace(topic, "Raw message received on %s: %s", topic, decoded_message)
+    response_list = json.loads(decoded_message)  # Parse JSON payload as a list
+    if isinstance(response_list, dict):
+        response_list = [response_list]
+
+    # Select the elements containing an RSSI value
+    responses = [item for item in response_list if "rssi" in item]
+    if not responses:
+        raise ValueError("No valid element with 'rssi' found in message")
+
+    # Collect the readings of the message
+    parse_timestamp = timestamp_parsers[receiver_index].parse
+    macs = []
+    timestamps = []
+    rssi = []
+    for response in responses:
+        if "mac" in response:
+            macs.append(response["mac"].upper())
+        else:
+            macs.append(address_to_mac(response.get("address", "")))
+        rssi.append(response["rssi"])
+
+        # Handle timestamp - stored as seconds since the epoch, the time field takes precedence
+        reading_time = response.get("time", response.get("timestamp"))
+        if reading_time is not None:
+            timestamps.append(parse_timestamp(reading_time, now))
+        else:
+            # Use current time if no timestamp is available
+            timestamps.append(now)
+    return macs, timestamps, rssi
+
+
+def ingest_readings(receiver_index, macs, timestamps, rssi, receipt_time):
+    """
+    Filter and store readings from one receiver and mark their tags for processing.
+
+    Parameters:
+    receiver_index (int): Index of the receiver
+    macs (list): The upper case MAC address of each reading
+    timestamps (list): Timestamp of each reading (seconds since the epoch)
+    rssi (list): RSSI of each reading
+    receipt_time (float): `time.perf_counter()` when the readings were received
+
+    Returns:
+    None
+    """
+    global last_eviction_check
+
+    # The shards filter and store the readings of their tags
+    if shards is not None:
+        shards.dispatch(receiver_index, macs, timestamps, rssi)
+        return
+
+    now = time.time()
+    start = time.perf_counter()
+    batch_macs, _, _ = pipeline.ingest(receiver_index, macs, timestamps, rssi, now)
+    receiver_metrics[receiver_index]["filter"].observe(time.perf_counter() - start)
+
+    # Free the rows of idle tags
+    if now - last_eviction_check >= TAG_EVICTION_INTERVAL:
+        last_eviction_check = now
+        pipeline.evict_idle(now)
+
+    if batch_macs:
+        scheduler.mark_many(batch_macs, receiver_index, receipt_time)
+
+
 # Assign event handlers
 client.on_connect = on_connect
 client.on_message = on_message
 
+# The MQTT socket callbacks and bleak need a selector event loop on Windows
+if sys.platform == "win32":
+    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
 # Bluetooth controller
 if RUN_PIXEL_DISPLAY:
     bt = Controller("DC:03:BB:B0:67:4A")
 
     # Set the beacons on the display
     bt.set_beacons(
-        [
-            locationEstimator.scale_coordinates(*RECEIVER_1_POS),
-            locationEstimator.scale_coordinates(*RECEIVER_2_POS),
-            locationEstimator.scale_coordinates(*RECEIVER_3_POS),
-        ]
+        [locationEstimator.scale_coordinates(*position) for position in receiver_positions]
     )
 
-    # Create a global event loop
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
-    asyncio.set_event_loop(loop)
+    if RUNTIME == "threads":
+        # Event loop driven by the processing thread
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
 
     async def update_plot(tag_positions):
         """
@@ -209,95 +432,198 @@ if RUN_PIXEL_DISPLAY:
         if tag_positions:
             first_tag = list(tag_positions.keys())[0]
             x, y = tag_positions[first_tag]
+            start = time.perf_counter()
             await bt.plot(x, y)
+            stage_seconds.labels("display", "").observe(time.perf_counter() - start)
+
+
+def update_positions(dirty_tags):
+    """
+    Recompute the positions of the tags that received new readings.
+
+    Parameters:
+    dirty_tags (dict): Maps each dirty tag MAC to the set of receivers with new readings
+
+    Returns:
+    None
+    """
+    global last_display_update
+
+    # Publish the positions for the graph and display
+    start = time.perf_counter()
+    positions = pipeline.solve(list(dirty_tags))
+    solved = time.perf_counter()
+    stage_seconds.labels("solve", "").observe(solved - start)
+
+    # Tags evicted during the solve are not published, their removal from the cache is done
+    positions = {tag_mac: snapshot for tag_mac, snapshot in positions.items() if tag_mac in tag_registry}
+
+    if positions:
+        position_cache.publish(positions)
+
+        # A tag evicted after the check above may have been removed before it was published
+        evicted = [tag_mac for tag_mac in positions if tag_mac not in tag_registry]
+        if evicted:
+            position_cache.remove(evicted)
+            positions = {tag_mac: snapshot for tag_mac, snapshot in positions.items() if tag_mac not in evicted}
+
+        if cluster is not None:
+            cluster.publish_positions(positions)
+        stage_seconds.labels("publish", "").observe(time.perf_counter() - solved)
+        positions_total.inc(len(positions))
+
+        if position_tracer.active():
+            for tag_mac, (position, *_) in positions.items():
+                position_tracer.trace(tag_mac, "Tag %s - Estimated position: %s", tag_mac, position)
+
+    # Update the display with all tag positions and report the latency, the
+    # asyncio runtime does this in its own task
+    if RUNTIME == "threads" and time.time() - last_display_update >= DISPLAY_REFRESH_INTERVAL:
+        last_display_update = time.time()
+        report_stats()
+
+        if RUN_PIXEL_DISPLAY:
+            loop.run_until_complete(update_plot(get_display_positions()))
+
+
+def report_stats():
+    if shards is None:
+        logging.info(f"Receipt to position latency: {scheduler.latency_stats}")
+        logging.info(
+            f"Snapshot publish time: {reading_store.snapshot_stats['publish_time']}, "
+            f"snapshot age: {reading_store.snapshot_stats['snapshot_age']}, "
+            f"trimmed windows: {reading_store.snapshot_stats['trimmed_windows']}"
+        )
+    else:
+        logging.info(f"Readings dispatched per shard: {shards.dispatched}, results merged: {shards.merged}")
+    if cluster is not None:
+        logging.info(f"Cluster members: {sorted(cluster.ring.members)}, stats: {cluster.stats}")
+
+
+def get_display_positions():
+    _, snapshots = position_cache.snapshot()
+    return {tag_mac: snapshot.position for tag_mac, snapshot in snapshots.items()}
 
 
 def process_values():
+    scheduler.run(update_positions)
+
+
+def send_heartbeats():
     while not stop_threads:
-        tag_positions = {}
-        
-        for tag_mac in tag_macs:
-            tag_data = tags_data[tag_mac]
-            
-            # Check if we have data for all receivers
-            if (tag_data["receiver_1"] and tag_data["receiver_2"] and 
-                tag_data["receiver_3"]):
-                
-                logging.info(f"Tag {tag_mac} - Latest Values: {' | '.join(str(tag_data[rec][-1]['rssi']) for rec in ['receiver_1', 'receiver_2', 'receiver_3'])}")
-                logging.info(f"Tag {tag_mac} - Latest Filtered: {' | '.join(str(tag_data[rec][-1]['filtered_rssi']) for rec in ['receiver_1', 'receiver_2', 'receiver_3'])}")
-
-                # Calculate the estimated position
-                rssi_1 = tag_data["receiver_1"][-1]["filtered_rssi"][0]
-                rssi_2 = tag_data["receiver_2"][-1]["filtered_rssi"][0]
-                rssi_3 = tag_data["receiver_3"][-1]["filtered_rssi"][0]
-
-                # Update the position
-                position = locationEstimator.get_position(rssi_1, rssi_2, rssi_3)
-                tag_data["position"] = position
-                tag_positions[tag_mac] = position
-                
-                logging.info(f"Tag {tag_mac} - Estimated position: {position}")
-            else:
-                logging.info(f"Tag {tag_mac} - Not enough data to calculate position")
-
-        # Update the display with all tag positions
-        if RUN_PIXEL_DISPLAY and tag_positions:
-            loop.run_until_complete(update_plot(tag_positions))
-
-        time.sleep(DISPLAY_REFRESH_INTERVAL)
+        time.sleep(CLUSTER_HEARTBEAT_INTERVAL)
+        cluster.heartbeat()
+
+
+async def send_heartbeats_async():
+    while True:
+        await asyncio.sleep(CLUSTER_HEARTBEAT_INTERVAL)
+        cluster.heartbeat()
+
+
+async def display_values():
+    """
+    Report the latency and push the cached positions to the pixel display every refresh interval.
+
+    Returns:
+    None
+    """
+    displayed_version = None
+    while True:
+        await asyncio.sleep(DISPLAY_REFRESH_INTERVAL)
+        report_stats()
+
+        version = position_cache.version
+        if RUN_PIXEL_DISPLAY and version != displayed_version:
+            displayed_version = version
+            await update_plot(get_display_positions())
+
+
+async def serve():
+    """
+    Run the MQTT client, the processing and the pixel display on one event loop until
+    the scheduler is stopped.
+
+    Returns:
+    None
+    """
+    mqtt_helper = AsyncioMqttHelper(asyncio.get_running_loop(), client)
+
+    logging.info("Connecting to broker")
+    await mqtt_helper.connect(host, port)
+
+    logging.info("Starting processing and display tasks")
+    tasks = [asyncio.create_task(display_values())]
+    if cluster is not None:
+        tasks.append(asyncio.create_task(send_heartbeats_async()))
+    try:
+        # The solves share the registry and filter state with the ingest, so they run on
+        # the loop too, SHARDS moves whole tags with their state to worker processes
+        await scheduler.run_async(update_positions)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        if cluster is not None:
+            cluster.leave()
+            logging.info("Left the cluster.")
+
+        await mqtt_helper.disconnect()
+        logging.info("MQTT disconnected.")
+
+        if capture is not None:
+            capture.close()
+
+        if RUN_PIXEL_DISPLAY:
+            await bt.disconnect()
+            logging.info("Bluetooth disconnected.")
 
 
 def run_graph():
+    # The graph is only imported when it is shown
+    from graph import animate
+
+    # Data of the last cache version drawn by the graph
+    graph_data = {"version": None, "data": None}
+
     def get_updated_data():
-        # This function gathers position data for all tags
+        # This function reads the position data of all tags from the cache
+        version, snapshots = position_cache.snapshot()
+        if version == graph_data["version"]:
+            return graph_data["data"]
+
         tags_positions = {}
         tags_base_stations = {}
-        
-        for tag_mac in tag_macs:
-            tag_data = tags_data[tag_mac]
-            
-            if (tag_data["receiver_1"] and tag_data["receiver_2"] and 
-                tag_data["receiver_3"]):
-                # Calculate base stations and distances for this tag
-                base_stations = [
-                    {
-                        "coords": RECEIVER_1_POS,
-                        "distance": locationEstimator.get_distance(
-                            tag_data["receiver_1"][-1]["filtered_rssi"][0], 1
-                        ),
-                    },
-                    {
-                        "coords": RECEIVER_2_POS,
-                        "distance": locationEstimator.get_distance(
-                            tag_data["receiver_2"][-1]["filtered_rssi"][0], 2
-                        ),
-                    },
-                    {
-                        "coords": RECEIVER_3_POS,
-                        "distance": locationEstimator.get_distance(
-                            tag_data["receiver_3"][-1]["filtered_rssi"][0], 3
-                        ),
-                    },
-                ]
-                
-                position = locationEstimator.trilaterate(
-                    base_stations[0]["distance"],
-                    base_stations[1]["distance"],
-                    base_stations[2]["distance"],
-                )
-                
-                tags_base_stations[tag_mac] = base_stations
-                tags_positions[tag_mac] = position
-        
+
+        # The tags of the shards and of the other instances of the cluster are only known by their positions
+        for tag_mac in tag_registry.macs() if shards is None and cluster is None else list(snapshots):
+            snapshot = snapshots.get(tag_mac)
+            if snapshot is None:
+                continue
+
+            # Base stations and distances for this tag
+            tags_base_stations[tag_mac] = [
+                {"coords": coords, "distance": 0 if np.isnan(distance) else distance}
+                for coords, distance in zip(receiver_positions, snapshot.distances)
+            ]
+            tags_positions[tag_mac] = snapshot.coordinates
+
         # The function returns data for display including all tags' positions
         if tags_positions:
             first_tag = list(tags_positions.keys())[0]
-            return (
+            first_index = tag_registry.lookup(first_tag)
+
+            # The readings of sharded tags and remote tags stay in their process
+            windows = []
+            if first_index is not None:
+                readings = reading_store.snapshot()
+                windows = [readings.window(first_index, i) for i in range(len(RECEIVERS))]
+
+            data = (
                 tags_base_stations[first_tag],
                 tags_positions[first_tag],
-                list(tags_data[first_tag]["receiver_1"]),
-                list(tags_data[first_tag]["receiver_2"]),
-                list(tags_data[first_tag]["receiver_3"]),
+                windows,
                 tags_positions,  # This contains all tags' positions for rendering
             )
         else:
@@ -305,8 +631,12 @@ def run_graph():
             empty_stations = [{
                 "coords": pos,
                 "distance": 0
-            } for pos in [RECEIVER_1_POS, RECEIVER_2_POS, RECEIVER_3_POS]]
-            return (empty_stations, (0, 0), [], [], [], {})
+            } for pos in receiver_positions]
+            data = (empty_stations, (0, 0), [], {})
+
+        graph_data["version"] = version
+        graph_data["data"] = data
+        return data
 
     # The graph animation is already being called
     animate(
@@ -318,7 +648,64 @@ def run_graph():
 
 
 def run():
+    # The worker processes were forked at import, their results are merged from now on
+    if shards is not None:
+        logging.info(f"Started {shard_count} shards")
+        shards.start()
+
+    if metrics_port:
+        try:
+            start_metrics_server(metrics, metrics_port, METRICS_HOST)
+            logging.info(f"Serving metrics on http://{METRICS_HOST}:{metrics_port}/metrics")
+        except OSError as e:
+            # E.g. another instance on the same machine, METRICS_PORT sets a free port
+            logging.error(f"Could not serve metrics on port {metrics_port}: {e}")
+
+    try:
+        if RUNTIME == "asyncio":
+            run_event_loop()
+        else:
+            run_threads()
+    finally:
+        if shards is not None:
+            shards.stop()
+            logging.info("Shards stopped.")
+
+
+def run_event_loop():
+    from graph import set_on_close
+
+    try:
+        # The event loop runs in its own thread, the graph needs the main thread
+        logging.info("Starting event loop")
+        event_loop_thread = threading.Thread(target=asyncio.run, args=(serve(),), daemon=True)
+        event_loop_thread.start()
+
+        # Set on graph close (raise KeyboardInterrupt)
+        def on_close(event):
+            logging.info("Closing graph")
+
+        set_on_close(on_close)
+
+        # Start the graph animation in the main thread
+        logging.info("Starting graph animation")
+        run_graph()
+
+    except KeyboardInterrupt:
+        logging.info("Gracefully shutting down...")
+
+        # Stopping the scheduler ends the event loop
+        scheduler.stop()
+        event_loop_thread.join()
+        logging.info("Event loop stopped.")
+
+        # Exit the program
+        exit(0)
+
+
+def run_threads():
     global stop_threads
+    from graph import set_on_close
 
     try:
         logging.info("Connecting to broker")
@@ -334,6 +721,9 @@ def run():
         mqtt_thread = threading.Thread(target=client.loop_forever, daemon=True)
         mqtt_thread.start()
 
+        if cluster is not None:
+            threading.Thread(target=send_heartbeats, daemon=True).start()
+
         # Set on graph close (raise KeyboardInterrupt)
         def on_close(event):
             logging.info("Closing graph")
@@ -349,6 +739,10 @@ def run():
 
         # Stop the threads
         stop_threads = True
+        scheduler.stop()
+        if cluster is not None:
+            cluster.leave()
+            logging.info("Left the cluster.")
         client.disconnect()
         logging.info("MQTT disconnected.")
 
@@ -358,6 +752,9 @@ def run():
         mqtt_thread.join()
         logging.info("MQTT thread stopped.")
 
+        if capture is not None:
+            capture.close()
+
         # Stop bt
         if RUN_PIXEL_DISPLAY:
             loop.run_until_complete(bt.disconnect())
@@ -0,0 +1,226 @@
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import zlib
+from collections import deque
+
+from environment import LOG_LEVEL, LOG_QUEUE
+from logs import setup_logging
+from pipeline import PositioningPipeline
+from scheduler import DirtyScheduler
+
+
+def shard_of(mac: str, n_shards: int) -> int:
+    """
+    Get the shard of a tag, stable across processes and runs.
+
+    Args:
+        mac (str): The upper case MAC address of the tag.
+        n_shards (int): The number of shards.
+
+    Returns:
+        int: The shard index.
+    """
+    return zlib.crc32(mac.encode()) % n_shards
+
+
+def run_shard(shard: int, pipeline_config: dict, latency_budget: float, eviction_interval: float, inbox, outbox):
+    """
+    Worker process owning the filter state and solver of the tags of one shard.
+
+    Readings batches are taken from the inbox and the positions of the dirty tags are
+    put in the outbox as (shard, positions, evicted tags, counters) tuples, an evicted
+    tag is never in the positions. The batches are ingested, the idle tags evicted and
+    the dirty tags solved by the same thread, so the pipeline never changes during a
+    solve. A None batch stops the worker.
+
+    Args:
+        shard (int): The shard index.
+        pipeline_config (dict): Arguments of the `PositioningPipeline`.
+        latency_budget (float): Maximum coalescing delay of new readings (seconds).
+        eviction_interval (float): Interval between checks for idle tags (seconds).
+        inbox (multiprocessing.Queue): The readings batches of the shard.
+        outbox (multiprocessing.Queue): The results of all shards.
+    """
+    # Forked before the server configures its logging, the worker writes its own records
+    log_listener = setup_logging(
+        os.getenv("LOG_LEVEL", LOG_LEVEL).strip().upper(),
+        LOG_QUEUE,
+        format="%(asctime)s - %(processName)s - %(levelname)s - %(message)s",
+    )
+
+    # Tags evicted since the last result, removed from the position output with it
+    evicted = deque()
+    pipeline = PositioningPipeline(**pipeline_config, on_evict=lambda tag_mac, index: evicted.append(tag_mac))
+    scheduler = DirtyScheduler(latency_budget=latency_budget)
+
+    def process(dirty_tags):
+        positions = pipeline.solve(list(dirty_tags))
+
+        # The tags were evicted before the solve, those solved were registered again since
+        removed = [evicted.popleft() for _ in range(len(evicted))]
+        removed = [tag_mac for tag_mac in removed if tag_mac not in positions]
+        if positions or removed:
+            outbox.put((shard, positions, removed, pipeline.counters()))
+
+    # End of the latency budget of the oldest dirty reading, None without dirty tags
+    deadline = None
+    last_eviction_check = 0
+    while True:
+        if deadline is not None and time.perf_counter() >= deadline:
+            scheduler.flush(process)
+            deadline = None
+
+        # Coalesce the batches arriving until the deadline
+        try:
+            batch = inbox.get(timeout=None if deadline is None else max(deadline - time.perf_counter(), 0))
+        except queue.Empty:
+            continue
+        if batch is None:
+            break
+
+        receiver_index, macs, timestamps, rssi = batch
+        now = time.time()
+        batch_macs, _, _ = pipeline.ingest(receiver_index, macs, timestamps, rssi, now)
+        if batch_macs:
+            scheduler.mark_many(batch_macs, receiver_index)
+            if deadline is None:
+                deadline = time.perf_counter() + latency_budget
+
+        if now - last_eviction_check >= eviction_interval:
+            last_eviction_check = now
+            pipeline.evict_idle(now)
+
+            # Report the evicted tags and the counters even while no tag is solved
+            removed = [evicted.popleft() for _ in range(len(evicted))]
+            outbox.put((shard, {}, removed, pipeline.counters()))
+
+    logging.info(f"Shard {shard} stopped, latency: {scheduler.latency_stats}")
+    if log_listener is not None:
+        log_listener.stop()
+
+
+class ShardedPipeline:
+    def __init__(
+        self,
+        n_shards: int,
+        pipeline_config: dict,
+        on_result,
+        latency_budget: float = 0.05,
+        eviction_interval: float = 10,
+    ):
+        """
+        Partitions the tags across worker processes by a hash of their MAC address.
+
+        Every worker owns a `PositioningPipeline` for its tags, so filtering and solving
+        run in parallel without sharing state. The caller only parses the messages and
+        dispatches the readings, and the results of all workers are merged by a collector
+        thread calling `on_result`.
+
+        Args:
+            n_shards (int): The number of worker processes.
+            pipeline_config (dict): Arguments of each worker's `PositioningPipeline`, must be picklable.
+            on_result (callable): Called with the positions dict and the list of evicted tags of each result.
+            latency_budget (float, optional): Maximum coalescing delay of new readings (seconds). Defaults to 0.05.
+            eviction_interval (float, optional): Interval between checks for idle tags (seconds). Defaults to 10.
+        """
+        self.n_shards = n_shards
+        self.on_result = on_result
+
+        # The workers are forked while the server module is imported, spawning them would
+        # import it again in every worker, e.g. on Windows where fork is not available
+        if "fork" not in multiprocessing.get_all_start_methods():
+            raise ValueError("SHARDS needs the fork start method, which this platform does not support")
+        context = multiprocessing.get_context("fork")
+
+        self.inboxes = [context.Queue() for _ in range(n_shards)]
+        self.outbox = context.Queue()
+        self.processes = [
+            context.Process(
+                target=run_shard,
+                args=(shard, pipeline_config, latency_budget, eviction_interval, self.inboxes[shard], self.outbox),
+                name=f"shard-{shard}",
+                daemon=True,
+            )
+            for shard in range(n_shards)
+        ]
+        self.__collector = threading.Thread(target=self.__collect, daemon=True)
+
+        # Readings dispatched to each shard, results merged and the latest counters of each shard
+        self.dispatched = [0] * n_shards
+        self.merged = 0
+        self.shard_counters = [{} for _ in range(n_shards)]
+
+    def start_workers(self):
+        """
+        Fork the workers, before any other thread of the process is started. A thread
+        holding a lock (logging, queues) while forking leaves it held in the workers.
+        """
+        for process in self.processes:
+            if process.pid is None:
+                process.start()
+
+    def start(self):
+        """
+        Start the workers, unless `start_workers` did, and the collector merging their results.
+        """
+        self.start_workers()
+        self.__collector.start()
+
+    def dispatch(self, receiver_index: int, macs: list, timestamps: list, rssi: list):
+        """
+        Send a batch of readings from one receiver to the shards of their tags.
+
+        Args:
+            receiver_index (int): Index of the receiver.
+            macs (list): The upper case MAC address of each reading.
+            timestamps (list): Timestamp of each reading (seconds since the epoch).
+            rssi (list): RSSI of each reading.
+        """
+        batches = {}
+        for tag_mac, timestamp, value in zip(macs, timestamps, rssi):
+            shard = shard_of(tag_mac, self.n_shards)
+            if shard not in batches:
+                batches[shard] = ([], [], [])
+            batch = batches[shard]
+            batch[0].append(tag_mac)
+            batch[1].append(timestamp)
+            batch[2].append(value)
+
+        for shard, (shard_macs, shard_timestamps, shard_rssi) in batches.items():
+            self.inboxes[shard].put((receiver_index, shard_macs, shard_timestamps, shard_rssi))
+            self.dispatched[shard] += len(shard_macs)
+
+    def stop(self, timeout: float = 5):
+        """
+        Stop the workers and the collector, pending readings are dropped.
+        """
+        for inbox in self.inboxes:
+            inbox.put(None)
+        for process in self.processes:
+            process.join(timeout)
+
+        self.outbox.put(None)
+        self.__collector.join(timeout)
+
+    def counters(self) -> dict:
+        """
+        Sum the counters last reported by every worker, see `PositioningPipeline.counters`.
+
+        Returns:
+            dict: The counters, empty until a worker reported.
+        """
+        totals = {}
+        for counters in self.shard_counters:
+            for name, value in counters.items():
+                totals[name] = totals.get(name, 0) + value
+        return totals
+
+    def __collect(self):
+        for shard, positions, evicted, counters in iter(self.outbox.get, None):
+            self.shard_counters[shard] = counters
+            self.on_result(positions, evicted)
+            self.merged += 1
@@ -0,0 +1,379 @@
+import time
+
+import numpy as np
+
+from scheduler import LatencyStats
+
+HISTORY_SIZE = 20  # Readings kept per tag and receiver
+SNAPSHOT_CHUNK_SIZE = 64  # Tags per copy-on-write chunk of the snapshots
+
+
+class ReadingSnapshot:
+    def __init__(self, version: int, chunks: tuple, store: "ReadingStore"):
+        """
+        Immutable view of the latest reading of every tag from every receiver.
+
+        Snapshots are published by the writer of a `ReadingStore` and never modified
+        afterwards, so any number of readers can use them without locks.
+
+        Args:
+            version (int): Number of writes included in the snapshot.
+            chunks (tuple): Per chunk of tags, the (timestamps, rssi, filtered_rssi, counts) arrays.
+            store (ReadingStore): The store that published the snapshot.
+        """
+        self.version = version
+        self.published = time.perf_counter()
+        self.__chunks = chunks
+        self.__store = store
+        self.__columns = None
+
+    def age(self) -> float:
+        """
+        Time since the snapshot was published, in seconds.
+        """
+        return time.perf_counter() - self.published
+
+    def __get_columns(self) -> tuple:
+        # Concatenate the chunks once, on first use
+        if self.__columns is None:
+            columns = tuple(
+                np.concatenate([chunk[column] for chunk in self.__chunks])
+                for column in range(4)
+            )
+            for column in columns:
+                column.flags.writeable = False
+            self.__columns = columns
+        return self.__columns
+
+    def counts(self, tag_indices: np.ndarray) -> np.ndarray:
+        """
+        Number of readings per receiver for each tag.
+
+        Args:
+            tag_indices (np.ndarray): Row indices of the tags.
+
+        Returns:
+            np.ndarray: (N, receivers) array of reading counts.
+        """
+        return self.__get_columns()[3][np.asarray(tag_indices, dtype=np.intp)]
+
+    def has_data(self, tag_indices: np.ndarray) -> np.ndarray:
+        """
+        Check which tags have at least one reading from every receiver.
+
+        Args:
+            tag_indices (np.ndarray): Row indices of the tags.
+
+        Returns:
+            np.ndarray: Boolean mask, one entry per tag.
+        """
+        return np.all(self.counts(tag_indices) > 0, axis=1)
+
+    def latest(self, tag_indices: np.ndarray) -> tuple:
+        """
+        Get the latest reading from every receiver for many tags at once.
+
+        Args:
+            tag_indices (np.ndarray): Row indices of the tags.
+
+        Returns:
+            tuple: (N, receivers) arrays of timestamps, raw RSSI and filtered RSSI.
+        """
+        tag_indices = np.asarray(tag_indices, dtype=np.intp)
+        timestamps, rssi, filtered_rssi, _ = self.__get_columns()
+        return timestamps[tag_indices], rssi[tag_indices], filtered_rssi[tag_indices].astype(float)
+
+    def window(self, tag_index: int, receiver_index: int) -> tuple:
+        """
+        Get the retained readings of a (tag, receiver) pair up to this snapshot, oldest first.
+
+        The readings are copied from the live ring buffer without locking. Readings the
+        writer overwrote during the copy are dropped from the front of the window.
+
+        Args:
+            tag_index (int): The row index of the tag.
+            receiver_index (int): The index of the receiver.
+
+        Returns:
+            tuple: Copies of the timestamps, raw RSSI and filtered RSSI.
+        """
+        store = self.__store
+        count = int(self.counts([tag_index])[0, receiver_index])
+        first = max(count - store.history, 0)
+        slots = np.arange(first, count) % store.history
+
+        timestamps = store.timestamps[tag_index, receiver_index, slots]
+        rssi = store.rssi[tag_index, receiver_index, slots]
+        filtered_rssi = store.filtered_rssi[tag_index, receiver_index, slots]
+
+        # Readings older than this were (or are being) overwritten during the copy
+        oldest_valid = int(store.counts[tag_index, receiver_index]) - store.history + 1
+        if oldest_valid > first:
+            dropped = min(oldest_valid - first, count - first)
+            store.snapshot_stats["trimmed_windows"] += 1
+            timestamps, rssi, filtered_rssi = timestamps[dropped:], rssi[dropped:], filtered_rssi[dropped:]
+
+        return timestamps, rssi, filtered_rssi
+
+
+class ReadingStore:
+    def __init__(self, n_receivers: int = 3, history: int = HISTORY_SIZE, capacity: int = 16):
+        """
+        Preallocated ring buffers of readings for every (tag, receiver) pair.
+
+        Timestamps, raw RSSI and filtered RSSI are stored as columns of shape
+        (tags, receivers, 2 * history). Every reading is written twice, at its slot
+        and at slot + history, so the latest `history` readings of a pair are always
+        a contiguous slice and can be read as zero-copy views.
+
+        The store has a single writer. After every write it publishes a new
+        `ReadingSnapshot`, which other threads get from `snapshot()` in O(1).
+
+        Args:
+            n_receivers (int, optional): Number of receivers per tag. Defaults to 3.
+            history (int, optional): Readings kept per tag and receiver. Defaults to 20.
+            capacity (int, optional): Initial number of tag rows. Grows as needed. Defaults to 16.
+        """
+        self.n_receivers = n_receivers
+        self.history = history
+        self.n_tags = 0
+
+        self.timestamps = np.zeros((capacity, n_receivers, 2 * history))
+        self.rssi = np.zeros((capacity, n_receivers, 2 * history), dtype=np.int16)
+        self.filtered_rssi = np.zeros((capacity, n_receivers, 2 * history), dtype=np.float32)
+
+        # Total number of readings appended per tag and receiver
+        self.counts = np.zeros((capacity, n_receivers), dtype=np.int64)
+
+        # Latest published snapshot and its costs
+        self.snapshot_stats = {
+            "publish_time": LatencyStats(),
+            "snapshot_age": LatencyStats(),
+            "trimmed_windows": 0,
+        }
+        self.__version = 0
+        self.__chunks = ()
+        self.__snapshot_rows = 0
+        self.__snapshot = None
+        self.__publish([])
+
+    def add_tag(self) -> int:
+        """
+        Allocate the buffers of a new tag.
+
+        Returns:
+            int: The row index of the tag.
+        """
+        if self.n_tags == len(self.counts):
+            self.__grow(max(2 * len(self.counts), 1))
+
+        tag_index = self.n_tags
+        self.n_tags += 1
+        self.reset(tag_index)
+        return tag_index
+
+    def reset(self, tag_index: int):
+        """
+        Drop all readings of a tag.
+
+        Args:
+            tag_index (int): The row index of the tag.
+        """
+        self.counts[tag_index] = 0
+        self.__publish([tag_index])
+
+    def append(
+        self,
+        tag_index: int,
+        receiver_index: int,
+        timestamp: float,
+        rssi: int,
+        filtered_rssi: float,
+    ):
+        """
+        Append a reading, overwriting the oldest one when the buffer is full.
+
+        Args:
+            tag_index (int): The row index of the tag.
+            receiver_index (int): The index of the receiver.
+            timestamp (float): Time of the reading (seconds since the epoch).
+            rssi (int): The raw RSSI value.
+            filtered_rssi (float): The filtered RSSI value.
+        """
+        slot = self.counts[tag_index, receiver_index] % self.history
+        slots = [slot, slot + self.history]
+
+        self.timestamps[tag_index, receiver_index, slots] = timestamp
+        self.rssi[tag_index, receiver_index, slots] = rssi
+        self.filtered_rssi[tag_index, receiver_index, slots] = filtered_rssi
+        self.counts[tag_index, receiver_index] += 1
+        self.__publish([tag_index])
+
+    def append_many(
+        self,
+        tag_indices: np.ndarray,
+        receiver_indices: np.ndarray,
+        timestamps: np.ndarray,
+        rssi: np.ndarray,
+        filtered_rssi: np.ndarray,
+    ):
+        """
+        Append a batch of readings and publish a single snapshot for it.
+
+        Readings for the same (tag, receiver) pair are appended in order, so the
+        result is the same as calling `append` for each of them.
+
+        Args:
+            tag_indices (np.ndarray): Row index of the tag of each reading.
+            receiver_indices (np.ndarray): Receiver index of each reading.
+            timestamps (np.ndarray): Time of each reading (seconds since the epoch).
+            rssi (np.ndarray): The raw RSSI values.
+            filtered_rssi (np.ndarray): The filtered RSSI values.
+        """
+        tag_indices = np.asarray(tag_indices, dtype=np.intp)
+        receiver_indices = np.asarray(receiver_indices, dtype=np.intp)
+        if not len(tag_indices):
+            return
+
+        # Rank of each reading among the readings of the same pair in this batch
+        flat = tag_indices * self.n_receivers + receiver_indices
+        order = np.argsort(flat, kind="stable")
+        group_starts = np.flatnonzero(np.r_[True, np.diff(flat[order]) != 0])
+        group_sizes = np.diff(np.r_[group_starts, len(flat)])
+        ranks = np.empty(len(flat), dtype=np.int64)
+        ranks[order] = np.arange(len(flat)) - np.repeat(group_starts, group_sizes)
+
+        slots = (self.counts[tag_indices, receiver_indices] + ranks) % self.history
+        for offset in (0, self.history):
+            self.timestamps[tag_indices, receiver_indices, slots + offset] = timestamps
+            self.rssi[tag_indices, receiver_indices, slots + offset] = rssi
+            self.filtered_rssi[tag_indices, receiver_indices, slots + offset] = filtered_rssi
+        np.add.at(self.counts, (tag_indices, receiver_indices), 1)
+
+        self.__publish(np.unique(tag_indices).tolist())
+
+    def snapshot(self) -> ReadingSnapshot:
+        """
+        Get the latest published snapshot. Safe to call from any thread.
+
+        Returns:
+            ReadingSnapshot: Immutable view of the latest readings of all tags.
+        """
+        snapshot = self.__snapshot
+        self.snapshot_stats["snapshot_age"].record(snapshot.age())
+        return snapshot
+
+    def window(self, tag_index: int, receiver_index: int) -> tuple:
+        """
+        Get the retained readings of a (tag, receiver) pair, oldest first.
+
+        Args:
+            tag_index (int): The row index of the tag.
+            receiver_index (int): The index of the receiver.
+
+        Returns:
+            tuple: Zero-copy views of the timestamps, raw RSSI and filtered RSSI.
+        """
+        count = self.counts[tag_index, receiver_index]
+        end = count % self.history + self.history
+        start = end - min(count, self.history)
+
+        return (
+            self.timestamps[tag_index, receiver_index, start:end],
+            self.rssi[tag_index, receiver_index, start:end],
+            self.filtered_rssi[tag_index, receiver_index, start:end],
+        )
+
+    def has_data(self, tag_indices: np.ndarray) -> np.ndarray:
+        """
+        Check which tags have at least one reading from every receiver.
+
+        Args:
+            tag_indices (np.ndarray): Row indices of the tags.
+
+        Returns:
+            np.ndarray: Boolean mask, one entry per tag.
+        """
+        return np.all(self.counts[tag_indices] > 0, axis=1)
+
+    def latest(self, tag_indices: np.ndarray) -> tuple:
+        """
+        Get the latest reading from every receiver for many tags at once.
+
+        Args:
+            tag_indices (np.ndarray): Row indices of the tags.
+
+        Returns:
+            tuple: (N, receivers) arrays of timestamps, raw RSSI and filtered RSSI.
+        """
+        tag_indices = np.asarray(tag_indices, dtype=np.intp)
+        slots = (self.counts[tag_indices] - 1) % self.history
+        rows = tag_indices[:, None]
+        receivers = np.arange(self.n_receivers)[None, :]
+
+        return (
+            self.timestamps[rows, receivers, slots],
+            self.rssi[rows, receivers, slots],
+            self.filtered_rssi[rows, receivers, slots].astype(float),
+        )
+
+    def nbytes(self) -> int:
+        """
+        Memory used by the buffers, in bytes.
+        """
+        return (
+            self.timestamps.nbytes
+            + self.rssi.nbytes
+            + self.filtered_rssi.nbytes
+            + self.counts.nbytes
+        )
+
+    def __publish(self, tag_indices: list):
+        # Copy-on-write: rebuild only the chunks of the written tags, share the others
+        start = time.perf_counter()
+        chunks = list(self.__chunks)
+
+        # Chunks of the written tags, or all of them after the store grew
+        written = {}
+        if self.__snapshot_rows != len(self.counts):
+            chunks = [None] * -(-len(self.counts) // SNAPSHOT_CHUNK_SIZE)
+            written = dict.fromkeys(range(len(chunks)))
+            self.__snapshot_rows = len(self.counts)
+        for tag_index in tag_indices:
+            tags = written.setdefault(tag_index // SNAPSHOT_CHUNK_SIZE, set())
+            if tags is not None:
+                tags.add(tag_index)
+
+        for chunk_id, tags in written.items():
+            offset = chunk_id * SNAPSHOT_CHUNK_SIZE
+            if tags is None:
+                # Rebuild the whole chunk
+                rows = np.arange(offset, min(offset + SNAPSHOT_CHUNK_SIZE, len(self.counts)))
+                chunk = tuple(np.empty((len(rows), self.n_receivers), dtype=array.dtype)
+                              for array in (self.timestamps, self.rssi, self.filtered_rssi, self.counts))
+            else:
+                # Copy the previous chunk and refresh the written rows
+                rows = np.fromiter(tags, dtype=np.intp)
+                chunk = tuple(array.copy() for array in chunks[chunk_id])
+
+            counts = self.counts[rows]
+            slots = (counts - 1) % self.history
+            receivers = np.arange(self.n_receivers)
+            local_rows = rows - offset
+            chunk[0][local_rows] = self.timestamps[rows[:, None], receivers, slots]
+            chunk[1][local_rows] = self.rssi[rows[:, None], receivers, slots]
+            chunk[2][local_rows] = self.filtered_rssi[rows[:, None], receivers, slots]
+            chunk[3][local_rows] = counts
+            chunks[chunk_id] = chunk
+
+        self.__version += 1
+        self.__chunks = tuple(chunks)
+        self.__snapshot = ReadingSnapshot(self.__version, self.__chunks, self)
+        self.snapshot_stats["publish_time"].record(time.perf_counter() - start)
+
+    def __grow(self, capacity: int):
+        for name in ("timestamps", "rssi", "filtered_rssi", "counts"):
+            array = getattr(self, name)
+            grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[: len(array)] = array
+            setattr(self, name, grown)
@@ -0,0 +1,215 @@
+import numpy as np
+
+# Shortest squared range of a particle, keeps the logarithm finite at a receiver
+MIN_SQUARED_RANGE = 1e-6
+
+
+class ParticleTracker:
+    def __init__(
+        self,
+        receiver_positions: np.ndarray,
+        min_particles: int = 32,
+        max_particles: int = 256,
+        density: float = 64,
+        speed: float = 1.5,
+        path_loss_exponent: float = 1.8,
+        sigma: float = 2.0,
+        max_dt: float = 5.0,
+        bounds: tuple = None,
+        capacity: int = 16,
+        seed: int = None,
+    ):
+        """
+        Particle filters tracking the positions of every tag, stored as one (tags, particles, 2) array.
+
+        Each update moves the particles of a tag with a random walk as far as it may have
+        walked since its previous update, weights them by the likelihood of the measured
+        distances in RSSI space (like `GridEstimator`) and resamples them systematically
+        when their weights degenerate.
+
+        The number of particles of a tag follows the spread of its particles: `density`
+        particles per square meter of the box of two standard deviations, rounded up to
+        `min_particles` times a power of two and capped by `max_particles`. Tags with the
+        same number of particles are updated together with vectorized operations.
+
+        Args:
+            receiver_positions (np.ndarray): Position (x, y) of each receiver.
+            min_particles (int, optional): Particles of a settled tag. Defaults to 32.
+            max_particles (int, optional): Particles of a new or uncertain tag. Defaults to 256.
+            density (float, optional): Particles per square meter of the spread of a tag. Defaults to 64.
+            speed (float, optional): Walking speed of the tags (m/s). Defaults to 1.5.
+            path_loss_exponent (float, optional): Path loss exponent. Defaults to 1.8.
+            sigma (float, optional): Standard deviation of the filtered RSSI (dB). Defaults to 2.0.
+            max_dt (float, optional): Longest time a tag is predicted over, new readings after a
+                longer gap are weighted against particles spread this far. Defaults to 5.0.
+            bounds (tuple, optional): ((min_x, min_y), (max_x, max_y)) the tags are kept in, in meters.
+                Defaults to the bounding box of the receivers padded by 1 meter.
+            capacity (int, optional): Initial number of tag rows. Grows as needed. Defaults to 16.
+            seed (int, optional): Seed of the random generator. Defaults to None.
+        """
+        self.receiver_positions = np.asarray(receiver_positions, dtype=float)
+        if bounds is None:
+            bounds = (self.receiver_positions.min(axis=0) - 1, self.receiver_positions.max(axis=0) + 1)
+        self.bounds = tuple(np.asarray(bound, dtype=float) for bound in bounds)
+
+        # Particle counts a tag can have, min_particles times a power of two
+        self.levels = min_particles * 2 ** np.arange(int(np.log2(max_particles / min_particles)) + 1)
+        self.max_particles = int(self.levels[-1])
+        self.density = density
+        self.speed = speed
+        self.max_dt = max_dt
+        self.rng = np.random.default_rng(seed)
+
+        # RSSI difference per decade of distance, over twice the variance, halved for squared ranges
+        self.__gain = (10 * path_loss_exponent) ** 2 / (2 * sigma ** 2)
+
+        # Particles, their normalized log weights, the number in use (0 for a new tag) and the last update time
+        self.n_tags = 0
+        self.particles = np.zeros((capacity, self.max_particles, 2))
+        self.log_weights = np.zeros((capacity, self.max_particles))
+        self.counts = np.zeros(capacity, dtype=np.int64)
+        self.updated = np.zeros(capacity)
+
+    def add_tag(self) -> int:
+        """
+        Allocate the particles of a new tag.
+
+        Returns:
+            int: The row index of the tag.
+        """
+        if self.n_tags == len(self.counts):
+            self.__grow(max(2 * len(self.counts), 1))
+
+        tag_index = self.n_tags
+        self.n_tags += 1
+        self.reset(tag_index)
+        return tag_index
+
+    def reset(self, tag_index: int):
+        """
+        Forget the particles of a tag, they are spread over the whole area on its next update.
+
+        Args:
+            tag_index (int): The row index of the tag.
+        """
+        self.counts[tag_index] = 0
+
+    def update(
+        self,
+        tag_indices: np.ndarray,
+        times: np.ndarray,
+        distances: np.ndarray,
+        receivers: np.ndarray,
+        weights: np.ndarray = None,
+    ) -> np.ndarray:
+        """
+        Predict, weight and resample the particles of many tags with their new distances.
+
+        Args:
+            tag_indices (np.ndarray): Row indices of the tags, each at most once.
+            times (np.ndarray): Time of the distances of each tag (seconds since the epoch).
+            distances (np.ndarray): (N, k) array of distances, one row per tag.
+            receivers (np.ndarray): (N, k) array with the receiver of each distance.
+            weights (np.ndarray, optional): (N, k) weights of the distances, 0 to ignore one. Defaults to 1.
+
+        Returns:
+            np.ndarray: (N, 2) array with the weighted mean position of every tag, NaN where a
+                used distance is not finite, those tags are left unchanged.
+        """
+        tag_indices = np.asarray(tag_indices, dtype=np.intp)
+        times = np.asarray(times, dtype=float)
+        distances = np.atleast_2d(np.asarray(distances, dtype=float))
+        weights = np.ones(distances.shape) if weights is None else np.asarray(weights, dtype=float)
+        estimates = np.full((len(tag_indices), 2), np.nan)
+
+        used = weights > 0
+        valid = ~np.any(used & ~np.isfinite(distances), axis=1)
+        log_distances = np.log10(np.maximum(np.where(used, distances, 1.0), 1e-3))
+        anchors = self.receiver_positions[receivers]
+
+        # New tags start with particles spread uniformly over the area
+        new = valid & (self.counts[tag_indices] == 0)
+        if np.any(new):
+            self.__spawn(tag_indices[new], times[new])
+
+        dt = np.clip(times - self.updated[tag_indices], 0, self.max_dt)
+        self.updated[tag_indices[valid]] = np.maximum(self.updated[tag_indices[valid]], times[valid])
+
+        counts = np.where(valid, self.counts[tag_indices], 0)
+        for count in np.unique(counts[counts > 0]):
+            group = np.flatnonzero(counts == count)
+            rows = tag_indices[group]
+            particles = self.particles[rows, :count]
+
+            # Predict: random walk as far as the tag may have walked, plus a jitter against depletion
+            steps = self.speed * dt[group] + 0.05
+            particles += self.rng.standard_normal(particles.shape) * steps[:, None, None]
+            np.clip(particles, self.bounds[0], self.bounds[1], out=particles)
+
+            # Weight: log likelihood of the distances, from the squared ranges to the receivers
+            offsets = particles[:, :, None, :] - anchors[group][:, None]
+            squared_ranges = np.maximum(np.einsum("npkj,npkj->npk", offsets, offsets), MIN_SQUARED_RANGE)
+            residuals = 0.5 * np.log10(squared_ranges) - log_distances[group][:, None, :]
+            log_weights = self.log_weights[rows, :count] - self.__gain * np.einsum(
+                "npk,npk,nk->np", residuals, residuals, weights[group]
+            )
+
+            # Normalize in log space so unlikely tags keep finite weights
+            log_weights -= np.max(log_weights, axis=1, keepdims=True)
+            log_weights -= np.log(np.sum(np.exp(log_weights), axis=1, keepdims=True))
+            particle_weights = np.exp(log_weights)
+
+            estimate = np.einsum("np,npj->nj", particle_weights, particles)
+            estimates[group] = estimate
+
+            # Resample the degenerate tags and those whose spread calls for another particle count
+            spread = np.sqrt(np.einsum("np,npj->nj", particle_weights, (particles - estimate[:, None]) ** 2))
+            targets = self.__particle_counts(spread)
+            effective = 1.0 / np.sum(particle_weights ** 2, axis=1)
+            resample = (effective < count / 2) | (targets != count)
+
+            keep = ~resample
+            self.particles[rows[keep], :count] = particles[keep]
+            self.log_weights[rows[keep], :count] = log_weights[keep]
+            for target in np.unique(targets[resample]):
+                selected = resample & (targets == target)
+                self.particles[rows[selected], :target] = self.__systematic_resample(
+                    particles[selected], particle_weights[selected], target
+                )
+                self.log_weights[rows[selected], :target] = -np.log(target)
+                self.counts[rows[selected]] = target
+
+        return estimates
+
+    def __particle_counts(self, spread: np.ndarray) -> np.ndarray:
+        targets = self.density * 4 * spread[:, 0] * spread[:, 1]
+        level = np.searchsorted(self.levels, targets)
+        return self.levels[np.minimum(level, len(self.levels) - 1)]
+
+    def __systematic_resample(self, particles: np.ndarray, particle_weights: np.ndarray, count: int) -> np.ndarray:
+        # One uniform offset per tag, then `count` evenly spaced positions in its cumulative weights
+        n, current = particle_weights.shape
+        cumulative = np.cumsum(particle_weights, axis=1)
+        cumulative /= cumulative[:, -1:]
+        positions = (np.arange(count)[None] + self.rng.random((n, 1))) / count
+
+        # Search all tags at once, each shifted by its row so the rows stay sorted
+        shifts = np.arange(n)[:, None]
+        indices = np.searchsorted((cumulative + shifts).ravel(), (positions + shifts).ravel()).reshape(n, count)
+        indices = np.clip(indices - shifts * current, 0, current - 1)
+        return np.take_along_axis(particles, indices[..., None], axis=1)
+
+    def __spawn(self, tag_indices: np.ndarray, times: np.ndarray):
+        low, high = self.bounds
+        count = self.max_particles
+        self.particles[tag_indices] = low + self.rng.random((len(tag_indices), count, 2)) * (high - low)
+        self.log_weights[tag_indices] = -np.log(count)
+        self.counts[tag_indices] = count
+        self.updated[tag_indices] = times
+
+    def __grow(self, capacity: int):
+        for name in ("particles", "log_weights", "counts", "updated"):
+            array = getattr(self, name)
+            grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[: len(array)] = array
+            setattr(self, name, grown)
@@ -0,0 +1,125 @@
+import struct
+import time
+
+import numpy as np
+
+# First bytes of a binary frame, never the start of a UTF-8 JSON payload
+FRAME_MAGIC = b"\xbe\xac"
+FRAME_VERSION = 1
+
+# Magic, version, number of readings and base time (milliseconds since the epoch) of a frame
+FRAME_HEADER = struct.Struct("<2sBHQ")
+# MAC address, RSSI and time after the frame base time (milliseconds) of a reading
+READING = struct.Struct("<6sbI")
+READING_DTYPE = np.dtype([("mac", "V6"), ("rssi", "i1"), ("offset", "<u4")])
+
+MAX_READINGS = 0xFFFF  # Readings per frame
+MAX_TIME_SPAN = 0xFFFFFFFF  # Time between the first and last reading of a frame (milliseconds)
+MAX_CACHED_MACS = 65536  # Formatted MAC addresses kept by the decoder before it starts over
+
+# Formatted address of each packed MAC address and of each JSON address seen recently
+mac_names = {}
+address_names = {}
+
+
+def is_frame(payload: bytes) -> bool:
+    """
+    Check if a payload is a binary frame rather than JSON.
+    """
+    return payload[:2] == FRAME_MAGIC
+
+
+def encode_frame(macs: list, rssi: list, timestamps: list = None) -> bytes:
+    """
+    Pack readings into one binary frame, 11 bytes per reading and 13 bytes of header.
+
+    Args:
+        macs (list): The MAC address of each reading, with or without separators, e.g. "C3:00:00:35:83:F6".
+        rssi (list): The RSSI of each reading (dBm), clamped to an int8.
+        timestamps (list, optional): Timestamp of each reading (seconds since the epoch). Defaults to now.
+
+    Returns:
+        bytes: The frame.
+    """
+    if len(macs) > MAX_READINGS:
+        raise ValueError(f"A frame holds at most {MAX_READINGS} readings, got {len(macs)}")
+
+    if timestamps is None:
+        timestamps = [time.time()] * len(macs)
+    times = [round(timestamp * 1000) for timestamp in timestamps]
+    base_time = min(times, default=0)
+    if times and max(times) - base_time > MAX_TIME_SPAN:
+        raise ValueError("The readings of a frame must be less than 49 days apart")
+
+    frame = bytearray(FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, len(macs), base_time))
+    for mac, value, reading_time in zip(macs, rssi, times):
+        # The packing would pad or cut the address to 6 bytes, another tag's address
+        packed = bytes.fromhex(mac.replace(":", "").replace("-", ""))
+        if len(packed) != 6:
+            raise ValueError(f"Not a 6 byte MAC address: {mac}")
+        frame += READING.pack(packed, max(-128, min(127, int(value))), reading_time - base_time)
+    return bytes(frame)
+
+
+def address_to_mac(address: str) -> str:
+    """
+    Format the address of a JSON reading like the MAC addresses of the frames.
+
+    The beacons send the hex of the advertisement address bytes, which are little
+    endian, e.g. "f683350000c3" for "C3:00:00:35:83:F6". Addresses with separators are
+    taken as MAC addresses.
+
+    Args:
+        address (str): The address.
+
+    Returns:
+        str: The upper case MAC address ("AA:BB:CC:DD:EE:FF").
+    """
+    if ":" in address or "-" in address:
+        return address.upper()
+
+    name = address_names.get(address)
+    if name is None:
+        if len(address_names) >= MAX_CACHED_MACS:
+            address_names.clear()
+        packed = bytes.fromhex(address)
+        if len(packed) != 6:
+            raise ValueError(f"Not a 6 byte address: {address}")
+        name = address_names[address] = packed[::-1].hex(":").upper()
+    return name
+
+
+def decode_frame(payload: bytes) -> tuple:
+    """
+    Unpack the readings of a binary frame.
+
+    Args:
+        payload (bytes): The frame.
+
+    Returns:
+        tuple: The upper case MAC address ("AA:BB:CC:DD:EE:FF"), timestamp (seconds since the epoch)
+            and RSSI lists of the readings.
+    """
+    if len(payload) < FRAME_HEADER.size:
+        raise ValueError(f"Frame of {len(payload)} bytes is shorter than its {FRAME_HEADER.size} byte header")
+    magic, version, count, base_time = FRAME_HEADER.unpack_from(payload)
+    if magic != FRAME_MAGIC or version != FRAME_VERSION:
+        raise ValueError(f"Not a binary frame of version {FRAME_VERSION}")
+    end = FRAME_HEADER.size + count * READING.size
+    if len(payload) != end:
+        raise ValueError(f"Frame of {count} readings has {len(payload)} bytes instead of {end}")
+
+    readings = np.frombuffer(payload, READING_DTYPE, count, FRAME_HEADER.size)
+
+    # The same tags are seen over and over, format each address once
+    if len(mac_names) >= MAX_CACHED_MACS:
+        mac_names.clear()
+    macs = []
+    for mac in readings["mac"].tolist():
+        name = mac_names.get(mac)
+        if name is None:
+            name = mac_names[mac] = mac.hex(":").upper()
+        macs.append(name)
+
+    timestamps = ((readings["offset"] + float(base_time)) / 1000).tolist()
+    return macs, timestamps, readings["rssi"].tolist()